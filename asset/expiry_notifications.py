@@ -0,0 +1,181 @@
+"""
+expiry_notifications.py
+
+This module notifies the owners of the assets and the employees of the
+documents that are about to expire.
+
+The objects whose notify date (``expiry_date`` minus ``notify_before`` days)
+is today, or passed in the last ``CATCH_UP_DAYS`` days while the job didn't
+run, and that didn't expire yet are selected by the database,
+``EXPIRY_BATCH_SIZE`` at a time. Objects with an ``ExpiryNotificationSent``
+row for their expiry date are left out, and each batch inserts its
+notifications and its sent rows together, so an object is notified once per
+expiry date however often the job runs.
+"""
+
+import logging
+from datetime import date, timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import (
+    DateField,
+    DurationField,
+    Exists,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Value,
+)
+
+from notifications.models import build_notifications, save_notifications
+
+logger = logging.getLogger(__name__)
+
+# Objects notified per batch
+EXPIRY_BATCH_SIZE = 500
+
+# Days a missed notify date is still caught up
+CATCH_UP_DAYS = 3
+
+
+def notify_before_from(day):
+    """
+    ``day`` plus the ``notify_before`` days of each row, computed by the
+    database
+    """
+    return ExpressionWrapper(
+        Value(day, output_field=DateField())
+        + ExpressionWrapper(
+            F("notify_before") * Value(timedelta(days=1)),
+            output_field=DurationField(),
+        ),
+        output_field=DateField(),
+    )
+
+
+def due_for_notification(queryset, today):
+    """
+    Objects of the queryset whose expiry notification is due and not sent
+    """
+    from asset.models import ExpiryNotificationSent
+
+    sent = ExpiryNotificationSent.objects.filter(
+        content_type=ContentType.objects.get_for_model(queryset.model),
+        object_id=OuterRef("pk"),
+        expiry_date=OuterRef("expiry_date"),
+    )
+    return (
+        queryset.filter(
+            expiry_date__gte=today,
+            expiry_date__lte=notify_before_from(today),
+            expiry_date__gt=notify_before_from(today - timedelta(days=CATCH_UP_DAYS)),
+        )
+        .exclude(Exists(sent))
+        .order_by("pk")
+    )
+
+
+def send_expiry_notifications(queryset, recipient, message, today=None):
+    """
+    Notifies the due objects of the queryset, ``recipient`` returns the user
+    to notify of an object and ``message`` the notification fields of an
+    object expiring in the given days. Returns the number of notifications.
+    """
+    from django.contrib.auth.models import User
+
+    from asset.models import ExpiryNotificationSent
+
+    today = today or date.today()
+    bot = User.objects.filter(username="Horilla Bot").first()
+    if bot is None:
+        logger.warning("No Horilla Bot user to send the expiry notifications")
+        return 0
+    content_type = ContentType.objects.get_for_model(queryset.model)
+    due = due_for_notification(queryset, today)
+    count = 0
+    last_pk = 0
+    while True:
+        batch = list(due.filter(pk__gt=last_pk)[:EXPIRY_BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        notifications = []
+        sent = []
+        for instance in batch:
+            user = recipient(instance)
+            # notified once it gets a recipient
+            if user is None:
+                continue
+            days = (instance.expiry_date - today).days
+            notifications.extend(
+                build_notifications(
+                    actor=bot, recipients=[user], **message(instance, days)
+                )
+            )
+            sent.append(
+                ExpiryNotificationSent(
+                    content_type=content_type,
+                    object_id=instance.pk,
+                    expiry_date=instance.expiry_date,
+                )
+            )
+        with transaction.atomic():
+            save_notifications(notifications)
+            ExpiryNotificationSent.objects.bulk_create(sent, ignore_conflicts=True)
+        count += len(notifications)
+    return count
+
+
+def notify_expiring_assets(today=None):
+    """
+    Notifies the owners of the assets reaching their notify date
+    """
+    from asset.models import Asset
+
+    def recipient(asset):
+        return asset.owner.employee_user_id if asset.owner else None
+
+    def message(asset, days):
+        return {
+            "verb": f"The Asset ' {asset.asset_name} ' expires in {days} days",
+            "verb_ar": f"تنتهي صلاحية الأصل ' {asset.asset_name} ' خلال {days} من الأيام",
+            "verb_de": f"Das Asset „{asset.asset_name}“ läuft in {days} Tagen ab.",
+            "verb_es": f"El activo “{asset.asset_name}” caduca en {days} días.",
+            "verb_fr": f"L'actif {asset.asset_name} expire dans {days} jours.",
+            "redirect": "/asset/asset-category-view/",
+            "label": "System",
+            "icon": "information",
+        }
+
+    assets = Asset._base_manager.filter(owner__isnull=False).select_related(
+        "owner__employee_user_id"
+    )
+    return send_expiry_notifications(assets, recipient, message, today)
+
+
+def notify_expiring_documents(today=None):
+    """
+    Notifies the employees of the documents reaching their notify date
+    """
+    from horilla_documents.models import Document
+
+    def recipient(document):
+        return document.employee_id.employee_user_id
+
+    def message(document, days):
+        return {
+            "verb": f"The document ' {document.title} ' expires in {days} days",
+            "verb_ar": f"تنتهي صلاحية المستند '{document.title}' خلال {days} يوم",
+            "verb_de": f"Das Dokument '{document.title}' läuft in {days} Tagen ab.",
+            "verb_es": f"El documento '{document.title}' caduca en {days} días",
+            "verb_fr": f"Le document '{document.title}' expire dans {days} jours",
+            "redirect": "/asset/asset-category-view/",
+            "label": "System",
+            "icon": "information",
+        }
+
+    documents = Document._base_manager.filter(
+        employee_id__is_active=True
+    ).select_related("employee_id__employee_user_id")
+    return send_expiry_notifications(documents, recipient, message, today)
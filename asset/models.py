@@ -5,6 +5,7 @@ This module defines Django models to manage assets, their categories, assigning,
 within an Asset Management System.
 """
 
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.translation import gettext_lazy as _
@@ -66,7 +67,7 @@ class Asset(HorillaModel):
     asset_lot_number_id = models.ForeignKey(
         AssetLot, on_delete=models.PROTECT, null=True, blank=True
     )
-    expiry_date = models.DateField(null=True, blank=True)
+    expiry_date = models.DateField(null=True, blank=True, db_index=True)
     notify_before = models.IntegerField(default=1, null=True)
     objects = HorillaCompanyManager("asset_category_id__company_id")
 
@@ -190,3 +191,21 @@ class AssetRequest(HorillaModel):
 
     class Meta:
         ordering = ["-id"]
+
+
+class ExpiryNotificationSent(models.Model):
+    """
+    Marks the expiry notification of an asset or a document as sent, once per
+    expiry date of the object.
+    """
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    expiry_date = models.DateField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("content_type", "object_id", "expiry_date")
+
+    def __str__(self):
+        return f"{self.content_type} {self.object_id} --- {self.expiry_date}"
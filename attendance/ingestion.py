@@ -0,0 +1,474 @@
+"""
+ingestion.py
+
+This module records batches of clock-in/clock-out punches, like the ones pulled
+from the biometric devices. The punches follow the same rules as the check-in
+and check-out buttons (night shifts, late come, early out, overtime and
+validation), but a batch is recorded with a fixed number of queries instead of
+a handful of queries and saves per punch.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from attendance.models import (
+    Attendance,
+    AttendanceActivity,
+    AttendanceLateComeEarlyOut,
+    AttendanceValidationCondition,
+    GraceTime,
+    format_time,
+    get_shift_day,
+    strtime_seconds,
+)
+from base.models import EmployeeShiftSchedule
+from employee.models import Employee
+from leave.holiday_calendar import is_non_working_day
+
+logger = logging.getLogger(__name__)
+
+CLOCK_IN = "in"
+CLOCK_OUT = "out"
+MID_DAY_SEC = strtime_seconds("12:00")
+
+
+def local_datetime(value):
+    """
+    Punch datetimes are handled as naive local datetimes, like the clock-in
+    and clock-out views do
+    """
+    if timezone.is_aware(value):
+        value = timezone.localtime(value).replace(tzinfo=None)
+    return value.replace(microsecond=0)
+
+
+def stored_datetime(value):
+    """
+    The naive local datetime as it is stored in the DateTimeFields
+    """
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def is_late_come(clock_in_sec, start_time, end_time, shift, default_grace_time):
+    """
+    Same condition as ``clock_in_out.late_come``, the shift grace time has
+    the higher priority over the default grace time
+    """
+    if shift is not None and shift.grace_time_id:
+        if shift.grace_time_id.is_active:
+            clock_in_sec -= shift.grace_time_id.allowed_time_in_secs
+    elif default_grace_time is not None:
+        clock_in_sec -= default_grace_time.allowed_time_in_secs
+    if start_time > end_time:
+        # night shift
+        return clock_in_sec < MID_DAY_SEC or clock_in_sec > start_time
+    return start_time < clock_in_sec
+
+
+def is_early_out(clock_out_sec, start_time, end_time):
+    """
+    Same condition as ``clock_in_out.early_out``
+    """
+    if start_time > end_time:
+        # night shift
+        return clock_out_sec >= MID_DAY_SEC or clock_out_sec < end_time
+    return end_time > clock_out_sec
+
+
+def activity_seconds(activity):
+    """
+    Seconds between the clock-in and clock-out of a closed activity
+    """
+    clock_in = datetime.combine(
+        activity.clock_in_date, activity.clock_in.replace(microsecond=0)
+    )
+    clock_out = datetime.combine(
+        activity.clock_out_date, activity.clock_out.replace(microsecond=0)
+    )
+    difference = clock_out - clock_in
+    return difference.days * 24 * 3600 + difference.seconds
+
+
+class PunchIngestion:
+    """
+    Records one batch of punches.
+
+    Everything the rules need is prefetched for the employees and dates of
+    the batch, the punches are applied in memory in time order, then the
+    activities are written with ``bulk_create``/``bulk_update`` and each
+    touched attendance is saved once, its ``save`` keeps the overtime account
+    and the payroll work records in step.
+    """
+
+    def __init__(self, punches):
+        self.punches = punches
+        self.summary = {
+            "received": 0,
+            "duplicates": 0,
+            "unknown": 0,
+            "ignored": 0,
+            "activities": 0,
+            "attendances": 0,
+            "errors": 0,
+        }
+        self.sequence = 0
+        self.new_activities = []
+        self.closed_activities = {}
+        self.touched_attendances = {}
+        self.late_comes = []
+        self.early_outs = {}
+
+    def next_sequence(self):
+        """
+        Unsaved rows sort after the saved ones, like the ids they will get
+        """
+        self.sequence += 1
+        return (1, self.sequence)
+
+    def prefetch(self):
+        employee_ids = list(self.punches)
+        self.employees = {
+            employee.pk: employee
+            for employee in Employee.objects.filter(id__in=employee_ids).select_related(
+                "employee_work_info__shift_id__grace_time_id",
+                "employee_work_info__work_type_id",
+            )
+        }
+        first_date = min(
+            punch_datetime.date()
+            for punches in self.punches.values()
+            for punch_datetime, _direction in punches
+        ) - timedelta(days=1)
+        first_open_date = AttendanceActivity.objects.filter(
+            employee_id__in=employee_ids, clock_out__isnull=True
+        ).aggregate(first_date=Min("attendance_date"))["first_date"]
+        if first_open_date is not None:
+            first_date = min(first_date, first_open_date)
+
+        self.activities = defaultdict(list)
+        self.known_punches = set()
+        for activity in AttendanceActivity.objects.filter(
+            Q(attendance_date__gte=first_date) | Q(clock_out__isnull=True),
+            employee_id__in=employee_ids,
+        ).order_by("attendance_date", "id"):
+            activity.sequence = (0, activity.pk)
+            self.activities[activity.employee_id_id].append(activity)
+            if activity.in_datetime:
+                self.known_punches.add(
+                    (activity.employee_id_id, activity.in_datetime, CLOCK_IN)
+                )
+            if activity.out_datetime:
+                self.known_punches.add(
+                    (activity.employee_id_id, activity.out_datetime, CLOCK_OUT)
+                )
+
+        latest_attendance = (
+            Attendance.objects.filter(employee_id=OuterRef("employee_id"))
+            .order_by("-attendance_date", "-id")
+            .values("id")[:1]
+        )
+        self.attendances = defaultdict(dict)
+        for attendance in Attendance.objects.filter(
+            Q(attendance_date__gte=first_date) | Q(id=Subquery(latest_attendance)),
+            employee_id__in=employee_ids,
+        ).order_by("attendance_date", "id"):
+            attendance.sequence = (0, attendance.pk)
+            self.attendances[attendance.employee_id_id][
+                attendance.attendance_date
+            ] = attendance
+
+        attendance_ids = [
+            attendance.pk
+            for attendances in self.attendances.values()
+            for attendance in attendances.values()
+        ]
+        self.has_early_out = set(
+            AttendanceLateComeEarlyOut.objects.filter(
+                attendance_id__in=attendance_ids, type="early_out"
+            ).values_list("attendance_id", flat=True)
+        )
+
+        shift_ids = {
+            employee.employee_work_info.shift_id_id
+            for employee in self.employees.values()
+            if getattr(employee, "employee_work_info", None) is not None
+        }
+        self.schedules = {}
+        for schedule in EmployeeShiftSchedule.objects.filter(shift_id__in=shift_ids):
+            self.schedules.setdefault(
+                (schedule.shift_id_id, schedule.day_id),
+                (
+                    schedule.minimum_working_hour,
+                    strtime_seconds(schedule.start_time.strftime("%H:%M")),
+                    strtime_seconds(schedule.end_time.strftime("%H:%M")),
+                ),
+            )
+        self.default_grace_time = GraceTime.objects.filter(
+            is_default=True, is_active=True
+        ).first()
+        condition = AttendanceValidationCondition.objects.first()
+        self.condition_for_at_work = strtime_seconds(
+            condition.validation_at_work if condition else "09:00"
+        )
+
+    def schedule(self, shift, day):
+        """
+        Minimum hour, start seconds and end seconds like ``shift_schedule_today``
+        """
+        shift_id = shift.pk if shift is not None else None
+        return self.schedules.get((shift_id, day.pk), ("00:00", 0, 0))
+
+    def latest_attendance(self, employee):
+        attendances = self.attendances[employee.pk].values()
+        if not attendances:
+            return None
+        return max(
+            attendances,
+            key=lambda attendance: (attendance.attendance_date, attendance.sequence),
+        )
+
+    def touch(self, attendance):
+        self.touched_attendances[id(attendance)] = attendance
+
+    def clock_in(self, employee, punch_datetime):
+        work_info = employee.employee_work_info
+        shift = work_info.shift_id
+        date_today = punch_datetime.date()
+        clock_in_sec = strtime_seconds(punch_datetime.strftime("%H:%M"))
+        attendance_date = date_today
+        day = get_shift_day(date_today)
+        minimum_hour, start_time, end_time = self.schedule(shift, day)
+        if start_time > end_time and clock_in_sec < MID_DAY_SEC:
+            # night shift, clocking in before noon belongs to yesterday
+            attendance_date = date_today - timedelta(days=1)
+            day = get_shift_day(attendance_date)
+            minimum_hour, start_time, end_time = self.schedule(shift, day)
+
+        activities = self.activities[employee.pk]
+        open_activities = [
+            activity
+            for activity in activities
+            if activity.clock_out is None
+            and activity.attendance_date == attendance_date
+            and activity.clock_in_date == date_today
+            and activity.shift_day_id == day.pk
+        ]
+        if open_activities:
+            activity = min(
+                open_activities,
+                key=lambda activity: (activity.clock_in, activity.sequence),
+            )
+            activity.clock_out = punch_datetime.time()
+            activity.clock_out_date = date_today
+            self.closed_activities[id(activity)] = activity
+
+        activity = AttendanceActivity(
+            employee_id=employee,
+            attendance_date=attendance_date,
+            clock_in_date=date_today,
+            shift_day=day,
+            clock_in=punch_datetime.time(),
+            in_datetime=stored_datetime(punch_datetime),
+        )
+        activity.sequence = self.next_sequence()
+        activities.append(activity)
+        self.new_activities.append(activity)
+
+        attendance = self.attendances[employee.pk].get(attendance_date)
+        if attendance is None:
+            attendance = Attendance(
+                employee_id=employee,
+                shift_id=shift,
+                work_type_id=work_info.work_type_id,
+                attendance_date=attendance_date,
+                attendance_day=day,
+                attendance_clock_in=punch_datetime.time().replace(second=0),
+                attendance_clock_in_date=date_today,
+                minimum_hour=minimum_hour,
+            )
+            # the first save of the attendance clears the minimum hour on
+            # holidays and company leaves before the clock-out uses it
+            if is_non_working_day(attendance_date, work_info.company_id_id):
+                attendance.minimum_hour = "00:00"
+            attendance.sequence = self.next_sequence()
+            self.attendances[employee.pk][attendance_date] = attendance
+            if is_late_come(
+                clock_in_sec, start_time, end_time, shift, self.default_grace_time
+            ):
+                self.late_comes.append(attendance)
+        else:
+            attendance.attendance_clock_out = None
+            attendance.attendance_clock_out_date = None
+            self.early_outs[id(attendance)] = False
+        self.touch(attendance)
+
+    def clock_out(self, employee, punch_datetime):
+        activities = self.activities[employee.pk]
+        open_activities = [
+            activity for activity in activities if activity.clock_out is None
+        ]
+        if not open_activities:
+            self.summary["ignored"] += 1
+            return
+        activity = max(
+            open_activities,
+            key=lambda activity: (
+                activity.attendance_date or date.min,
+                activity.sequence,
+            ),
+        )
+        activity.clock_out = punch_datetime.time()
+        activity.clock_out_date = punch_datetime.date()
+        activity.out_datetime = stored_datetime(punch_datetime)
+        self.closed_activities[id(activity)] = activity
+
+        attendance = self.latest_attendance(employee)
+        if attendance is None:
+            return
+        day = attendance.attendance_day or get_shift_day(attendance.attendance_date)
+        _minimum_hour, start_time, end_time = self.schedule(
+            employee.employee_work_info.shift_id, day
+        )
+        worked_seconds = sum(
+            activity_seconds(closed_activity)
+            for closed_activity in activities
+            if closed_activity.attendance_date == activity.attendance_date
+            and closed_activity.clock_out is not None
+            and closed_activity.clock_in_date is not None
+            and closed_activity.clock_out_date is not None
+        )
+        minimum_hour_sec = strtime_seconds(attendance.minimum_hour)
+        worked_seconds = strtime_seconds(format_time(worked_seconds))
+        attendance.attendance_clock_out = punch_datetime.time().replace(second=0)
+        attendance.attendance_clock_out_date = punch_datetime.date()
+        attendance.attendance_worked_hour = format_time(worked_seconds)
+        attendance.attendance_overtime = format_time(
+            max(0, worked_seconds - minimum_hour_sec)
+        )
+        attendance.attendance_validated = self.condition_for_at_work >= worked_seconds
+        has_early_out = self.early_outs.get(
+            id(attendance), attendance.pk in self.has_early_out
+        )
+        if not has_early_out:
+            self.early_outs[id(attendance)] = is_early_out(
+                strtime_seconds(punch_datetime.strftime("%H:%M")), start_time, end_time
+            )
+        self.touch(attendance)
+
+    def apply(self):
+        for employee_id, punches in self.punches.items():
+            employee = self.employees.get(employee_id)
+            if getattr(employee, "employee_work_info", None) is None:
+                self.summary["unknown"] += len(punches)
+                continue
+            for punch_datetime, direction in punches:
+                if (employee_id, stored_datetime(punch_datetime), direction) in (
+                    self.known_punches
+                ):
+                    self.summary["duplicates"] += 1
+                elif direction == CLOCK_IN:
+                    self.clock_in(employee, punch_datetime)
+                else:
+                    self.clock_out(employee, punch_datetime)
+
+    def write(self):
+        AttendanceActivity.objects.bulk_update(
+            [
+                activity
+                for activity in self.closed_activities.values()
+                if activity.pk is not None
+            ],
+            ["clock_out", "clock_out_date", "out_datetime"],
+        )
+        AttendanceActivity.objects.bulk_create(self.new_activities)
+        self.summary["activities"] = len(self.new_activities)
+
+        saved = set()
+        for attendance in sorted(
+            self.touched_attendances.values(),
+            key=lambda attendance: (attendance.attendance_date, attendance.sequence),
+        ):
+            try:
+                with transaction.atomic():
+                    attendance.save()
+                saved.add(id(attendance))
+            except Exception as error:
+                self.summary["errors"] += 1
+                logger.error(f"Unable to record the punches of {attendance}: {error}")
+        self.summary["attendances"] = len(saved)
+
+        reports = [
+            AttendanceLateComeEarlyOut(
+                attendance_id=attendance,
+                employee_id=attendance.employee_id,
+                type="late_come",
+            )
+            for attendance in self.late_comes
+            if id(attendance) in saved
+        ]
+        removed_early_outs = []
+        for attendance in self.touched_attendances.values():
+            if id(attendance) not in saved or id(attendance) not in self.early_outs:
+                continue
+            had_early_out = attendance.pk in self.has_early_out
+            if self.early_outs[id(attendance)] and not had_early_out:
+                reports.append(
+                    AttendanceLateComeEarlyOut(
+                        attendance_id=attendance,
+                        employee_id=attendance.employee_id,
+                        type="early_out",
+                    )
+                )
+            elif had_early_out and not self.early_outs[id(attendance)]:
+                removed_early_outs.append(attendance.pk)
+        AttendanceLateComeEarlyOut.objects.bulk_create(reports)
+        AttendanceLateComeEarlyOut.objects.filter(
+            attendance_id__in=removed_early_outs, type="early_out"
+        ).delete()
+
+    def run(self):
+        if self.punches:
+            self.prefetch()
+            self.apply()
+            with transaction.atomic():
+                self.write()
+        return self.summary
+
+
+def ingest_punches(events):
+    """
+    Records a batch of punches and returns the counts of what was done with them.
+
+    args:
+        events : iterable of ``(employee, datetime, direction)``, the employee is
+                 an Employee instance or its id and the direction is ``"in"``
+                 or ``"out"``. Naive datetimes are taken as local time.
+    """
+    punches = defaultdict(set)
+    received = unknown = 0
+    for employee, punch_datetime, direction in events:
+        received += 1
+        employee_id = getattr(employee, "pk", employee)
+        if employee_id is None or direction not in (CLOCK_IN, CLOCK_OUT):
+            unknown += 1
+            continue
+        punches[employee_id].add((local_datetime(punch_datetime), direction))
+
+    ingestion = PunchIngestion(
+        {employee_id: sorted(events) for employee_id, events in punches.items()}
+    )
+    summary = ingestion.run()
+    summary["received"] = received
+    summary["unknown"] += unknown
+    summary["duplicates"] += (
+        received - unknown - sum(len(events) for events in punches.values())
+    )
+    if received:
+        logger.info(f"Recorded punches: {summary}")
+    return summary
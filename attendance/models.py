@@ -25,14 +25,8 @@ from base.models import Company, EmployeeShift, EmployeeShiftDay, WorkType
 from employee.models import Employee
 from horilla.models import HorillaModel
 from horilla_audit.models import HorillaAuditInfo, HorillaAuditLog
-from leave.models import (
-    WEEK_DAYS,
-    WEEKS,
-    CompanyLeave,
-    Holiday,
-    LeaveRequest,
-    LeaveType,
-)
+from leave.holiday_calendar import is_non_working_day
+from leave.models import LeaveRequest, LeaveType
 
 # Create your models here.
 
@@ -59,6 +53,22 @@ def format_time(seconds):
     return f"{hour:02d}:{minutes:02d}"
 
 
+# EmployeeShiftDay rows never change, they are looked up once per process
+shift_days = {}
+
+
+def get_shift_day(attendance_date):
+    """
+    this method is used to get the EmployeeShiftDay of a date
+    args:
+        attendance_date : date
+    """
+    day = attendance_date.strftime("%A").lower()
+    if day not in shift_days:
+        shift_days[day] = EmployeeShiftDay.objects.get(day=day)
+    return shift_days[day]
+
+
 def validate_time_format(value):
     """
     this method is used to validate the format of duration like fields.
@@ -359,65 +369,24 @@ class Attendance(HorillaModel):
 
         self.at_work_second = strtime_seconds(self_at_work)
         self.overtime_second = strtime_seconds(self_overtime)
-        self.attendance_day = EmployeeShiftDay.objects.get(
-            day=self.attendance_date.strftime("%A").lower()
-        )
+        self.attendance_day = get_shift_day(self.attendance_date)
         prev_attendance_approved = False
 
-        # Taking all holidays into a list
-        leaves = []
-        holidays = Holiday.objects.all()
-        for holi in holidays:
-            start_date = holi.start_date
-            end_date = holi.end_date
-
-            # Convert start_date and end_date to datetime objects
-            start_date = datetime.strptime(str(start_date), "%Y-%m-%d")
-            end_date = datetime.strptime(str(end_date), "%Y-%m-%d")
-
-            # Add dates in between start date and end date including both
-            current_date = start_date
-            while current_date <= end_date:
-                leaves.append(current_date.strftime("%Y-%m-%d"))
-                current_date += timedelta(days=1)
-
-        # Checking attendance date is in holiday list, if found making the minimum hour to 00:00
-        for leave in leaves:
-            if str(leave) == str(self.attendance_date):
-                self.minimum_hour = "00:00"
-                break
-
-        # Making a dictonary contains week day value and leave day pairs
-        company_leaves = {}
-        company_leave = CompanyLeave.objects.all()
-        for com_leave in company_leave:
-            a = dict(WEEK_DAYS).get(com_leave.based_on_week_day)
-            b = com_leave.based_on_week
-            company_leaves[b] = a
-
-        # Checking the attendance date is in which week
-        week_in_month = str(((self.attendance_date.day - 1) // 7 + 1) - 1)
-
-        # Checking the attendance date is in the company leave or not
-        for pairs in company_leaves.items():
-            # For all weeks based_on_week is None
-            if str(pairs[0]) == "None":
-                if str(pairs[1]) == str(self.attendance_day):
-                    self.minimum_hour = "00:00"
-                    break
-            # Checking with based_on_week and attendance_date week
-            if str(pairs[0]) == week_in_month:
-                if str(pairs[1]) == str(self.attendance_day):
-                    self.minimum_hour = "00:00"
-                    break
-
-        condition = AttendanceValidationCondition.objects.first()
+        # Holidays and company leaves have no minimum hour
+        work_info = getattr(self.employee_id, "employee_work_info", None)
+        if is_non_working_day(
+            self.attendance_date, getattr(work_info, "company_id_id", None)
+        ):
+            self.minimum_hour = "00:00"
+
+        overtime_cutoff = AttendanceValidationCondition.objects.values_list(
+            "overtime_cutoff", flat=True
+        ).first()
         if self.is_validate_request:
             self.is_validate_request_approved = False
             self.attendance_validated = False
 
-        if condition is not None and condition.overtime_cutoff is not None:
-            overtime_cutoff = condition.overtime_cutoff
+        if overtime_cutoff is not None:
             cutoff_seconds = strtime_seconds(overtime_cutoff)
             overtime = self.overtime_second
             if overtime > cutoff_seconds:
@@ -426,35 +395,39 @@ class Attendance(HorillaModel):
 
         if self.pk is not None:
             # Get the previous values of the boolean field
-            prev_state = Attendance.objects.get(pk=self.pk)
-            prev_attendance_approved = prev_state.attendance_overtime_approve
+            prev_attendance_approved = bool(
+                Attendance.objects.filter(pk=self.pk)
+                .values_list("attendance_overtime_approve", flat=True)
+                .first()
+            )
+
+        approved = self.attendance_overtime_approve
+        prev_approved_overtime_second = self.approved_overtime_second
+        if approved and prev_attendance_approved is False:
+            self.approved_overtime_second = self.overtime_second
+        elif not approved:
+            self.approved_overtime_second = 0
 
         super().save(*args, **kwargs)
         self.first_save = False
         employee_ot = self.employee_id.employee_overtime.filter(
             month=self.attendance_date.strftime("%B").lower(),
             year=self.attendance_date.strftime("%Y"),
-        )
-        if employee_ot.exists():
-            self.update_ot(employee_ot.first())
-        else:
-            self.create_ot()
-            self.update_ot(employee_ot.first())
-        approved = self.attendance_overtime_approve
-        attendance_account = self.employee_id.employee_overtime.filter(
-            month=self.attendance_date.strftime("%B").lower(),
-            year=self.attendance_date.year,
         ).first()
+        if employee_ot is None:
+            self.create_ot()
+            employee_ot = self.employee_id.employee_overtime.filter(
+                month=self.attendance_date.strftime("%B").lower(),
+                year=self.attendance_date.strftime("%Y"),
+            ).first()
+        attendance_account = self.update_ot(employee_ot)
         total_ot_seconds = attendance_account.overtime_second
         if approved and prev_attendance_approved is False:
-            self.approved_overtime_second = self.overtime_second
             total_ot_seconds = total_ot_seconds + self.approved_overtime_second
         elif not approved:
-            total_ot_seconds = total_ot_seconds - self.approved_overtime_second
-            self.approved_overtime_second = 0
+            total_ot_seconds = total_ot_seconds - prev_approved_overtime_second
         attendance_account.overtime = format_time(total_ot_seconds)
         attendance_account.save()
-        super().save(*args, **kwargs)
 
     def serialize(self):
         """
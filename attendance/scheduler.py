@@ -1,50 +1,127 @@
-import datetime
+"""
+scheduler.py
+
+This module is used to register scheduled tasks
+"""
+
+import logging
+import time
 from datetime import datetime
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from django.utils import timezone
+from django.db.models import Exists, OuterRef
+
+from horilla.horilla_scheduler import scheduler
+
+logger = logging.getLogger("scheduler")
 
 
 def auto_check_out():
+    """
+    Clock out the employees who forgot to check out on a previous day, once the
+    start time of their shift for today has passed.
 
-    from attendance.models import AttendanceActivity
-    from attendance.views.clock_in_out import clock_out_attendance_and_activity
+    The due activities are selected with one query and closed in bulk, the
+    related attendances are then re-calculated from the activities of their day.
+    """
+    from attendance.models import (
+        Attendance,
+        AttendanceActivity,
+        AttendanceValidationCondition,
+    )
+    from attendance.views.views import (
+        activity_datetime,
+        format_time,
+        overtime_calculation,
+        strtime_seconds,
+    )
     from base.models import EmployeeShiftSchedule
-    from employee.models import Employee
-
-    try:
-        today = datetime.now()
-        shift_schedules = EmployeeShiftSchedule.objects.all()
-        employees = Employee.objects.all()
-        for employee in employees:
-            work_info = getattr(employee, "employee_work_info", None)
-            shift_id = getattr(work_info, "shift_id", None)
-            shift_schedule = shift_schedules.filter(
-                day__day=today.strftime("%A").lower(), shift_id=shift_id
-            ).first()
-            attendance_activity = AttendanceActivity.objects.filter(
-                employee_id=employee, clock_out__isnull=True
-            ).first()
-            if (
-                shift_schedule
-                and attendance_activity
-                and attendance_activity.attendance_date < today.date()
-            ):
-                if (
-                    not attendance_activity.clock_out
-                    and shift_schedule.start_time <= today.time()
-                ):
-                    clock_out_attendance_and_activity(
-                        employee=employee,
-                        date_today=today.date(),
-                        now=today.time().strftime("%H:%M"),
-                        out_datetime=today,
-                    )
-
-    except:
-        pass
-
-
-scheduler = BackgroundScheduler()
+
+    started = time.monotonic()
+    now = datetime.now()
+    today = now.date()
+    started_shift = EmployeeShiftSchedule.objects.filter(
+        shift_id=OuterRef("employee_id__employee_work_info__shift_id"),
+        day__day=today.strftime("%A").lower(),
+        start_time__lte=now.time(),
+    )
+    open_today = AttendanceActivity.objects.filter(
+        employee_id=OuterRef("employee_id"),
+        clock_out__isnull=True,
+        attendance_date__gte=today,
+    )
+    open_activities = (
+        AttendanceActivity.objects.filter(
+            clock_out__isnull=True,
+            attendance_date__lt=today,
+            employee_id__is_active=True,
+        )
+        .filter(Exists(started_shift))
+        .exclude(Exists(open_today))
+        .order_by("employee_id", "-attendance_date", "-id")
+    )
+
+    # only the latest open activity of an employee is closed
+    activities = {}
+    for activity in open_activities:
+        activities.setdefault(activity.employee_id_id, activity)
+    if not activities:
+        return
+
+    for activity in activities.values():
+        activity.clock_out = now.time()
+        activity.clock_out_date = today
+        activity.out_datetime = now
+    AttendanceActivity.objects.bulk_update(
+        activities.values(), ["clock_out", "clock_out_date", "out_datetime"]
+    )
+
+    attendance_keys = {
+        (activity.employee_id_id, activity.attendance_date)
+        for activity in activities.values()
+    }
+    employee_ids = {key[0] for key in attendance_keys}
+    attendance_dates = {key[1] for key in attendance_keys}
+    worked_seconds = dict.fromkeys(attendance_keys, 0)
+    closed_activities = AttendanceActivity.objects.filter(
+        employee_id__in=employee_ids,
+        attendance_date__in=attendance_dates,
+        clock_out__isnull=False,
+    )
+    for activity in closed_activities:
+        key = (activity.employee_id_id, activity.attendance_date)
+        if key in worked_seconds:
+            in_datetime, out_datetime = activity_datetime(activity)
+            worked_seconds[key] += int((out_datetime - in_datetime).total_seconds())
+
+    condition = AttendanceValidationCondition.objects.first()
+    validation_at_work = strtime_seconds(
+        condition.validation_at_work if condition else "09:00"
+    )
+    attendances = Attendance.objects.filter(
+        employee_id__in=employee_ids, attendance_date__in=attendance_dates
+    ).select_related("employee_id")
+    closed = 0
+    for attendance in attendances:
+        key = (attendance.employee_id_id, attendance.attendance_date)
+        if key not in worked_seconds:
+            continue
+        attendance.attendance_clock_out = now.strftime("%H:%M:00")
+        attendance.attendance_clock_out_date = today
+        attendance.attendance_worked_hour = format_time(worked_seconds[key])
+        attendance.attendance_overtime = overtime_calculation(attendance)
+        attendance.attendance_validated = validation_at_work >= strtime_seconds(
+            attendance.attendance_worked_hour
+        )
+        try:
+            attendance.save()
+            closed += 1
+        except Exception as error:
+            logger.error(f"Auto check-out failed for {attendance}: {error}")
+
+    logger.info(
+        f"Auto check-out closed {len(activities)} activities and {closed} "
+        f"attendances in {time.monotonic() - started:.2f}s"
+    )
+
+
 scheduler.add_job(auto_check_out, "interval", seconds=30)
-scheduler.start()
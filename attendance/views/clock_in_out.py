@@ -6,7 +6,6 @@ This module is used register endpoints to the check-in check-out functionalities
 
 from datetime import date, datetime, timedelta
 
-from django.db.models import Q
 from django.http import HttpResponse
 from django.utils.translation import gettext_lazy as _
 
@@ -303,9 +302,9 @@ def clock_out_attendance_and_activity(employee, date_today, now, out_datetime=No
         attendance_activity.clock_out_date = date_today
         attendance_activity.out_datetime = out_datetime
         attendance_activity.save()
-    attendance_activities = attendance_activities.filter(~Q(clock_out=None)).filter(
-        attendance_date=attendance_activity.attendance_date
-    )
+    attendance_activities = AttendanceActivity.objects.filter(
+        employee_id=employee, attendance_date=attendance_activity.attendance_date
+    ).exclude(clock_out=None)
     # Here calculate the total durations between the attendance activities
 
     duration = 0
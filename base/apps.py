@@ -12,3 +12,11 @@ class BaseConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "base"
+
+    def ready(self):
+        from base.general_settings import connect_snapshot_signals
+        from base.horilla_company_manager import register_company_fields
+
+        register_company_fields()
+        connect_snapshot_signals()
+        super().ready()
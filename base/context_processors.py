@@ -7,14 +7,10 @@ This module is used to register context processor`
 from django.http import HttpResponse
 from django.urls import path
 
-from attendance.models import AttendanceGeneralSetting
+from base.general_settings import get_snapshot
 from base.models import Company
 from base.urls import urlpatterns
-from employee.models import EmployeeGeneralSetting
 from horilla import horilla_apps
-from offboarding.models import OffboardingGeneralSetting
-from payroll.models.models import PayrollGeneralSetting
-from recruitment.models import RecruitmentGeneralSetting
 
 
 class AllCompany:
@@ -37,7 +33,7 @@ def get_companies(request):
     """
     companies = list(
         [company.id, company.company, company.icon.url, False]
-        for company in Company.objects.all()
+        for company in get_snapshot(request).companies
     )
     companies = [
         [
@@ -103,7 +99,7 @@ urlpatterns.append(
 def white_labelling_company(request):
     white_labelling = getattr(horilla_apps, "WHITE_LABELLING", False)
     if white_labelling:
-        hq = Company.objects.filter(hq=True).last()
+        hq = get_snapshot(request).hq
         try:
             company = (
                 request.user.employee_get.get_company()
@@ -128,7 +124,7 @@ def resignation_request_enabled(request):
     """
     Check weather resignation_request enabled of not in offboarding
     """
-    first = OffboardingGeneralSetting.objects.first()
+    first = get_snapshot(request).setting("offboarding")
     enabled_resignation_request = False
     if first:
         enabled_resignation_request = first.resignation_request
@@ -139,7 +135,7 @@ def timerunner_enabled(request):
     """
     Check weather resignation_request enabled of not in offboarding
     """
-    first = AttendanceGeneralSetting.objects.first()
+    first = get_snapshot(request).setting("attendance")
     enabled_timerunner = True
     if first:
         enabled_timerunner = first.time_runner
@@ -150,7 +146,7 @@ def intial_notice_period(request):
     """
     Check weather resignation_request enabled of not in offboarding
     """
-    first = PayrollGeneralSetting.objects.first()
+    first = get_snapshot(request).setting("payroll")
     initial = 30
     if first:
         initial = first.notice_period
@@ -161,7 +157,7 @@ def check_candidate_self_tracking(request):
     """
     This method is used to get the candidate self tracking is enabled or not
     """
-    first = RecruitmentGeneralSetting.objects.first()
+    first = get_snapshot(request).setting("recruitment")
     candidate_self_tracking = False
     if first:
         candidate_self_tracking = first.candidate_self_tracking
@@ -172,7 +168,7 @@ def check_candidate_self_tracking_rating(request):
     """
     This method is used to check enabled/disabled of rating option
     """
-    first = RecruitmentGeneralSetting.objects.first()
+    first = get_snapshot(request).setting("recruitment")
     rating_option = False
     if first:
         rating_option = first.show_overall_rating
@@ -183,7 +179,7 @@ def get_initial_prefix(request):
     """
     This method is used to get the initial prefix
     """
-    settings = EmployeeGeneralSetting.objects.first()
+    settings = get_snapshot(request).setting("employee")
     instance_id = None
     prefix = "PEP"
     if settings:
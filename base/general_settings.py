@@ -0,0 +1,104 @@
+"""
+general_settings.py
+
+This module keeps a snapshot of the general settings of the modules and of the
+companies, so that the context processors read them from memory instead of
+querying every setting on each template render.
+
+The snapshot is loaded once per process and served from memory, each request
+checks once whether it is still current against a version key in Django's
+cache. Saving, updating or deleting a setting or a company bumps the version
+key, which reloads the snapshot in every process.
+"""
+
+import threading
+
+from django.db.models.signals import post_delete, post_save
+
+from horilla.horilla_cache import bump_version, cache_version
+from horilla.signals import post_bulk_update
+
+CACHE_VERSION_KEY = "base_general_settings_version"
+
+# Setting models of the snapshot, the first row of each is the setting in use
+SETTING_MODELS = {
+    "attendance": "attendance.AttendanceGeneralSetting",
+    "employee": "employee.EmployeeGeneralSetting",
+    "offboarding": "offboarding.OffboardingGeneralSetting",
+    "payroll": "payroll.PayrollGeneralSetting",
+    "recruitment": "recruitment.RecruitmentGeneralSetting",
+}
+
+_state = {"version": None, "snapshot": None}
+_lock = threading.Lock()
+
+
+class SettingsSnapshot:
+    """
+    Companies and general settings as loaded for one version
+    """
+
+    def __init__(self):
+        from django.apps import apps
+
+        from base.models import Company
+
+        self.companies = list(Company.objects.all())
+        hq_companies = [company for company in self.companies if company.hq]
+        self.hq = max(hq_companies, key=lambda company: company.pk, default=None)
+        self.settings = {
+            name: apps.get_model(model_path).objects.first()
+            for name, model_path in SETTING_MODELS.items()
+        }
+
+    def setting(self, name):
+        """
+        The general setting of a module, None when it wasn't saved yet
+        """
+        return self.settings.get(name)
+
+
+def get_snapshot(request=None):
+    """
+    Returns the current SettingsSnapshot, the version is checked once per
+    request
+    """
+    snapshot = getattr(request, "general_settings_snapshot", None)
+    if snapshot is not None:
+        return snapshot
+    version = cache_version(CACHE_VERSION_KEY)
+    with _lock:
+        snapshot = _state["snapshot"]
+        if snapshot is None or version is None or version != _state["version"]:
+            snapshot = SettingsSnapshot()
+            _state["snapshot"] = snapshot
+            _state["version"] = version
+    if request is not None:
+        request.general_settings_snapshot = snapshot
+    return snapshot
+
+
+def invalidate_snapshot(*args, **kwargs):
+    """
+    Signal receiver reloading the snapshot of every process
+    """
+    with _lock:
+        _state["snapshot"] = None
+        _state["version"] = None
+    bump_version(CACHE_VERSION_KEY)
+
+
+def connect_snapshot_signals():
+    """
+    Reload the snapshot when a company or a general setting changes, called
+    once the apps are ready
+    """
+    from django.apps import apps
+
+    models = ["base.Company"] + list(SETTING_MODELS.values())
+    for model_path in models:
+        model = apps.get_model(model_path)
+        uid = f"general_settings_snapshot_{model_path}"
+        post_save.connect(invalidate_snapshot, sender=model, dispatch_uid=uid)
+        post_delete.connect(invalidate_snapshot, sender=model, dispatch_uid=uid)
+        post_bulk_update.connect(invalidate_snapshot, sender=model, dispatch_uid=uid)
@@ -1,10 +1,23 @@
 """
 horilla_company_manager.py
+
+The models of the company apps are limited to the company selected in the
+session of the request. The field linking each model to its company, its
+``company_id`` field or the ``related_company_field`` of its manager, is
+registered once when the apps are ready, the filter is built from it and the
+selected company without touching the model classes.
+
+When the company field goes through a many valued relation the join can return
+a row more than once, the filter is then applied as a semi-join on the primary
+key instead of joining the rows, so scoping a queryset never costs a query of
+its own.
 """
 
 import threading
 from typing import Coroutine, Sequence
 
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
 from django.db.models.query import QuerySet
 
@@ -28,6 +41,100 @@ def update(self, *args, **kwargs):
 
 setattr(QuerySet, "update", update)
 
+# Apps whose models are limited to the selected company
+COMPANY_APP_LABELS = [
+    "recruitment",
+    "employee",
+    "onboarding",
+    "attendance",
+    "leave",
+    "payroll",
+    "asset",
+    "pms",
+    "base",
+    "helpdesk",
+    "offboarding",
+    "horilla_documents",
+]
+
+# Company field of the models, None for the models not limited to a company
+_company_fields = {}
+
+# Models whose company filter goes through a many valued relation
+_fan_out = {}
+
+
+def company_filter_fans_out(model, field_path):
+    """
+    Whether filtering the model on the ``__`` separated field path can return
+    a row more than once, that is whether the path crosses a many to many or a
+    reverse foreign key relation
+    """
+    key = (model, field_path)
+    fans_out = _fan_out.get(key)
+    if fans_out is None:
+        fans_out = False
+        current_model = model
+        for name in field_path.split("__"):
+            try:
+                field = current_model._meta.get_field(name)
+            except FieldDoesNotExist:
+                break
+            if field.many_to_many or field.one_to_many:
+                fans_out = True
+                break
+            if not field.is_relation:
+                break
+            current_model = field.related_model
+        _fan_out[key] = fans_out
+    return fans_out
+
+
+def company_field(model):
+    """
+    Path of the field linking the model to its company, None when the model
+    isn't limited to the selected company
+    """
+    if model in _company_fields:
+        return _company_fields[model]
+    field_path = None
+    if model._meta.app_label in COMPANY_APP_LABELS:
+        manager = getattr(model, "objects", None)
+        if getattr(model, "company_id", None):
+            field_path = "company_id"
+        elif (
+            isinstance(manager, HorillaCompanyManager) and manager.related_company_field
+        ):
+            field_path = manager.related_company_field
+    _company_fields[model] = field_path
+    return field_path
+
+
+def register_company_fields():
+    """
+    Register the company field of every model, called once the apps are ready
+    """
+    for model in apps.get_models():
+        field_path = company_field(model)
+        if field_path is not None:
+            company_filter_fans_out(model, field_path)
+
+
+def company_filter(model, company_id):
+    """
+    Q filter limiting the model to the rows of the company and to the rows
+    without company, None when the model isn't limited to a company
+    """
+    field_path = company_field(model)
+    if field_path is None:
+        return None
+    company_q = models.Q(**{field_path: company_id}) | models.Q(
+        **{f"{field_path}__isnull": True}
+    )
+    if company_filter_fans_out(model, field_path):
+        return models.Q(pk__in=model._base_manager.filter(company_q).values("pk"))
+    return company_q
+
 
 class HorillaCompanyManager(models.Manager):
     """
@@ -46,27 +153,34 @@ class HorillaCompanyManager(models.Manager):
         """
         get_queryset method
         """
+        request = getattr(_thread_locals, "request", None)
+        if request is None:
+            return super().get_queryset()
+        selected_company = request.session.get("selected_company")
+        # built once per request and model, every caller gets a copy
+        scoped_querysets = request.__dict__.setdefault("company_scoped_querysets", {})
+        key = (self.model, selected_company)
+        queryset = scoped_querysets.get(key)
+        if queryset is None:
+            queryset = self.scoped_queryset(selected_company)
+            scoped_querysets[key] = queryset
+        return queryset._chain()
+
+    def scoped_queryset(self, selected_company):
+        """
+        Queryset of the model limited to the selected company
+        """
         from horilla.decorators import logger
 
         queryset = super().get_queryset()
-        request = getattr(_thread_locals, "request", None)
-        selected_company = None
-        if request is not None:
-            selected_company = request.session.get("selected_company")
+        if selected_company == "all" or not selected_company:
+            return queryset
         try:
-            queryset = (
-                queryset.filter(self.model.company_filter)
-                if selected_company != "all" and selected_company
-                else queryset
-            )
+            company_q = company_filter(self.model, selected_company)
+            if company_q is not None:
+                queryset = queryset.filter(company_q)
         except Exception as e:
             logger.error(e)
-        try:
-            has_duplicates = queryset.count() != queryset.distinct().count()
-            if has_duplicates:
-                queryset = queryset.distinct()
-        except:
-            pass
         return queryset
 
     def all(self):
@@ -76,23 +190,17 @@ class HorillaCompanyManager(models.Manager):
         queryset = []
         try:
             queryset = self.get_queryset()
-            if queryset.exists():
-                try:
-                    model_name = queryset.model._meta.model_name
-                    if model_name == "employee":
-                        queryset = queryset.filter(is_active=True)
-                    else:
-                        for field in queryset.model._meta.fields:
-                            if isinstance(field, models.ForeignKey):
-                                if field.name in self.check_fields:
-                                    related_model_is_active_filter = {
-                                        f"{field.name}__is_active": True
-                                    }
-                                    queryset = queryset.filter(
-                                        **related_model_is_active_filter
-                                    )
-                except:
-                    pass
+            model_name = queryset.model._meta.model_name
+            if model_name == "employee":
+                queryset = queryset.filter(is_active=True)
+            else:
+                for field in queryset.model._meta.fields:
+                    if isinstance(field, models.ForeignKey):
+                        if field.name in self.check_fields:
+                            related_model_is_active_filter = {
+                                f"{field.name}__is_active": True
+                            }
+                            queryset = queryset.filter(**related_model_is_active_filter)
         except:
             pass
         return queryset
@@ -0,0 +1,84 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from horilla_views.view_state import view_state_stats
+
+# Main list views of the modules
+LIST_VIEWS = [
+    "employee-view",
+    "attendance-view",
+    "request-view",
+    "candidate-view",
+    "asset-category-view",
+    "objective-list-view",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Counts the queries (and the COUNT queries among them) of the main list "
+        "views for a user, to benchmark the company scoped querysets, then "
+        "reports the hits, misses and sizes of the view states they used"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", type=str, help="User the views are run as")
+        parser.add_argument(
+            "--company",
+            type=str,
+            default=None,
+            help="Selected company id, all companies when not given",
+        )
+        parser.add_argument(
+            "--view",
+            action="append",
+            dest="views",
+            help="URL name of a view to run instead of the main list views",
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f'User "{options["username"]}" does not exist')
+        client = Client(SERVER_NAME="localhost")
+        client.force_login(user)
+        if options["company"]:
+            session = client.session
+            session["selected_company"] = options["company"]
+            session.save()
+
+        self.stdout.write(
+            f"{'view':<28}{'status':>8}{'queries':>10}{'counts':>9}{'ms':>9}"
+        )
+        for view in options["views"] or LIST_VIEWS:
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(reverse(view))
+                elapsed = (time.perf_counter() - started) * 1000
+            counts = sum(
+                query["sql"].lstrip().upper().startswith("SELECT COUNT")
+                for query in context.captured_queries
+            )
+            self.stdout.write(
+                f"{view:<28}{response.status_code:>8}"
+                f"{len(context.captured_queries):>10}{counts:>9}{elapsed:>9.0f}"
+            )
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'view state':<16}{'hits':>7}{'misses':>8}{'hit ratio':>11}"
+            f"{'writes':>8}{'rejected':>10}{'avg bytes':>11}{'largest':>11}"
+        )
+        for namespace, stats in view_state_stats().items():
+            self.stdout.write(
+                f"{namespace:<16}{stats['hits']:>7}{stats['misses']:>8}"
+                f"{str(stats['hit_ratio']):>11}{stats['writes']:>8}"
+                f"{stats['rejected']:>10}{str(stats['average_size']):>11}"
+                f"{stats['largest']:>11}"
+            )
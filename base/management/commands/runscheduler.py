@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from horilla.horilla_scheduler import ELECTION_INTERVAL, scheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the periodic jobs, for deployments setting SCHEDULER_AUTOSTART "
+        "to False. Several runscheduler processes elect one leader."
+    )
+
+    def handle(self, *args, **options):
+        scheduler.start()
+        self.stdout.write(
+            self.style.SUCCESS(f"Scheduler {scheduler.identity} joined the election")
+        )
+        try:
+            while True:
+                time.sleep(ELECTION_INTERVAL)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.shutdown()
@@ -2,9 +2,8 @@ import io
 import json
 import os
 import random
-from datetime import date, datetime, time
+from datetime import date, time
 
-import pandas as pd
 from django.apps import apps
 from django.conf import settings
 from django.contrib.staticfiles import finders
@@ -18,9 +17,10 @@ from django.template.loader import get_template, render_to_string
 from django.utils.translation import gettext as _
 from xhtml2pdf import pisa
 
-from base.models import Company, DynamicPagination
+from base.models import DynamicPagination
 from employee.models import Employee, EmployeeWorkInformation
 from horilla.decorators import login_required
+from horilla.horilla_export import export_response, queryset_rows
 from leave.models import LeaveRequest, LeaveRequestConditionApproval
 
 
@@ -413,6 +413,110 @@ def closest_numbers(numbers: list, input_number: int) -> tuple:
     return (previous_number, next_number)
 
 
+# strftime formats of the time and date formats of the companies
+EXPORT_TIME_FORMATS = {
+    "hh:mm A": "%I:%M %p",  # 12-hour format
+    "HH:mm": "%H:%M",  # 24-hour format
+}
+EXPORT_DATE_FORMATS = {
+    "DD-MM-YYYY": "%d-%m-%Y",
+    "DD.MM.YYYY": "%d.%m.%Y",
+    "DD/MM/YYYY": "%d/%m/%Y",
+    "MM/DD/YYYY": "%m/%d/%Y",
+    "YYYY-MM-DD": "%Y-%m-%d",
+    "YYYY/MM/DD": "%Y/%m/%d",
+    "MMMM D, YYYY": "%B %d, %Y",
+    "DD MMMM, YYYY": "%d %B, %Y",
+    "MMM. D, YYYY": "%b. %d, %Y",
+    "D MMM. YYYY": "%d %b. %Y",
+    "dddd, MMMM D, YYYY": "%A, %B %d, %Y",
+}
+
+
+def export_select_related(model, field_paths):
+    """
+    Relations the field paths go through, to load them with the records of
+    the export instead of once per record
+    """
+    related = set()
+    for field_path in field_paths:
+        current_model = model
+        names = []
+        for name in field_path.split("__"):
+            try:
+                field = current_model._meta.get_field(name)
+            except Exception:
+                break
+            if (
+                not field.is_relation
+                or field.many_to_many
+                or field.one_to_many
+                or field.related_model is None
+            ):
+                break
+            names.append(name)
+            related.add("__".join(names))
+            current_model = field.related_model
+    return sorted(related)
+
+
+def export_only_fields(model, field_paths):
+    """
+    Columns the field paths read, to load only them with the records of the
+    export. A path ending on a relation loads the whole related record. When
+    a path reads something else than a column or a relation, like a property,
+    every column of the record it is read on is loaded.
+    """
+    only = set()
+    for field_path in field_paths:
+        current_model = model
+        prefix = ""
+        names = field_path.split("__")
+        for index, name in enumerate(names):
+            try:
+                field = current_model._meta.get_field(name)
+            except Exception:
+                field = None
+            last = index == len(names) - 1
+            if (
+                field is None
+                or field.many_to_many
+                or field.one_to_many
+                or (field.is_relation and field.related_model is None)
+                or (not last and not field.is_relation)
+            ):
+                only.update(
+                    prefix + concrete_field.name
+                    for concrete_field in current_model._meta.concrete_fields
+                )
+                break
+            if last:
+                only.add(prefix + name)
+                break
+            prefix += f"{name}__"
+            current_model = field.related_model
+    return sorted(only)
+
+
+def export_formats(request):
+    """
+    Returns the (time format, date format) of the exports of the user, the
+    formats of the company of the employee
+    """
+    time_format = "hh:mm A"
+    date_format = "MMM. D, YYYY"
+    work_info = (
+        EmployeeWorkInformation.objects.filter(employee_id=request.user.employee_get)
+        .select_related("company_id")
+        .last()
+    )
+    if work_info:
+        company = work_info.company_id
+        time_format = company.time_format if company else time_format
+        date_format = company.date_format if company else date_format
+    return EXPORT_TIME_FORMATS.get(time_format), EXPORT_DATE_FORMATS.get(date_format)
+
+
 @login_required
 def export_data(request, model, form_class, filter_class, file_name):
     fields_mapping = {
@@ -444,11 +548,9 @@ def export_data(request, model, form_class, filter_class, file_name):
 
     selected_columns = []
     today_date = date.today().strftime("%Y-%m-%d")
-    file_name = f"{file_name}_{today_date}.xlsx"
-    data_export = {}
+    file_name = f"{file_name}_{today_date}"
 
     form = form_class()
-    model_fields = model._meta.get_fields()
     export_objects = filter_class(request.GET).qs
     selected_fields = request.GET.getlist("selected_fields")
 
@@ -464,121 +566,60 @@ def export_data(request, model, form_class, filter_class, file_name):
         if value in selected_fields:
             selected_columns.append((value, key))
 
-    for field_name, verbose_name in selected_columns:
-        if field_name in selected_fields:
-            data_export[verbose_name] = []
-            for obj in export_objects:
-                value = obj
-                nested_attributes = field_name.split("__")
-                for attr in nested_attributes:
-                    value = getattr(value, attr, None)
-                    if value is None:
-                        break
-                if value is True:
-                    value = _("Yes")
-                elif value is False:
-                    value = _("No")
-                if value in fields_mapping:
-                    value = fields_mapping[value]
-                if value == "None":
-                    value = " "
-                if field_name == "month":
-                    value = _(value.title())
-
-                # Check if the type of 'value' is time
-                if isinstance(value, time):
-                    user = request.user
-                    employee = user.employee_get
-
-                    # Taking the company_name of the user
-                    info = EmployeeWorkInformation.objects.filter(employee_id=employee)
-                    if info.exists():
-                        for data in info:
-                            employee_company = data.company_id
-                        company_name = Company.objects.filter(id=employee_company.id)
-                        emp_company = company_name.first()
-                        # Access the date_format attribute directly
-                        time_format = (
-                            emp_company.time_format if emp_company else "hh:mm A"
-                        )
-                    else:
-                        time_format = "hh:mm A"
-
-                    time_formats = {
-                        "hh:mm A": "%I:%M %p",  # 12-hour format
-                        "HH:mm": "%H:%M",  # 24-hour format
-                    }
-
-                    # Convert the string to a datetime.time object
-                    check_in_time = datetime.strptime(
-                        str(value).split(".")[0], "%H:%M:%S"
-                    ).time()
-
-                    # Print the formatted time for each format
-                    for format_name, format_string in time_formats.items():
-                        if format_name == time_format:
-                            value = check_in_time.strftime(format_string)
-
-                # Check if the type of 'value' is date
-                if type(value) == date:
-                    user = request.user
-                    employee = user.employee_get
-
-                    # Taking the company_name of the user
-                    info = EmployeeWorkInformation.objects.filter(employee_id=employee)
-                    if info.exists():
-                        for data in info:
-                            employee_company = data.company_id
-                        company_name = Company.objects.filter(company=employee_company)
-                        emp_company = company_name.first()
-
-                        # Access the date_format attribute directly
-                        date_format = (
-                            emp_company.date_format if emp_company else "MMM. D, YYYY"
-                        )
-                    else:
-                        date_format = "MMM. D, YYYY"
-                    # Define date formats
-                    date_formats = {
-                        "DD-MM-YYYY": "%d-%m-%Y",
-                        "DD.MM.YYYY": "%d.%m.%Y",
-                        "DD/MM/YYYY": "%d/%m/%Y",
-                        "MM/DD/YYYY": "%m/%d/%Y",
-                        "YYYY-MM-DD": "%Y-%m-%d",
-                        "YYYY/MM/DD": "%Y/%m/%d",
-                        "MMMM D, YYYY": "%B %d, %Y",
-                        "DD MMMM, YYYY": "%d %B, %Y",
-                        "MMM. D, YYYY": "%b. %d, %Y",
-                        "D MMM. YYYY": "%d %b. %Y",
-                        "dddd, MMMM D, YYYY": "%A, %B %d, %Y",
-                    }
-
-                    # Convert the string to a datetime.date object
-                    start_date = datetime.strptime(str(value), "%Y-%m-%d").date()
-
-                    # Print the formatted date for each format
-                    for format_name, format_string in date_formats.items():
-                        if format_name == date_format:
-                            value = start_date.strftime(format_string)
-
-                data_export[verbose_name].append(value)
-
-    data_frame = pd.DataFrame(data=data_export)
-    styled_data_frame = data_frame.style.applymap(
-        lambda x: "text-align: center", subset=pd.IndexSlice[:, :]
+    field_paths = [field_name for field_name, _verbose_name in selected_columns]
+    related = export_select_related(model, field_paths)
+    if related:
+        export_objects = export_objects.select_related(*related)
+    only = export_only_fields(model, field_paths)
+    if only:
+        export_objects = export_objects.only(*only)
+
+    # the formats are read once, when the first time or date is exported
+    formats = []
+
+    def format_value(field_name, value):
+        if value is True:
+            value = _("Yes")
+        elif value is False:
+            value = _("No")
+        if value in fields_mapping:
+            value = fields_mapping[value]
+        if value == "None":
+            value = " "
+        if field_name == "month":
+            value = _(value.title())
+
+        if isinstance(value, time) or type(value) == date:
+            if not formats:
+                formats.extend(export_formats(request))
+            time_format, date_format = formats
+            if isinstance(value, time) and time_format:
+                value = value.strftime(time_format)
+            elif type(value) == date and date_format:
+                value = value.strftime(date_format)
+        return value
+
+    def values(obj):
+        row = []
+        for field_name in field_paths:
+            value = obj
+            for attr in field_name.split("__"):
+                value = getattr(value, attr, None)
+                if value is None:
+                    break
+            row.append(format_value(field_name, value))
+        return row
+
+    return export_response(
+        request.GET.get("format"),
+        file_name,
+        [verbose_name for _field_name, verbose_name in selected_columns],
+        queryset_rows(export_objects, values),
+        sheet_name="Sheet1",
+        column_width=18,
+        centered=True,
     )
 
-    response = HttpResponse(content_type="application/ms-excel")
-    response["Content-Disposition"] = f'attachment; filename="{file_name}"'
-
-    writer = pd.ExcelWriter(response, engine="xlsxwriter")
-    styled_data_frame.to_excel(writer, index=False, sheet_name="Sheet1")
-    worksheet = writer.sheets["Sheet1"]
-    worksheet.set_column("A:Z", 18)
-    writer.close()
-
-    return response
-
 
 def reload_queryset(fields):
     """
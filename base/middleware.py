@@ -2,13 +2,9 @@
 middleware.py
 """
 
-from django.apps import apps
-from django.db.models import Q
 from django.http import HttpResponse, HttpResponseNotAllowed
 
 from base.context_processors import AllCompany
-from base.horilla_company_manager import HorillaCompanyManager
-from base.models import Company
 
 
 class CompanyMiddleware:
@@ -20,8 +16,14 @@ class CompanyMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        # Get the current user's company_id from the request
-        if getattr(request, "user", False) and not request.user.is_anonymous:
+        # Select the company of the user when no company is selected yet, the
+        # model managers limit the querysets to the selected company (see
+        # base.horilla_company_manager.company_filter)
+        if (
+            getattr(request, "user", False)
+            and not request.user.is_anonymous
+            and not request.session.get("selected_company")
+        ):
             company_id = None
             try:
 
@@ -30,14 +32,7 @@ class CompanyMiddleware:
                 )
             except:
                 pass
-            if (
-                request.session.get("selected_company")
-                and request.session.get("selected_company") != "all"
-            ):
-                company_id = Company.objects.filter(
-                    id=request.session.get("selected_company")
-                ).first()
-            elif company_id and request.session.get("selected_company") != "all":
+            if company_id:
                 request.session["selected_company"] = company_id.id
                 request.session["selected_company_instance"] = {
                     "company": company_id.company,
@@ -45,7 +40,7 @@ class CompanyMiddleware:
                     "text": "My company",
                     "id": company_id.id,
                 }
-            elif not company_id:
+            else:
                 request.session["selected_company"] = "all"
                 all_company = AllCompany()
                 request.session["selected_company_instance"] = {
@@ -55,50 +50,6 @@ class CompanyMiddleware:
                     "id": all_company.id,
                 }
 
-            # for testing here only get recruitment models
-            app_labels = [
-                "recruitment",
-                "employee",
-                "onboarding",
-                "attendance",
-                "leave",
-                "payroll",
-                "asset",
-                "pms",
-                "base",
-                "helpdesk",
-                "offboarding",
-                "horilla_documents",
-            ]
-            app_models = [
-                model
-                for model in apps.get_models()
-                if model._meta.app_label in app_labels
-            ]
-            # Add company filter to every query
-            if company_id:
-                for (
-                    model
-                ) in app_models:  # Replace YourModels with the actual models you have
-                    if getattr(model, "company_id", None):
-                        model.add_to_class(
-                            "company_filter",
-                            Q(company_id=company_id) | Q(company_id__isnull=True),
-                        )
-                    elif (
-                        isinstance(model.objects, HorillaCompanyManager)
-                        and model.objects.related_company_field
-                    ):
-                        model.add_to_class(
-                            "company_filter",
-                            Q(**{model.objects.related_company_field: company_id})
-                            | Q(
-                                **{
-                                    f"{model.objects.related_company_field}__isnull": True
-                                }
-                            ),
-                        )
-
         response = self.get_response(request)
         return response
 
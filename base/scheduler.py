@@ -1,8 +1,7 @@
 import calendar
 from datetime import date, datetime, timedelta
 
-from apscheduler.schedulers.background import BackgroundScheduler
-
+from horilla.horilla_scheduler import scheduler
 from notifications.signals import notify
 
 
@@ -383,8 +382,6 @@ def undo_work_type():
     return
 
 
-scheduler = BackgroundScheduler()
-
 # Set the initial start time to the current time
 start_time = datetime.now()
 
@@ -443,6 +440,3 @@ try:
     )
 except:
     pass
-
-
-scheduler.start()
@@ -4,4 +4,4 @@ biometric app
 This app contains modules for handling biometric devices.
 """
 
-from . import settings
+from . import scheduler, settings
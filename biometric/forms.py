@@ -36,6 +36,8 @@ class BiometricDeviceForm(ModelForm):
             "is_scheduler",
             "scheduler_duration",
             "is_active",
+            "last_fetch_date",
+            "last_fetch_time",
         ]
         labels = {
             "name": _("Device Name"),
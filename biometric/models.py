@@ -77,6 +77,8 @@ class BiometricDevices(HorillaModel):
     )
     last_fetch_date = models.DateField(null=True, blank=True)
     last_fetch_time = models.TimeField(null=True, blank=True)
+    # number of attendance records of a ZK device already recorded
+    last_fetch_index = models.IntegerField(null=True, blank=True, editable=False)
     company_id = models.ForeignKey(
         Company, null=True, editable=False, on_delete=models.PROTECT
     )
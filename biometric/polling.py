@@ -0,0 +1,220 @@
+"""
+polling.py
+
+This module pulls the attendance of the scheduled biometric devices.
+
+The pulls run on a bounded pool of threads, so a slow or unreachable device
+never holds back the others and the devices can't open more connections than
+the pool has threads. Each device keeps its own cadence (its scheduler
+duration), its own cursor (see the pull methods in ``biometric.views``) and,
+when it can't be reached, a jittered exponential backoff.
+
+The per device lag and latency are published in Django's cache for the
+biometric devices page, the pulls only run in the scheduler leader process.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django import db
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger("scheduler")
+
+STATS_CACHE_KEY = "biometric_poll_stats"
+
+# Devices pulled at the same time
+POLL_WORKERS = getattr(settings, "BIOMETRIC_POLL_WORKERS", 16)
+
+# First and longest delay (seconds) before retrying an unreachable device
+BACKOFF_BASE = getattr(settings, "BIOMETRIC_POLL_BACKOFF", 30)
+BACKOFF_MAX = getattr(settings, "BIOMETRIC_POLL_MAX_BACKOFF", 30 * 60)
+
+
+def backoff_delay(failures, duration):
+    """
+    Delay before the next pull of a device that failed ``failures`` times in
+    a row, it doubles with every failure and is jittered so that devices which
+    went down together don't all come back at the same moment
+    """
+    delay = min(BACKOFF_MAX, max(BACKOFF_BASE, duration) * 2 ** (failures - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class DevicePoller:
+    """
+    Pool pulling the attendance of the scheduled devices when they are due.
+
+    ``poll`` is cheap and doesn't wait for the pulls, it is called by the
+    scheduler every few seconds and only submits the devices that are due and
+    not already being pulled.
+    """
+
+    def __init__(self, workers=POLL_WORKERS):
+        self.workers = workers
+        self.devices = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="biometric-poll"
+            )
+        return self._executor
+
+    def poll(self):
+        """
+        Submit the pull of every scheduled device whose turn has come
+        """
+        from biometric.models import BiometricDevices
+        from biometric.views import (
+            anviz_biometric_device_attendance,
+            cosec_biometric_device_attendance,
+            str_time_seconds,
+            zk_biometric_device_attendance,
+        )
+
+        pull_methods = {
+            "zk": zk_biometric_device_attendance,
+            "anviz": anviz_biometric_device_attendance,
+            "cosec": cosec_biometric_device_attendance,
+        }
+        now = time.monotonic()
+        scheduled = set()
+        devices = BiometricDevices.objects.filter(is_scheduler=True).only(
+            "id", "name", "machine_type", "scheduler_duration"
+        )
+        for device in devices:
+            duration = str_time_seconds(device.scheduler_duration)
+            pull_method = pull_methods.get(device.machine_type)
+            if duration <= 0 or pull_method is None:
+                continue
+            device_id = str(device.id)
+            scheduled.add(device_id)
+            with self._lock:
+                state = self.devices.setdefault(
+                    device_id,
+                    {
+                        "name": device.name,
+                        "machine_type": device.machine_type,
+                        "duration": duration,
+                        "due": now,
+                        "busy": False,
+                        "failures": 0,
+                        "last_error": None,
+                        "last_attempt": None,
+                        "last_success": None,
+                        "latency": None,
+                        "punches": None,
+                    },
+                )
+                state["name"] = device.name
+                if duration != state["duration"]:
+                    state["due"] = min(state["due"], now + duration)
+                    state["duration"] = duration
+                if state["busy"] or now < state["due"]:
+                    continue
+                state["busy"] = True
+            self.executor.submit(self.pull, device_id, pull_method)
+        with self._lock:
+            for device_id in set(self.devices) - scheduled:
+                if not self.devices[device_id]["busy"]:
+                    del self.devices[device_id]
+        self.publish()
+
+    def pull(self, device_id, pull_method):
+        """
+        Pull one device, runs in the pool
+        """
+        started = time.monotonic()
+        attempted_at = time.time()
+        summary = error = None
+        db.close_old_connections()
+        try:
+            summary = pull_method(device_id)
+        except Exception as exception:
+            error = exception
+        finally:
+            db.close_old_connections()
+        finished = time.monotonic()
+        with self._lock:
+            state = self.devices[device_id]
+            state["busy"] = False
+            state["last_attempt"] = attempted_at
+            state["latency"] = round(finished - started, 3)
+            if error is None:
+                state["failures"] = 0
+                state["last_error"] = None
+                state["last_success"] = attempted_at
+                state["punches"] = (summary or {}).get("received", 0)
+                # keep the cadence of the device whatever the pull took
+                state["due"] = max(started + state["duration"], finished)
+            else:
+                state["failures"] += 1
+                state["last_error"] = str(error) or error.__class__.__name__
+                delay = backoff_delay(state["failures"], state["duration"])
+                state["due"] = finished + delay
+        if error is None:
+            logger.debug(f"Pulled {state['name']} in {state['latency']}s")
+        else:
+            logger.warning(
+                f"Attendance pull from {state['name']} failed "
+                f"({state['failures']} in a row), retrying in {round(delay)}s: {error}"
+            )
+        self.publish()
+
+    def snapshot(self):
+        now = time.monotonic()
+        wall_now = time.time()
+        with self._lock:
+            return {
+                device_id: {
+                    "failures": state["failures"],
+                    "last_error": state["last_error"],
+                    "last_attempt": state["last_attempt"],
+                    "last_success": state["last_success"],
+                    "latency": state["latency"],
+                    "punches": state["punches"],
+                    "busy": state["busy"],
+                    "next_pull": wall_now + max(0, state["due"] - now),
+                }
+                for device_id, state in self.devices.items()
+            }
+
+    def publish(self):
+        try:
+            cache.set(STATS_CACHE_KEY, self.snapshot(), None)
+        except Exception as error:
+            logger.debug(f"Unable to publish biometric poll stats: {error}")
+
+
+def device_poll_stats(devices):
+    """
+    Set ``poll_stats`` on each device with the lag (seconds since its last
+    successful pull), the latency of its last pull and its failures, as
+    published by the scheduler leader. Devices that were never pulled get None.
+    """
+    try:
+        stats = cache.get(STATS_CACHE_KEY) or {}
+    except Exception:
+        stats = {}
+    now = time.time()
+    for device in devices:
+        stat = stats.get(str(device.id))
+        if stat is not None:
+            stat = dict(stat)
+            stat["lag"] = (
+                round(now - stat["last_success"]) if stat["last_success"] else None
+            )
+            stat["retry_in"] = max(0, round(stat["next_pull"] - now))
+        device.poll_stats = stat
+    return devices
+
+
+poller = DevicePoller()
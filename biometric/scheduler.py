@@ -0,0 +1,24 @@
+"""
+scheduler.py
+
+This module is used to register the scheduled attendance pull of the
+biometric devices
+"""
+
+from horilla.horilla_scheduler import scheduler
+
+from .polling import poller
+
+# Seconds between two checks for devices whose scheduler duration has elapsed
+POLL_INTERVAL = 5
+
+
+def poll_scheduled_devices():
+    """
+    Submit the attendance pull of every scheduled device whose duration has
+    elapsed to the device polling pool.
+    """
+    poller.poll()
+
+
+scheduler.add_job(poll_scheduled_devices, "interval", seconds=POLL_INTERVAL)
@@ -13,7 +13,6 @@ from urllib.parse import parse_qs, unquote
 
 import pytz
 import requests
-from apscheduler.schedulers.background import BackgroundScheduler
 from django.contrib import messages
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
@@ -21,6 +20,7 @@ from django.utils.translation import gettext as __
 from django.utils.translation import gettext_lazy as _
 from zk import ZK
 
+from attendance.ingestion import CLOCK_IN, CLOCK_OUT, ingest_punches
 from attendance.views.clock_in_out import clock_in, clock_out
 from base.methods import get_key_instances, get_pagination
 from employee.models import Employee, EmployeeWorkInformation
@@ -43,6 +43,15 @@ from .forms import (
     EmployeeBiometricAddForm,
 )
 from .models import BiometricDevices, BiometricEmployees, COSECAttendanceArguments
+from .polling import device_poll_stats
+
+# Events asked per request and requests per pull when reading COSEC events
+COSEC_PAGE_SIZE = 100
+COSEC_MAX_PAGES = 10
+
+# Records a ZK device may hold before its recorded attendance log is cleared,
+# None keeps the logs on the devices
+ZK_CLEAR_LOGS_AFTER = getattr(settings, "BIOMETRIC_ZK_CLEAR_LOGS_AFTER", None)
 
 
 def str_time_seconds(time):
@@ -344,11 +353,6 @@ class AnvizBiometricDeviceManager:
                     )
                 page_records = response.json().get("payload", {}).get("list", [])
                 api_response["payload"]["list"].extend(page_records)
-        self.device.last_fetch_date, self.device.last_fetch_time = (
-            self.end_time.date(),
-            self.end_time.time(),
-        )
-        self.device.save()
         return api_response
 
 
@@ -370,7 +374,8 @@ def biometric_devices_view(request):
 
     Context:
     - biometric_form (BiometricDeviceForm): Form for adding new biometric devices.
-    - devices (QuerySet): Queryset of active biometric devices, ordered by creation date.
+    - devices (QuerySet): Queryset of active biometric devices, ordered by creation date,
+      with the lag and latency of their scheduled pulls in ``poll_stats``.
     - f (BiometricDeviceFilter): Form for filtering biometric devices.
 
     """
@@ -380,6 +385,7 @@ def biometric_devices_view(request):
         "-created_at"
     )
     biometric_devices = paginator_qry(biometric_devices, request.GET.get("page"))
+    device_poll_stats(biometric_devices)
     template = "biometric/view_biometric_devices.html"
     context = {
         "biometric_form": biometric_form,
@@ -434,13 +440,6 @@ def biometric_device_schedule(request, device_id):
                     device.is_scheduler = True
                     device.is_live = False
                     device.save()
-                    scheduler = BackgroundScheduler()
-                    scheduler.add_job(
-                        lambda: zk_biometric_device_attendance(device.id),
-                        "interval",
-                        seconds=str_time_seconds(device.scheduler_duration),
-                    )
-                    scheduler.start()
                     return HttpResponse("<script>window.location.reload()</script>")
                 except Exception as error:
                     print(f"An error comes in biometric_device_schedule {error}")
@@ -465,26 +464,12 @@ def biometric_device_schedule(request, device_id):
                 device.is_scheduler = True
                 device.scheduler_duration = duration
                 device.save()
-                scheduler = BackgroundScheduler()
-                scheduler.add_job(
-                    lambda: anviz_biometric_device_attendance(device.id),
-                    "interval",
-                    seconds=str_time_seconds(device.scheduler_duration),
-                )
-                scheduler.start()
                 return HttpResponse("<script>window.location.reload()</script>")
             else:
                 duration = request.POST.get("scheduler_duration")
                 device.is_scheduler = True
                 device.scheduler_duration = duration
                 device.save()
-                scheduler = BackgroundScheduler()
-                scheduler.add_job(
-                    lambda: cosec_biometric_device_attendance(device.id),
-                    "interval",
-                    seconds=str_time_seconds(device.scheduler_duration),
-                )
-                scheduler.start()
                 return HttpResponse("<script>window.location.reload()</script>")
 
         context["scheduler_form"] = scheduler_form
@@ -641,6 +626,7 @@ def search_devices(request):
         template = "biometric/list_biometric_devices.html"
 
     devices = paginator_qry(devices, request.GET.get("page"))
+    device_poll_stats(devices)
     return render(
         request,
         template,
@@ -1692,110 +1678,187 @@ def biometric_device_live(request):
     return HttpResponse(script)
 
 
+def biometric_employee_map(field, user_ids):
+    """
+    Map the device user ids to the ids of the employees they are linked to,
+    with a single query for a whole batch of attendance records.
+
+    :param field: ``user_id`` or ``ref_user_id`` of BiometricEmployees.
+    :param user_ids: The user ids found in the attendance records.
+    """
+    lookups = {str(user_id): str(user_id) for user_id in user_ids}
+    if field == "ref_user_id":
+        # ref_user_id is an integer field, "007" and "7" are the same user
+        lookups = {
+            user_id: str(int(user_id))
+            for user_id in lookups
+            if user_id.strip().isdigit()
+        }
+    linked = {}
+    for user_id, employee_id in (
+        BiometricEmployees.objects.filter(**{f"{field}__in": set(lookups.values())})
+        .order_by("pk")
+        .values_list(field, "employee_id")
+    ):
+        linked.setdefault(str(user_id), employee_id)
+    return {
+        user_id: linked[lookup]
+        for user_id, lookup in lookups.items()
+        if lookup in linked
+    }
+
+
+def clear_zk_attendance_logs(conn, recorded):
+    """
+    Clear the attendance log of a ZK device once it holds more records than
+    ``ZK_CLEAR_LOGS_AFTER``.
+
+    The device is locked while clearing, and the log is only cleared when it
+    still holds exactly the ``recorded`` records, so a punch made after the
+    download is never lost. Returns whether the log was cleared.
+    """
+    if not ZK_CLEAR_LOGS_AFTER or recorded < ZK_CLEAR_LOGS_AFTER:
+        return False
+    conn.disable_device()
+    try:
+        conn.read_sizes()
+        if conn.records != recorded:
+            # new punches since the download, they are recorded first
+            return False
+        conn.clear_attendance()
+        conn.read_sizes()
+        return conn.records == 0
+    finally:
+        conn.enable_device()
+
+
 def zk_biometric_device_attendance(device_id):
     """
     Retrieve attendance records from a ZK biometric device and update the clock-in/clock-out status.
 
+    The device keeps a cursor made of the number of records already recorded and
+    the timestamp of the newest one. The log is only downloaded when the device
+    holds more records than the cursor, and only the records after it are
+    ingested. The cursor moves once they are recorded, then the device log is
+    cleared when it is bigger than ``BIOMETRIC_ZK_CLEAR_LOGS_AFTER``.
+
     :param device_id: The ID of the ZK biometric device.
+    :return: The summary of the ingested punches, None when the device is not scheduled.
     """
     device = BiometricDevices.objects.get(id=device_id)
-    if device.is_scheduler:
-        port_no = device.port
-        machine_ip = device.machine_ip
-        conn = None
-        zk_device = ZK(
-            machine_ip,
-            port=port_no,
-            timeout=5,
-            password=0,
-            force_udp=False,
-            ommit_ping=False,
+    if not device.is_scheduler:
+        return None
+    cursor = None
+    if device.last_fetch_date and device.last_fetch_time:
+        cursor = datetime.combine(device.last_fetch_date, device.last_fetch_time)
+    index = device.last_fetch_index or 0
+    conn = None
+    zk_device = ZK(
+        device.machine_ip,
+        port=device.port,
+        timeout=5,
+        password=0,
+        force_udp=False,
+        ommit_ping=False,
+    )
+    try:
+        conn = zk_device.connect()
+        conn.enable_device()
+        conn.read_sizes()
+        if conn.records == index and cursor is not None:
+            return ingest_punches([])
+        if conn.records < index:
+            # the log was cleared on the device, the timestamp takes over
+            index = 0
+        attendances = conn.get_attendance() or []
+        new_attendances = attendances[index:]
+        if cursor is not None and not index:
+            new_attendances = [
+                attendance
+                for attendance in new_attendances
+                if attendance.timestamp > cursor
+            ]
+        employees = biometric_employee_map(
+            "user_id", [attendance.user_id for attendance in new_attendances]
         )
-        try:
-            conn = zk_device.connect()
-            conn.enable_device()
-            attendances = conn.get_attendance()
-            last_attendance_datetime = attendances[-1].timestamp
-            if device.last_fetch_date and device.last_fetch_time:
-                filtered_attendances = [
-                    attendance
-                    for attendance in attendances
-                    if attendance.timestamp.date() >= device.last_fetch_date
-                    and attendance.timestamp.time() > device.last_fetch_time
-                ]
-            else:
-                filtered_attendances = attendances
-            device.last_fetch_date = last_attendance_datetime.date()
-            device.last_fetch_time = last_attendance_datetime.time()
-            device.save()
-            for attendance in filtered_attendances:
-                user_id = attendance.user_id
-                punch_code = attendance.punch
-                date_time = attendance.timestamp
-                date = date_time.date()
-                time = date_time.time()
-                bio_id = BiometricEmployees.objects.filter(user_id=user_id).first()
-                if bio_id:
-                    request_data = Request(
-                        user=bio_id.employee_id.employee_user_id,
-                        date=date,
-                        time=time,
-                        datetime=date_time,
-                    )
-                    if punch_code in {0, 3, 4}:
-                        try:
-                            clock_in(request_data)
-                        except Exception as error:
-                            print(f"Got an error : {error}")
-                    else:
-                        try:
-                            clock_out(request_data)
-                        except Exception as error:
-                            print(f"Got an error : {error}")
-        except Exception as error:
-            print(f"Process terminate : {error}")
-        finally:
-            if conn:
-                conn.disconnect()
+        summary = ingest_punches(
+            (
+                employees[str(attendance.user_id)],
+                attendance.timestamp,
+                CLOCK_IN if attendance.punch in {0, 3, 4} else CLOCK_OUT,
+            )
+            for attendance in new_attendances
+            if str(attendance.user_id) in employees
+        )
+        timestamps = [attendance.timestamp for attendance in new_attendances]
+        if cursor is not None:
+            timestamps.append(cursor)
+        cursor = max(timestamps) if timestamps else None
+        index = len(attendances)
+        BiometricDevices.objects.filter(id=device_id).update(
+            last_fetch_date=cursor.date() if cursor else None,
+            last_fetch_time=cursor.time() if cursor else None,
+            last_fetch_index=index,
+        )
+        if clear_zk_attendance_logs(conn, index):
+            BiometricDevices.objects.filter(id=device_id).update(last_fetch_index=0)
+        return summary
+    finally:
+        if conn:
+            conn.disconnect()
 
 
 def anviz_biometric_device_attendance(device_id):
     """
     Retrieves attendance records from an Anviz biometric device and processes them.
 
+    The records are requested from the device cursor (the ``checktime`` of the
+    newest record already recorded, in UTC), the cursor moves once they are
+    recorded.
+
     :param device_id: The Object Id of the Anviz biometric device.
+    :return: The summary of the ingested punches, None when the device is not scheduled.
     """
     device = BiometricDevices.objects.get(id=device_id)
-    if device.is_scheduler:
-        anviz_device = AnvizBiometricDeviceManager(device_id)
-        attendance_records = anviz_device.get_attendance_records()
-        for attendance in attendance_records["payload"]["list"]:
-            badge_id = attendance["employee"]["workno"]
-            punch_code = attendance["checktype"]
-            date_time_obj = datetime.strptime(
-                attendance["checktime"], "%Y-%m-%dT%H:%M:%S%z"
+    if not device.is_scheduler:
+        return None
+    anviz_device = AnvizBiometricDeviceManager(device_id)
+    attendance_records = anviz_device.get_attendance_records()
+    records = attendance_records["payload"]["list"]
+    target_timezone = pytz.timezone(settings.TIME_ZONE)
+    employees = {}
+    for badge_id, employee_id in Employee.objects.filter(
+        badge_id__in={record["employee"]["workno"] for record in records}
+    ).values_list("badge_id", "id"):
+        employees.setdefault(badge_id, employee_id)
+    punches = []
+    cursor = None
+    for attendance in records:
+        date_time_obj = datetime.strptime(
+            attendance["checktime"], "%Y-%m-%dT%H:%M:%S%z"
+        )
+        cursor = max(cursor or date_time_obj, date_time_obj)
+        badge_id = attendance["employee"]["workno"]
+        if badge_id not in employees:
+            continue
+        # 1, 129 check types are check out and door close
+        direction = CLOCK_IN if attendance["checktype"] in {0, 128} else CLOCK_OUT
+        punches.append(
+            (
+                employees[badge_id],
+                date_time_obj.astimezone(target_timezone),
+                direction,
             )
-            target_timezone = pytz.timezone(settings.TIME_ZONE)
-            date_time_obj = date_time_obj.astimezone(target_timezone)
-            employee = Employee.objects.filter(badge_id=badge_id).first()
-            if employee:
-                request_data = Request(
-                    user=employee.employee_user_id,
-                    date=date_time_obj.date(),
-                    time=date_time_obj.time(),
-                    datetime=date_time_obj,
-                )
-                if punch_code in {0, 128}:
-                    try:
-                        clock_in(request_data)
-                    except Exception as error:
-                        print(f"Error in clock in {error}")
-                else:
-                    try:
-                        # // 1 , 129 check type check out and door close
-                        clock_out(request_data)
-                    except Exception as error:
-                        print(f"Error in clock out {error}")
+        )
+    summary = ingest_punches(punches)
+    if cursor is not None:
+        # the records of the cursor second are asked again, the ingestion
+        # skips the punches it already recorded
+        cursor = cursor.astimezone(pytz.utc).replace(tzinfo=None)
+        BiometricDevices.objects.filter(id=device_id).update(
+            last_fetch_date=cursor.date(), last_fetch_time=cursor.time()
+        )
+    return summary
 
 
 def cosec_biometric_device_attendance(device_id):
@@ -1803,14 +1866,19 @@ def cosec_biometric_device_attendance(device_id):
     Retrieve and process attendance events from a COSEC biometric device.
 
     This function fetches attendance events from the specified COSEC biometric device
-    and processes them to record clock-in and clock-out events for employees.
+    and processes them to record clock-in and clock-out events for employees. The
+    events are read page by page from the roll-over count and sequence number
+    cursor kept in COSECAttendanceArguments, which moves after each recorded page.
 
     Args:
         device_id (uuid): The ID of the COSEC biometric device.
+
+    Returns:
+        dict: The summary of the ingested punches, None when the device is not scheduled.
     """
     device = BiometricDevices.objects.get(id=device_id)
     if not device.is_scheduler:
-        return
+        return None
 
     device_args = COSECAttendanceArguments.objects.filter(device_id=device).first()
     last_fetch_roll_ovr_count = (
@@ -1825,87 +1893,72 @@ def cosec_biometric_device_attendance(device_id):
         device.cosec_password,
         timeout=10,
     )
-    attendances = cosec.get_attendance_events(
-        last_fetch_roll_ovr_count, last_fetch_seq_number
-    )
-
-    if not isinstance(attendances, list):
-        return
-
-    if device_args and attendances:
-        attendances.pop(0)
+    summary = None
+    for _page in range(COSEC_MAX_PAGES):
+        attendances = cosec.get_attendance_events(
+            last_fetch_roll_ovr_count, last_fetch_seq_number, COSEC_PAGE_SIZE
+        )
+        if isinstance(attendances, dict) and (
+            "Timeout" in attendances or "Error" in attendances
+        ):
+            raise ConnectionError(
+                attendances.get("Timeout") or attendances.get("Error")
+            )
+        if not isinstance(attendances, list):
+            break
+        full_page = len(attendances) == COSEC_PAGE_SIZE
 
-    for attendance in attendances:
-        ref_user_id = attendance["detail-1"]
-        employee = BiometricEmployees.objects.filter(ref_user_id=ref_user_id).first()
-        if not employee:
-            continue
+        if device_args and attendances:
+            # the event of the cursor itself is recorded already
+            attendances.pop(0)
 
-        date_str = attendance["date"]
-        time_str = attendance["time"]
-        attendance_date = datetime.strptime(date_str, "%d/%m/%Y").date()
-        attendance_time = datetime.strptime(time_str, "%H:%M:%S").time()
-        attendance_datetime = datetime.combine(attendance_date, attendance_time)
-        punch_code = attendance["detail-2"]
-
-        request_data = Request(
-            user=employee.employee_id.employee_user_id,
-            date=attendance_date,
-            time=attendance_time,
-            datetime=attendance_datetime,
+        employees = biometric_employee_map(
+            "ref_user_id", [attendance["detail-1"] for attendance in attendances]
         )
-
-        try:
+        punches = []
+        for attendance in attendances:
+            employee_id = employees.get(str(attendance["detail-1"]))
+            punch_code = attendance["detail-2"]
             if punch_code in ["1", "3", "5", "7", "9"]:
-                clock_in(request_data)
+                direction = CLOCK_IN
             elif punch_code in ["2", "4", "6", "8", "10"]:
-                clock_out(request_data)
+                direction = CLOCK_OUT
             else:
-                pass
-        except Exception as error:
-            print(f"Error processing attendance: {error}")
+                continue
+            if employee_id is None:
+                continue
+
+            date_str = attendance["date"]
+            time_str = attendance["time"]
+            attendance_datetime = datetime.strptime(
+                f"{date_str} {time_str}", "%d/%m/%Y %H:%M:%S"
+            )
+            punches.append((employee_id, attendance_datetime, direction))
+        page_summary = ingest_punches(punches)
+        summary = (
+            page_summary
+            if summary is None
+            else {key: summary[key] + value for key, value in page_summary.items()}
+        )
 
-    if attendances:
+        if not attendances:
+            break
         last_attendance = attendances[-1]
-        COSECAttendanceArguments.objects.update_or_create(
+        last_fetch_roll_ovr_count = int(last_attendance["roll-over-count"])
+        last_fetch_seq_number = int(last_attendance["seq-No"])
+        device_args, _created = COSECAttendanceArguments.objects.update_or_create(
             device_id=device,
             defaults={
                 "last_fetch_roll_ovr_count": last_attendance["roll-over-count"],
                 "last_fetch_seq_number": last_attendance["seq-No"],
             },
         )
+        if not full_page:
+            break
+    return summary
 
 
 try:
-    devices = BiometricDevices.objects.all().update(is_live=False)
-    for device in BiometricDevices.objects.filter(is_scheduler=True):
-        if device:
-            if str_time_seconds(device.scheduler_duration) > 0:
-                if device.machine_type == "anviz":
-                    scheduler = BackgroundScheduler()
-                    scheduler.add_job(
-                        lambda: anviz_biometric_device_attendance(device.id),
-                        "interval",
-                        seconds=str_time_seconds(device.scheduler_duration),
-                    )
-                    scheduler.start()
-                elif device.machine_type == "zk":
-                    scheduler = BackgroundScheduler()
-                    scheduler.add_job(
-                        lambda: zk_biometric_device_attendance(device.id),
-                        "interval",
-                        seconds=str_time_seconds(device.scheduler_duration),
-                    )
-                    scheduler.start()
-                elif device.machine_type == "cosec":
-                    scheduler = BackgroundScheduler()
-                    scheduler.add_job(
-                        lambda: cosec_biometric_device_attendance(device.id),
-                        "interval",
-                        seconds=str_time_seconds(device.scheduler_duration),
-                    )
-                    scheduler.start()
-                else:
-                    pass
+    BiometricDevices.objects.all().update(is_live=False)
 except:
     pass
@@ -19,3 +19,9 @@ class EmployeeConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "employee"
+
+    def ready(self):
+        from employee.dashboard_aggregates import connect_dashboard_signals
+
+        connect_dashboard_signals()
+        super().ready()
@@ -0,0 +1,197 @@
+"""
+dashboard_aggregates.py
+
+This module computes the numbers of the employee dashboard tiles and charts.
+
+Each widget is computed by one aggregate or grouped query, counting with
+``Count(filter=Q(...))`` in the database instead of loading the employees.
+The results are cached per selected company (and per manager for the ones
+limited to the subordinates) for ``DASHBOARD_CACHE_TIMEOUT`` seconds. Saving
+or deleting an employee, a work information or a candidate bumps a version
+key in Django's cache, which makes every cached result stale at once.
+"""
+
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+
+from horilla.horilla_cache import bump_version, cache_version
+from horilla.signals import post_bulk_update
+
+CACHE_VERSION_KEY = "employee_dashboard_version"
+
+# Seconds a widget result is served from the cache
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, "EMPLOYEE_DASHBOARD_CACHE_TIMEOUT", 60)
+
+# Models whose changes make the cached results stale
+DASHBOARD_MODELS = [
+    "employee.Employee",
+    "employee.EmployeeWorkInformation",
+    "recruitment.Candidate",
+]
+
+
+def cached_widget(request, widget, compute, scope="all"):
+    """
+    Result of the widget for the selected company of the request, computed
+    by ``compute`` when it isn't cached
+    """
+    version = cache_version(CACHE_VERSION_KEY)
+    if version is None:
+        return compute()
+    company = request.session.get("selected_company", "all")
+    key = f"employee_dashboard_{widget}_{version}_{company}_{scope}"
+    try:
+        result = cache.get(key)
+    except Exception:
+        result = None
+    if result is None:
+        result = compute()
+        try:
+            cache.set(key, result, DASHBOARD_CACHE_TIMEOUT)
+        except Exception:
+            pass
+    return result
+
+
+def invalidate_dashboard(*args, **kwargs):
+    """
+    Signal receiver making the cached results of every company stale
+    """
+    bump_version(CACHE_VERSION_KEY)
+
+
+def connect_dashboard_signals():
+    """
+    Refresh the dashboard numbers when an employee, a work information or a
+    candidate changes, called once the apps are ready
+    """
+    from django.apps import apps
+
+    for model_path in DASHBOARD_MODELS:
+        model = apps.get_model(model_path)
+        uid = f"employee_dashboard_{model_path}"
+        post_save.connect(invalidate_dashboard, sender=model, dispatch_uid=uid)
+        post_delete.connect(invalidate_dashboard, sender=model, dispatch_uid=uid)
+        post_bulk_update.connect(invalidate_dashboard, sender=model, dispatch_uid=uid)
+
+
+def employee_counts(request, subordinates_only=False):
+    """
+    Total, active and inactive employees, only the subordinates of the user
+    when ``subordinates_only`` and the user can't view every employee
+    """
+    from employee.models import Employee
+
+    scope = "all"
+    employees = Employee.objects.all()
+    if subordinates_only and not request.user.has_perm("employee.view_employee"):
+        scope = request.user.pk
+        employees = employees.filter(
+            employee_work_info__reporting_manager_id__employee_user_id=request.user
+        )
+
+    def compute():
+        return employees.aggregate(
+            total=Count("id"),
+            active=Count("id", filter=Q(is_active=True)),
+            inactive=Count("id", filter=Q(is_active=False)),
+        )
+
+    return cached_widget(request, "employee_counts", compute, scope)
+
+
+def gender_counts(request):
+    """
+    Active employees per gender
+    """
+    from employee.models import Employee
+
+    def compute():
+        return Employee.objects.filter(is_active=True).aggregate(
+            male=Count("id", filter=Q(gender="male")),
+            female=Count("id", filter=Q(gender="female")),
+            other=Count("id", filter=Q(gender="other")),
+        )
+
+    return cached_widget(request, "gender_counts", compute)
+
+
+def department_counts(request):
+    """
+    (department, active employees) of the departments with active employees
+    """
+    from base.models import Department
+    from employee.models import Employee
+
+    def compute():
+        rows = (
+            Employee.objects.filter(
+                is_active=True,
+                employee_work_info__department_id__in=Department.objects.all(),
+            )
+            .values(
+                "employee_work_info__department_id",
+                "employee_work_info__department_id__department",
+            )
+            .annotate(count=Count("id"))
+            .order_by("employee_work_info__department_id")
+        )
+        return [
+            (row["employee_work_info__department_id__department"], row["count"])
+            for row in rows
+        ]
+
+    return cached_widget(request, "department_counts", compute)
+
+
+def joining_counts(request):
+    """
+    Active employees, candidates joining today and this week, and the share
+    of the employees that joined today and in the last seven days
+    """
+    from employee.models import Employee
+    from recruitment.models import Candidate
+
+    def compute():
+        today = date.today()
+        week_start = today - timedelta(days=today.weekday())
+        week_end = today + timedelta(days=6 - today.weekday())
+        employees = Employee.objects.aggregate(
+            active=Count("id", filter=Q(is_active=True)),
+            with_work_info=Count("employee_work_info"),
+            joined_today=Count(
+                "employee_work_info",
+                filter=Q(
+                    employee_work_info__date_joining__range=[
+                        today,
+                        today + timedelta(days=1),
+                    ]
+                ),
+            ),
+            joined_week=Count(
+                "employee_work_info",
+                filter=Q(
+                    employee_work_info__date_joining__range=[
+                        today - timedelta(days=7),
+                        today,
+                    ]
+                ),
+            ),
+        )
+        candidates = Candidate.objects.filter(is_active=True).aggregate(
+            today=Count(
+                "id",
+                filter=Q(joining_date__range=[today, today + timedelta(days=1)]),
+            ),
+            week=Count(
+                "id",
+                filter=Q(joining_date__range=[week_start, week_end], hired=True),
+            ),
+        )
+        return {"employees": employees, "candidates": candidates}
+
+    return cached_widget(request, "joining_counts", compute)
@@ -0,0 +1,632 @@
+"""
+imports.py
+
+This module imports employees and their work information from the rows of an
+uploaded sheet.
+
+Every row is validated before anything is written, the departments, job
+positions, shifts and the other records the rows refer to are loaded once in
+dicts instead of being looked up per row. The valid rows are then written by
+a background thread: the users, employees, work information, bonus points and
+contracts are created with ``bulk_create`` in chunks of ``IMPORT_CHUNK_SIZE``
+inside one transaction, so a failed import leaves nothing behind.
+
+Every value is checked against the field it is written to (its length,
+choices and range) since the bulk inserts don't clean the instances.
+
+The users are created without a usable password, the passwords (the phone
+number of the employee, like before) are hashed once the records are saved,
+by a pool of threads since the hashing releases the GIL. A chunk of passwords
+that can't be set doesn't undo the import, the number of those users is
+reported with the job. The progress of an import is kept in Django's cache
+under its job id for the status view.
+"""
+
+import datetime
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from simple_history.utils import bulk_create_with_history
+
+from base.models import (
+    Company,
+    Department,
+    EmployeeShift,
+    EmployeeType,
+    JobPosition,
+    JobRole,
+    WorkType,
+)
+from employee.models import BonusPoint, Employee, EmployeeWorkInformation
+from horilla.horilla_export import xlsx_response
+from horilla.horilla_jobs import CacheJob, JobThread
+from payroll.models.models import Contract
+
+logger = logging.getLogger(__name__)
+
+# Rows written per bulk insert
+IMPORT_CHUNK_SIZE = getattr(settings, "EMPLOYEE_IMPORT_CHUNK_SIZE", 500)
+
+# Threads hashing the passwords of the imported users
+IMPORT_HASH_WORKERS = getattr(settings, "EMPLOYEE_IMPORT_HASH_WORKERS", 4)
+
+EMAIL_PATTERN = r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$"
+
+WORK_INFO_COLUMNS = [
+    "Badge id",
+    "First Name",
+    "Last Name",
+    "Phone",
+    "Email",
+    "Gender",
+    "Department",
+    "Job Position",
+    "Job Role",
+    "Work Type",
+    "Shift",
+    "Employee Type",
+    "Reporting Manager",
+    "Company",
+    "Location",
+    "Date joining",
+    "Contract End Date",
+    "Basic Salary",
+    "Salary Hour",
+]
+
+ERROR_COLUMNS = [
+    "Email Error",
+    "First Name error",
+    "Phone error",
+    "Joining Date Error",
+    "Contract Error",
+    "Badge ID Error",
+    "Basic Salary Error",
+    "Salary Hour Error",
+    "User ID Error",
+    "Work Info Error",
+]
+
+# Record values checked against the fields they are written to, with the
+# column of their errors
+RECORD_FIELDS = [
+    ("email", User, "username", "Email Error"),
+    ("email", Employee, "email", "Email Error"),
+    ("first_name", Employee, "employee_first_name", "First Name error"),
+    ("last_name", Employee, "employee_last_name", "First Name error"),
+    ("contract_name", Contract, "contract_name", "First Name error"),
+    ("phone", Employee, "phone", "Phone error"),
+    ("badge_id", Employee, "badge_id", "Badge ID Error"),
+    ("gender", Employee, "gender", "Work Info Error"),
+    ("department", Department, "department", "Work Info Error"),
+    ("job_position", JobPosition, "job_position", "Work Info Error"),
+    ("job_role", JobRole, "job_role", "Work Info Error"),
+    ("work_type", WorkType, "work_type", "Work Info Error"),
+    ("shift", EmployeeShift, "employee_shift", "Work Info Error"),
+    ("employee_type", EmployeeType, "employee_type", "Work Info Error"),
+    ("location", EmployeeWorkInformation, "location", "Work Info Error"),
+    ("basic_salary", EmployeeWorkInformation, "basic_salary", "Basic Salary Error"),
+    ("salary_hour", EmployeeWorkInformation, "salary_hour", "Salary Hour Error"),
+]
+
+
+def cell_text(value):
+    """
+    Text of a cell, None for an empty cell. Whole numbers read as floats,
+    like phone numbers of a column with empty cells, lose their ".0".
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def cell_date(value):
+    """
+    Date of a cell, None for an empty cell, raises ValueError when the cell
+    isn't a date
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    try:
+        value = pd.to_datetime(value)
+    except (TypeError, ValueError, OverflowError) as error:
+        raise ValueError(error)
+    return None if pd.isna(value) else value.date()
+
+
+def cell_number(value):
+    """
+    Whole number of a cell, None for an empty cell, raises ValueError when
+    the cell isn't a number
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    try:
+        value = pd.to_numeric(value)
+    except TypeError as error:
+        raise ValueError(error)
+    return None if pd.isna(value) else int(value)
+
+
+def field_errors(record):
+    """
+    Errors of the values of the record their fields wouldn't accept, like a
+    value longer than the field or out of its choices, by error column
+    """
+    errors = {}
+    for key, model, field_name, column in RECORD_FIELDS:
+        value = record.get(key)
+        if value is None or value == "":
+            continue
+        field = model._meta.get_field(field_name)
+        try:
+            field.clean(value, None)
+        except ValidationError as error:
+            message = (
+                f"{str(field.verbose_name).capitalize()}: {' '.join(error.messages)}"
+            )
+            errors[column] = " ".join(filter(None, [errors.get(column), message]))
+    return errors
+
+
+def split_name(full_name):
+    """
+    First and last name of a full name, split on its first space
+    """
+    first_name, _space, last_name = full_name.strip().partition(" ")
+    return first_name, last_name.strip()
+
+
+def import_errors_response(error_rows):
+    """
+    Sheet of the rows that failed the validation, with the columns of the
+    rows and of their errors that have a value
+    """
+    columns = [
+        column
+        for column in WORK_INFO_COLUMNS + ERROR_COLUMNS
+        if any(not pd.isna(row.get(column, None)) for row in error_rows)
+    ]
+    rows = (
+        [None if pd.isna(row.get(column)) else row.get(column) for column in columns]
+        for row in error_rows
+    )
+    response = xlsx_response("ImportError", columns, rows)
+    response["X-Error-Count"] = len(error_rows)
+    return response
+
+
+class ImportJob(CacheJob):
+    """
+    Progress of an import, stored in the cache under the job id
+    """
+
+    name = "employee_import"
+
+
+class EmployeeImport:
+    """
+    Import of the rows of a work information sheet, the rows of the employee
+    sheet only fill its name, email and phone columns
+    """
+
+    def __init__(self, rows, request):
+        self.rows = rows
+        self.user_id = request.user.id
+        self.records = []
+        self.job = ImportJob()
+        self.lookups = self.load_lookups()
+
+    def load_lookups(self):
+        """
+        Names to ids of the records the rows refer to, read through the
+        company scoped managers like the rows were looked up one by one
+        """
+
+        def name_ids(queryset, *fields):
+            ids = {}
+            for values in queryset.order_by("pk").values_list("pk", *fields):
+                ids.setdefault(values[1:] if len(fields) > 1 else values[1], values[0])
+            return ids
+
+        managers = {}
+        for pk, first_name, last_name in Employee.objects.order_by("pk").values_list(
+            "pk", "employee_first_name", "employee_last_name"
+        ):
+            managers.setdefault((first_name, last_name or ""), pk)
+        return {
+            "department": name_ids(Department.objects.all(), "department"),
+            "job_position": name_ids(
+                JobPosition.objects.all(), "department_id", "job_position"
+            ),
+            "job_role": name_ids(JobRole.objects.all(), "job_position_id", "job_role"),
+            "work_type": name_ids(WorkType.objects.all(), "work_type"),
+            "shift": name_ids(EmployeeShift.objects.all(), "employee_shift"),
+            "employee_type": name_ids(EmployeeType.objects.all(), "employee_type"),
+            "company": name_ids(Company.objects.all(), "company"),
+            "manager": managers,
+        }
+
+    def validate(self):
+        """
+        Validates every row, the valid rows are kept as the records to import
+        and the rows that failed are returned with their errors
+        """
+        emails = [cell_text(row.get("Email")) for row in self.rows]
+        badge_ids = [cell_text(row.get("Badge id")) for row in self.rows]
+        existing_users = set(
+            User.objects.filter(username__in=[e for e in emails if e]).values_list(
+                "username", flat=True
+            )
+        )
+        existing_users.update(
+            Employee._base_manager.filter(
+                email__in=[e for e in emails if e]
+            ).values_list("email", flat=True)
+        )
+        existing_badges = set(
+            Employee._base_manager.filter(
+                badge_id__in=[b for b in badge_ids if b]
+            ).values_list("badge_id", flat=True)
+        )
+        seen_emails = set()
+        seen_badges = set()
+        error_rows = []
+        for row, email, badge_id in zip(self.rows, emails, badge_ids):
+            record, errors = self.validate_row(row, email, badge_id)
+            if email in existing_users:
+                errors["User ID Error"] = "User with the email ID already exists"
+            elif email in seen_emails:
+                errors["User ID Error"] = "The email ID is repeated in the file"
+            if badge_id in existing_badges:
+                errors["Badge ID Error"] = (
+                    "An Employee with the badge ID already exists"
+                )
+            elif badge_id in seen_badges:
+                errors["Badge ID Error"] = "The badge ID is repeated in the file"
+            if errors:
+                row.update(errors)
+                error_rows.append(row)
+                continue
+            seen_emails.add(email)
+            if badge_id:
+                seen_badges.add(badge_id)
+            self.records.append(record)
+        return error_rows
+
+    def validate_row(self, row, email, badge_id):
+        """
+        Record of the values of a row and the errors of its cells
+        """
+        errors = {}
+        phone = cell_text(row.get("Phone"))
+        first_name = cell_text(row.get("First Name"))
+        if not email or not re.match(EMAIL_PATTERN, email):
+            errors["Email Error"] = "Invalid Email address"
+        if not first_name:
+            errors["First Name error"] = "First Name can't be empty"
+        if not phone:
+            errors["Phone error"] = "Phone Number can't be empty"
+        try:
+            date_joining = cell_date(row.get("Date joining"))
+        except ValueError:
+            errors["Joining Date Error"] = (
+                "Invalid Date format. Please use the format YYYY-MM-DD"
+            )
+        try:
+            contract_end_date = cell_date(row.get("Contract End Date"))
+        except ValueError:
+            errors["Contract Error"] = (
+                "Invalid Date format. Please use the format YYYY-MM-DD"
+            )
+        try:
+            basic_salary = cell_number(row.get("Basic Salary"))
+        except ValueError:
+            errors["Basic Salary Error"] = "Basic Salary must be a number"
+        try:
+            salary_hour = cell_number(row.get("Salary Hour"))
+        except ValueError:
+            errors["Salary Hour Error"] = "Salary Hour must be a number"
+        if errors:
+            return None, errors
+
+        if date_joining is None and "Date joining" in row:
+            date_joining = datetime.date.today()
+        gender = cell_text(row.get("Gender"))
+        last_name = cell_text(row.get("Last Name")) or ""
+        record = {
+            "email": email,
+            "phone": phone,
+            "badge_id": badge_id,
+            "first_name": first_name,
+            "last_name": last_name,
+            # the name of the contract created with the work information
+            "contract_name": f"{first_name} {last_name}".strip() + "'s Contract",
+            "gender": gender.lower() if gender else None,
+            "department": cell_text(row.get("Department")),
+            "job_position": cell_text(row.get("Job Position")),
+            "job_role": cell_text(row.get("Job Role")),
+            "work_type": cell_text(row.get("Work Type")),
+            "shift": cell_text(row.get("Shift")),
+            "employee_type": cell_text(row.get("Employee Type")),
+            "reporting_manager": cell_text(row.get("Reporting Manager")),
+            "company": cell_text(row.get("Company")),
+            "location": cell_text(row.get("Location")),
+            "date_joining": date_joining,
+            "contract_end_date": contract_end_date,
+            "basic_salary": basic_salary or 0,
+            "salary_hour": salary_hour or 0,
+        }
+        errors = field_errors(record)
+        if errors:
+            return None, errors
+        return record, {}
+
+    def start(self):
+        """
+        Starts the import of the valid records in the background, returns the
+        job or None when there is nothing to import
+        """
+        if not self.records:
+            return None
+        self.job.update(
+            user_id=self.user_id,
+            status="queued",
+            phase=None,
+            total=len(self.records),
+            processed=0,
+            created=0,
+            message=None,
+        )
+        JobThread(self, "Employee import").start()
+        return self.job
+
+    def run(self):
+        """
+        Writes the records, then sets the passwords of the new users
+        """
+        self.job.update(status="running")
+        with transaction.atomic():
+            self.create_lookups()
+            employees = self.create_employees()
+            self.create_work_info(employees)
+        # the employees are imported, the users whose password couldn't be
+        # set keep an unusable one and are reported apart
+        password_failures = self.set_passwords(employees)
+        self.job.update(
+            status="done",
+            phase=None,
+            created=len(employees),
+            password_failures=password_failures,
+        )
+
+    def create_lookups(self):
+        """
+        Creates once each department, job position, job role, work type,
+        shift and employee type the records refer to that doesn't exist
+        """
+        lookups = self.lookups
+        for record in self.records:
+            department = record["department"]
+            if department and department not in lookups["department"]:
+                department_obj = Department(department=department)
+                department_obj.created_by_id = self.user_id
+                department_obj.save()
+                lookups["department"][department] = department_obj.pk
+            department_id = lookups["department"].get(department)
+
+            position_key = (department_id, record["job_position"])
+            if record["job_position"] and position_key not in lookups["job_position"]:
+                # job position names are unique across the departments
+                position = JobPosition._base_manager.filter(
+                    job_position=record["job_position"]
+                ).first()
+                if position is None and department_id is not None:
+                    position = JobPosition(
+                        department_id_id=department_id,
+                        job_position=record["job_position"],
+                        created_by_id=self.user_id,
+                    )
+                    position.save()
+                if position is not None:
+                    lookups["job_position"][position_key] = position.pk
+            position_id = lookups["job_position"].get(position_key)
+
+            role_key = (position_id, record["job_role"])
+            if (
+                record["job_role"]
+                and position_id is not None
+                and role_key not in lookups["job_role"]
+            ):
+                role = JobRole(
+                    job_position_id_id=position_id,
+                    job_role=record["job_role"],
+                    created_by_id=self.user_id,
+                )
+                role.save()
+                lookups["job_role"][role_key] = role.pk
+
+            for name, model, field in (
+                ("work_type", WorkType, "work_type"),
+                ("shift", EmployeeShift, "employee_shift"),
+                ("employee_type", EmployeeType, "employee_type"),
+            ):
+                value = record[name]
+                if value and value not in lookups[name]:
+                    instance = model(**{field: value}, created_by_id=self.user_id)
+                    instance.save()
+                    lookups[name][value] = instance.pk
+
+    def chunks(self, items):
+        for start in range(0, len(items), IMPORT_CHUNK_SIZE):
+            yield items[start : start + IMPORT_CHUNK_SIZE]
+
+    def create_employees(self):
+        """
+        Creates the users and the employees, returns the employees in the
+        order of the records
+        """
+        self.job.update(phase="employees", processed=0)
+        employees = []
+        for records in self.chunks(self.records):
+            users = User.objects.bulk_create(
+                [
+                    User(
+                        username=record["email"],
+                        email=record["email"],
+                        password=make_password(None),
+                    )
+                    for record in records
+                ]
+            )
+            if any(user.pk is None for user in users):
+                # databases that don't return the ids of the inserted rows
+                user_ids = dict(
+                    User.objects.filter(
+                        username__in=[user.username for user in users]
+                    ).values_list("username", "pk")
+                )
+                for user in users:
+                    user.pk = user_ids[user.username]
+            chunk = []
+            for record, user in zip(records, users):
+                employee = Employee(
+                    employee_user_id=user,
+                    badge_id=record["badge_id"],
+                    employee_first_name=record["first_name"],
+                    employee_last_name=record["last_name"],
+                    email=record["email"],
+                    phone=record["phone"],
+                )
+                if record["gender"]:
+                    employee.gender = record["gender"]
+                chunk.append(employee)
+            chunk = Employee.objects.bulk_create(chunk)
+            if any(employee.pk is None for employee in chunk):
+                employee_ids = dict(
+                    Employee._base_manager.filter(
+                        email__in=[employee.email for employee in chunk]
+                    ).values_list("email", "pk")
+                )
+                for employee in chunk:
+                    employee.pk = employee_ids[employee.email]
+            bulk_create_with_history(
+                [
+                    BonusPoint(
+                        employee_id=employee,
+                        created_by_id=self.user_id,
+                        modified_by_id=self.user_id,
+                    )
+                    for employee in chunk
+                ],
+                BonusPoint,
+                default_user=self.user_id and User(pk=self.user_id),
+            )
+            employees.extend(chunk)
+            self.job.update(processed=len(employees))
+        managers = self.lookups["manager"]
+        for employee in employees:
+            managers.setdefault(
+                (employee.employee_first_name, employee.employee_last_name), employee.pk
+            )
+        return employees
+
+    def create_work_info(self, employees):
+        """
+        Creates the work information and the contracts of the employees
+        """
+        self.job.update(phase="work_info", processed=0)
+        lookups = self.lookups
+        user = self.user_id and User(pk=self.user_id)
+        processed = 0
+        for pairs in self.chunks(list(zip(self.records, employees))):
+            work_infos = []
+            contracts = []
+            for record, employee in pairs:
+                department_id = lookups["department"].get(record["department"])
+                position_id = lookups["job_position"].get(
+                    (department_id, record["job_position"])
+                )
+                manager = record["reporting_manager"]
+                work_info = EmployeeWorkInformation(
+                    employee_id=employee,
+                    email=record["email"],
+                    department_id_id=department_id,
+                    job_position_id_id=position_id,
+                    job_role_id_id=lookups["job_role"].get(
+                        (position_id, record["job_role"])
+                    ),
+                    work_type_id_id=lookups["work_type"].get(record["work_type"]),
+                    employee_type_id_id=lookups["employee_type"].get(
+                        record["employee_type"]
+                    ),
+                    shift_id_id=lookups["shift"].get(record["shift"]),
+                    reporting_manager_id_id=(
+                        lookups["manager"].get(split_name(manager)) if manager else None
+                    ),
+                    company_id_id=lookups["company"].get(record["company"]),
+                    location=record["location"],
+                    date_joining=record["date_joining"],
+                    contract_end_date=record["contract_end_date"],
+                    basic_salary=record["basic_salary"],
+                    salary_hour=record["salary_hour"],
+                )
+                work_infos.append(work_info)
+                # the contract the pre_save signal of the work information
+                # creates for an active employee without one
+                contracts.append(
+                    Contract(
+                        contract_name=record["contract_name"],
+                        employee_id=employee,
+                        contract_start_date=datetime.date.today(),
+                        wage=work_info.basic_salary,
+                        department_id=work_info.department_id_id,
+                        job_position_id=work_info.job_position_id_id,
+                        job_role_id=work_info.job_role_id_id,
+                        work_type_id=work_info.work_type_id_id,
+                        shift_id=work_info.shift_id_id,
+                        created_by_id=self.user_id,
+                        modified_by_id=self.user_id,
+                    )
+                )
+            bulk_create_with_history(
+                work_infos, EmployeeWorkInformation, default_user=user
+            )
+            bulk_create_with_history(contracts, Contract, default_user=user)
+            processed += len(pairs)
+            self.job.update(processed=processed)
+
+    def set_passwords(self, employees):
+        """
+        Sets the phone number of the employee as the password of the new
+        users, returns the number of users whose password couldn't be set
+        """
+        self.job.update(phase="passwords", processed=0)
+        processed = 0
+        failures = 0
+        with ThreadPoolExecutor(max_workers=IMPORT_HASH_WORKERS) as executor:
+            for chunk in self.chunks(employees):
+                users = [employee.employee_user_id for employee in chunk]
+                try:
+                    passwords = executor.map(
+                        make_password, [employee.phone for employee in chunk]
+                    )
+                    for user, password in zip(users, passwords):
+                        user.password = password
+                    User.objects.bulk_update(users, ["password"])
+                except Exception as error:
+                    logger.error(f"Setting the imported passwords failed: {error}")
+                    failures += len(chunk)
+                processed += len(chunk)
+                self.job.update(processed=processed)
+        return failures
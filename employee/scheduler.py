@@ -1,7 +1,7 @@
 import datetime
 from datetime import timedelta
 
-from apscheduler.schedulers.background import BackgroundScheduler
+from horilla.horilla_scheduler import scheduler
 
 
 def update_experience():
@@ -131,7 +131,5 @@ def block_unblock_disciplinary():
     return
 
 
-scheduler = BackgroundScheduler()
 scheduler.add_job(update_experience, "interval", hours=4)
 scheduler.add_job(block_unblock_disciplinary, "interval", seconds=10)
-scheduler.start()
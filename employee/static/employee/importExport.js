@@ -79,6 +79,61 @@ function getCurrentLanguageCode(callback) {
   }
 }
 
+var importPhases = {
+  employees: "Creating employees",
+  work_info: "Creating work information",
+  passwords: "Setting passwords",
+};
+
+function pollImportJob(statusUrl, callback) {
+  // Shows the progress of a background import until it is done or failed
+  $.ajax({
+    type: "GET",
+    url: statusUrl,
+    success: function (state) {
+      if (state.status == "done" || state.status == "failed") {
+        callback(state);
+        return;
+      }
+      var text = importPhases[state.phase] || uploadingMessage.en;
+      if (state.total) {
+        text += ` ${Math.floor((state.processed * 100) / state.total)}%`;
+      }
+      $("#uploading .loader-text").text(text);
+      setTimeout(function () {
+        pollImportJob(statusUrl, callback);
+      }, 1000);
+    },
+    error: function () {
+      callback({ status: "failed" });
+    },
+  });
+}
+
+function importJobFinished(state) {
+  var text =
+    state.status == "done"
+      ? `${state.created} Employees Imported Successfully`
+      : "Something went wrong while importing the employees";
+  if (state.status == "done" && state.password_failures) {
+    text += `, the password of ${state.password_failures} users couldn't be set`;
+  }
+  Swal.fire({
+    text: text,
+    icon:
+      state.status != "done"
+        ? "error"
+        : state.password_failures
+        ? "warning"
+        : "success",
+    showConfirmButton: false,
+    timer: 3000,
+    timerProgressBar: true,
+  }).then(function () {
+    window.location.reload();
+  });
+}
+
 // Get the form element
 var form = document.getElementById("workInfoImportForm");
 
@@ -116,7 +171,10 @@ form.addEventListener("submit", function (event) {
         reader.onload = function() {
           var json = JSON.parse(reader.result);
 
-          if(json.success_count > 0) {
+          if (json.status_url) {
+            pollImportJob(json.status_url, importJobFinished);
+          }
+          else if(json.success_count > 0) {
             Swal.fire({
               text: `${json.success_count} Employees Imported Successfully`,
               icon: "success",
@@ -175,24 +233,21 @@ form.addEventListener("submit", function (event) {
                 responseType: "blob",
               },
               success: function (response, textStatus, xhr) {
-                Swal.fire({
-                  text: `Employees Imported Successfully`,
-                  icon: "success",
-                  showConfirmButton: false,
-                  timer: 3000,
-                  timerProgressBar: true,
-                }).then(function() {
-                  const file = new Blob([response], {
-                    type: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                  });
-                  const url = URL.createObjectURL(file);
-                  const link = document.createElement("a");
-                  link.href = url;
-                  link.download = "ImportError.xlsx";
-                  document.body.appendChild(link);
-                  link.click();
-                  window.location.reload();
+                const file = new Blob([response], {
+                  type: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 });
+                const url = URL.createObjectURL(file);
+                const link = document.createElement("a");
+                link.href = url;
+                link.download = "ImportError.xlsx";
+                document.body.appendChild(link);
+                link.click();
+                var statusUrl = xhr.getResponseHeader("X-Import-Job");
+                if (statusUrl) {
+                  pollImportJob(statusUrl, importJobFinished);
+                } else {
+                  window.location.reload();
+                }
 
                 return;
               }
@@ -163,6 +163,11 @@ urlpatterns = [
     path("employee-import", views.employee_import, name="employee-import"),
     path("employee-export", views.employee_export, name="employee-export"),
     path("work-info-import", views.work_info_import, name="work-info-import"),
+    path(
+        "employee-import-status/<str:job_id>/",
+        views.employee_import_status,
+        name="employee-import-status",
+    ),
     path("work-info-export", views.work_info_export, name="work-info-export"),
     path("get-birthday", views.get_employees_birthday, name="get-birthday"),
     path("dashboard", views.dashboard, name="dashboard"),
@@ -16,8 +16,7 @@ import calendar
 import json
 import operator
 import os
-import re
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
 from urllib.parse import parse_qs
 
 import pandas as pd
@@ -29,6 +28,7 @@ from django.db.models import F, ProtectedError
 from django.forms import DateInput, Select
 from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, QueryDict
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext as __
 from django.utils.translation import gettext_lazy as _
@@ -48,19 +48,20 @@ from base.methods import (
 )
 from base.models import (
     Company,
-    Department,
     EmailLog,
-    EmployeeShift,
-    EmployeeType,
-    JobPosition,
     JobRole,
     RotatingShiftAssign,
     RotatingWorkTypeAssign,
     ShiftRequest,
-    WorkType,
     WorkTypeRequest,
     clear_messages,
 )
+from employee.dashboard_aggregates import (
+    department_counts,
+    employee_counts,
+    gender_counts,
+    joining_counts,
+)
 from employee.filters import DocumentRequestFilter, EmployeeFilter, EmployeeReGroup
 from employee.forms import (
     BonusPointAddForm,
@@ -75,6 +76,14 @@ from employee.forms import (
     EmployeeWorkInformationUpdateForm,
     excel_columns,
 )
+from employee.imports import (
+    WORK_INFO_COLUMNS,
+    EmployeeImport,
+    ImportJob,
+    cell_text,
+    import_errors_response,
+    split_name,
+)
 from employee.methods.methods import get_ordered_badge_ids
 from employee.models import (
     BonusPoint,
@@ -87,7 +96,6 @@ from employee.models import (
 )
 from horilla.decorators import (
     hx_request_required,
-    logger,
     login_required,
     manager_can_enter,
     owner_can_enter,
@@ -114,7 +122,7 @@ from payroll.models.models import (
     Reimbursement,
 )
 from pms.models import Feedback
-from recruitment.models import Candidate, InterviewSchedule, Recruitment, Stage
+from recruitment.models import InterviewSchedule, Recruitment, Stage
 
 operator_mapping = {
     "equal": operator.eq,
@@ -2411,44 +2419,26 @@ def employee_import(request):
         file = request.FILES["file"]
         # Read the Excel file into a Pandas DataFrame
         data_frame = pd.read_excel(file)
-        # Convert the DataFrame to a list of dictionaries
-        employee_dicts = data_frame.to_dict("records")
-        # Create or update Employee objects from the list of dictionaries
-        error_list = []
-        for employee_dict in employee_dicts:
-            try:
-                phone = employee_dict["phone"]
-                email = employee_dict["email"]
-                employee_full_name = employee_dict["employee_full_name"]
-                existing_user = User.objects.filter(username=email).first()
-                if existing_user is None:
-                    employee_first_name = employee_full_name
-                    employee_last_name = ""
-                    if " " in employee_full_name:
-                        (
-                            employee_first_name,
-                            employee_last_name,
-                        ) = employee_full_name.split(" ", 1)
-
-                    user = User.objects.create_user(
-                        username=email,
-                        email=email,
-                        password=str(phone).strip(),
-                        is_superuser=False,
-                    )
-                    employee = Employee()
-                    employee.employee_user_id = user
-                    employee.employee_first_name = employee_first_name
-                    employee.employee_last_name = employee_last_name
-                    employee.email = email
-                    employee.phone = phone
-                    employee.save()
-            except Exception:
-                error_list.append(employee_dict)
+        rows = []
+        for employee_dict in data_frame.to_dict("records"):
+            first_name, last_name = split_name(
+                cell_text(employee_dict.get("employee_full_name")) or ""
+            )
+            rows.append(
+                {
+                    "First Name": first_name,
+                    "Last Name": last_name,
+                    "Email": employee_dict.get("email"),
+                    "Phone": employee_dict.get("phone"),
+                }
+            )
+        employee_import = EmployeeImport(rows, request)
+        employee_import.validate()
+        employee_import.start()
         return HttpResponse(
             """
     <div class='alert-success p-3 border-rounded'>
-        Employee data has been imported successfully.
+        Employee data is being imported.
     </div>
 
     """
@@ -2487,371 +2477,69 @@ def employee_export(_):
     return response
 
 
-def convert_nan(field, dicts):
-    """
-    This method is returns None or field value
-    """
-    field_value = dicts.get(field)
-    try:
-        float(field_value)
-        return None
-    except ValueError:
-        return field_value
-
-
 @login_required
 @permission_required("employee.add_employee")
 def work_info_import(request):
     """
-    This method is used to import Employee instances and creates related objects
-    """
-    data_frame = pd.DataFrame(
-        columns=[
-            "Badge id",
-            "First Name",
-            "Last Name",
-            "Phone",
-            "Email",
-            "Gender",
-            "Department",
-            "Job Position",
-            "Job Role",
-            "Work Type",
-            "Shift",
-            "Employee Type",
-            "Reporting Manager",
-            "Company",
-            "Location",
-            "Date joining",
-            "Contract End Date",
-            "Basic Salary",
-            "Salary Hour",
-        ]
-    )
-    error_data = {
-        "Badge id": [],
-        "First Name": [],
-        "Last Name": [],
-        "Phone": [],
-        "Email": [],
-        "Gender": [],
-        "Department": [],
-        "Job Position": [],
-        "Job Role": [],
-        "Work Type": [],
-        "Shift": [],
-        "Employee Type": [],
-        "Reporting Manager": [],
-        "Company": [],
-        "Location": [],
-        "Date joining": [],
-        "Contract End Date": [],
-        "Basic Salary": [],
-        "Salary Hour": [],
-        "Email Error": [],
-        "First Name error": [],
-        "Phone error": [],
-        "Joining Date Error": [],
-        "Contract Error": [],
-        "Badge ID Error": [],
-        "Basic Salary Error": [],
-        "Salary Hour Error": [],
-        "User ID Error": [],
-    }
-
-    # Export the DataFrame to an Excel file
-    response = HttpResponse(content_type="application/ms-excel")
-    response["Content-Disposition"] = 'attachment; filename="work_info_template.xlsx"'
-    data_frame.to_excel(response, index=False)
-    create_work_info = False
-    if request.POST.get("create_work_info") == "true":
-        create_work_info = True
-
+    This method is used to import Employee instances and creates related objects,
+    the rows are validated first and the valid rows are imported in the background
+    """
     if request.method == "POST" and request.FILES.get("file") is not None:
         file = request.FILES["file"]
         data_frame = pd.read_excel(file)
-        work_info_dicts = data_frame.to_dict("records")
-        error_lists = []
-        success_lists = []
-        total_count = 0
-        error_occured = False
-        for work_info in work_info_dicts:
-            error = False
-            try:
-                email = work_info["Email"]
-                phone = work_info["Phone"]
-                first_name = convert_nan("First Name", work_info)
-                last_name = convert_nan("Last Name", work_info)
-                badge_id = work_info["Badge id"]
-                department = convert_nan("Department", work_info)
-                job_position = convert_nan("Job Position", work_info)
-                job_role = convert_nan("Job Role", work_info)
-                work_type = convert_nan("Work Type", work_info)
-                employee_type = convert_nan("Employee Type", work_info)
-                reporting_manager = convert_nan("Reporting Manager", work_info)
-                company = convert_nan("Company", work_info)
-                location = convert_nan("Location", work_info)
-                shift = convert_nan("Shift", work_info)
-                date_joining = work_info["Date joining"]
-                contract_end_date = work_info["Contract End Date"]
-                basic_salary = convert_nan("Basic Salary", work_info)
-                salary_hour = convert_nan("Salary Hour", work_info)
-                gender = work_info.get("Gender")
-
-                pattern = r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$"
-
-                if pd.isna(email) or not re.match(pattern, email):
-                    work_info["Email Error"] = f"Invalid Email address"
-                    error = True
-
-                # try:
-                #     pd.to_numeric(phone)
-                # except:
-                #     work_info["Phone Error"] = "Phone number must be a number"
-                #     error = True
-
-                try:
-                    pd.to_numeric(basic_salary)
-                except ValueError:
-                    work_info["Basic Salary Error"] = f"Basic Salary must be a number"
-                    error = True
-
-                try:
-                    pd.to_numeric(salary_hour)
-                except ValueError:
-                    work_info["Salary Hour Error"] = f"Salary Hour must be a number"
-                    error = True
-
-                if pd.isna(first_name):
-                    work_info["First Name error"] = f"First Name can't be empty"
-                    error = True
-
-                if pd.isna(phone):
-                    work_info["Phone error"] = f"Phone Number can't be empty"
-                    error = True
-
-                try:
-                    pd.to_datetime(date_joining).date()
-                except:
-                    work_info["Joining Date Error"] = (
-                        f"Invalid Date format. Please use the format YYYY-MM-DD"
-                    )
-                    error = True
-
-                try:
-                    pd.to_datetime(contract_end_date).date()
-                except:
-                    work_info["Contract Error"] = (
-                        f"Invalid Date format. Please use the format YYYY-MM-DD"
-                    )
-                    error = True
-
-                if Employee.objects.filter(badge_id=badge_id).exists():
-                    work_info["Badge ID Error"] = (
-                        f"An Employee with the badge ID already exists"
-                    )
-                    error = True
-
-                user = User.objects.filter(username=email).first()
-                if user:
-                    work_info["User ID Error"] = (
-                        f"User with the email ID already exists"
-                    )
-                    error = True
-
-                if error:
-                    error_lists.append(work_info)
-                else:
-                    success_lists.append(work_info)
-
-            except Exception as e:
-                error_occured = True
-                logger.error(e)
-
-        if create_work_info or not error_lists:
-            try:
-                for work_info in success_lists:
-                    email = work_info["Email"]
-                    phone = work_info["Phone"]
-                    first_name = convert_nan("First Name", work_info)
-                    last_name = convert_nan("Last Name", work_info)
-                    badge_id = work_info["Badge id"]
-                    department = convert_nan("Department", work_info)
-                    job_position = convert_nan("Job Position", work_info)
-                    job_role = convert_nan("Job Role", work_info)
-                    work_type = convert_nan("Work Type", work_info)
-                    employee_type = convert_nan("Employee Type", work_info)
-                    reporting_manager = convert_nan("Reporting Manager", work_info)
-                    company = convert_nan("Company", work_info)
-                    location = convert_nan("Location", work_info)
-                    shift = convert_nan("Shift", work_info)
-                    date_joining = work_info["Date joining"]
-                    contract_end_date = work_info["Contract End Date"]
-                    basic_salary = convert_nan("Basic Salary", work_info)
-                    salary_hour = convert_nan("Salary Hour", work_info)
-                    gender = work_info.get("Gender")
-
-                    if User.objects.filter(username=email).first():
-                        continue
-
-                    user = User.objects.create_user(
-                        username=email,
-                        email=email,
-                        password=str(phone).strip(),
-                        is_superuser=False,
-                    )
-
-                    employee_obj = Employee()
-                    employee_obj.employee_user_id = user
-                    employee_obj.badge_id = badge_id
-                    employee_obj.employee_first_name = first_name
-                    employee_obj.employee_last_name = last_name
-                    employee_obj.email = email
-                    employee_obj.phone = phone
-                    employee_obj.gender = gender.lower()
-                    employee_obj.save()
-
-                    department_obj = Department.objects.filter(
-                        department=department
-                    ).first()
-                    if department_obj is None and department is not None:
-                        department_obj = Department()
-                        department_obj.department = department
-                        department_obj.save()
-
-                    job_position_obj = JobPosition.objects.filter(
-                        department_id=department_obj, job_position=job_position
-                    ).first()
-                    if job_position_obj is None and job_position is not None:
-                        job_position_obj = JobPosition()
-                        job_position_obj.department_id = department_obj
-                        job_position_obj.job_position = job_position
-                        job_position_obj.save()
-
-                    job_role_obj = JobRole.objects.filter(
-                        job_role=job_role, job_position_id=job_position_obj
-                    ).first()
-                    if job_role_obj is None and job_role is not None:
-                        job_role_obj = JobRole()
-                        job_role_obj.job_position_id = job_position_obj
-                        job_role_obj.job_role = job_role
-                        job_role_obj.save()
-
-                    work_type_obj = WorkType.objects.filter(work_type=work_type).first()
-                    if work_type_obj is None and work_type is not None:
-                        work_type_obj = WorkType()
-                        work_type_obj.work_type = work_type
-
-                    shift_obj = EmployeeShift.objects.filter(
-                        employee_shift=shift
-                    ).first()
-                    if shift_obj is None and shift is not None:
-                        shift_obj = EmployeeShift()
-                        shift_obj.employee_shift = shift
-                        shift_obj.save()
-
-                    employee_type_obj = EmployeeType.objects.filter(
-                        employee_type=employee_type
-                    ).first()
-                    if employee_type_obj is None and employee_type is not None:
-                        employee_type_obj = EmployeeType()
-                        employee_type_obj.employee_type = employee_type
-                        employee_type_obj.save()
-
-                    manager_fname, manager_lname = "", ""
-                    if isinstance(reporting_manager, str) and " " in reporting_manager:
-                        manager_fname, manager_lname = reporting_manager.split(" ", 1)
-                    reporting_manager_obj = Employee.objects.filter(
-                        employee_first_name=manager_fname,
-                        employee_last_name=manager_lname,
-                    ).first()
-                    company_obj = Company.objects.filter(company=company).first()
-                    employee_work_info = EmployeeWorkInformation.objects.filter(
-                        employee_id=employee_obj
-                    ).first()
-                    if employee_work_info is None:
-                        employee_work_info = EmployeeWorkInformation()
-                    employee_work_info.employee_id = employee_obj
-                    employee_work_info.email = email
-                    employee_work_info.department_id = department_obj
-                    employee_work_info.job_position_id = job_position_obj
-                    employee_work_info.job_role_id = job_role_obj
-                    employee_work_info.employee_type_id = employee_type_obj
-                    employee_work_info.reporting_manager_id = reporting_manager_obj
-                    employee_work_info.company_id = company_obj
-                    employee_work_info.shift_id = shift_obj
-                    employee_work_info.location = location
-                    employee_work_info.date_joining = (
-                        date_joining
-                        if not pd.isnull(date_joining)
-                        else datetime.today()
-                    )
-                    employee_work_info.contract_end_date = (
-                        contract_end_date if not pd.isnull(contract_end_date) else None
-                    )
-                    employee_work_info.basic_salary = (
-                        basic_salary if type(basic_salary) is int else 0
-                    )
-                    employee_work_info.salary_hour = (
-                        salary_hour if type(salary_hour) is int else 0
-                    )
-                    employee_work_info.save()
-
-                    total_count += 1
-
-            except Exception as e:
-                error_occured = True
-                logger.error(e)
-
-        if error_occured:
+        if not set(WORK_INFO_COLUMNS).issubset(data_frame.columns):
             messages.error(request, "something went wrong....")
             data_frame = pd.DataFrame(
                 ["The provided titles don't match the default titles."],
                 columns=["Title Error"],
             )
-
-            error_count = len(error_lists)
             # Create an HTTP response object with the Excel file
             response = HttpResponse(content_type="application/ms-excel")
             response["Content-Disposition"] = 'attachment; filename="ImportError.xlsx"'
             data_frame.to_excel(response, index=False)
-            response["X-Error-Count"] = error_count
+            response["X-Error-Count"] = 0
             return response
 
-        if error_lists:
-            for item in error_lists:
-                for key, value in error_data.items():
-                    if key in item:
-                        value.append(item[key])
-                    else:
-                        value.append(None)
-
-            keys_to_remove = [
-                key
-                for key, value in error_data.items()
-                if all(v is None for v in value)
-            ]
-
-            for key in keys_to_remove:
-                del error_data[key]
-            data_frame = pd.DataFrame(error_data, columns=error_data.keys())
-            error_count = len(error_lists)
-            # Create an HTTP response object with the Excel file
-            response = HttpResponse(content_type="application/ms-excel")
-            response["Content-Disposition"] = 'attachment; filename="ImportError.xlsx"'
-            data_frame.to_excel(response, index=False)
-            response["X-Error-Count"] = error_count
+        employee_import = EmployeeImport(data_frame.to_dict("records"), request)
+        error_rows = employee_import.validate()
+        if error_rows and request.POST.get("create_work_info") != "true":
+            return import_errors_response(error_rows)
+
+        job = employee_import.start()
+        status_url = job and reverse("employee-import-status", args=[job.job_id])
+        if error_rows:
+            response = import_errors_response(error_rows)
+            if job:
+                response["X-Import-Job"] = status_url
             return response
         return JsonResponse(
             {
-                "Success": "Employees Imported Succefully",
-                "success_count": total_count,
+                "Success": "Employees are being imported",
+                "success_count": len(employee_import.records),
+                "status_url": status_url,
             }
         )
 
+    data_frame = pd.DataFrame(columns=WORK_INFO_COLUMNS)
+    # Export the DataFrame to an Excel file
+    response = HttpResponse(content_type="application/ms-excel")
+    response["Content-Disposition"] = 'attachment; filename="work_info_template.xlsx"'
+    data_frame.to_excel(response, index=False)
     return response
 
 
+@login_required
+@permission_required("employee.add_employee")
+def employee_import_status(request, job_id):
+    """
+    This method is used to return the progress of an employee import
+    """
+    state = ImportJob(job_id).state()
+    if state is None or state.get("user_id") != request.user.id:
+        return JsonResponse({"status": "unknown"}, status=404)
+    return JsonResponse(state)
+
+
 @login_required
 @manager_can_enter("employee.view_employee")
 def work_info_export(request):
@@ -3008,24 +2696,21 @@ def dashboard(request):
     This method is used to render individual dashboard for employee module
     """
     upcoming_birthdays = birthday()
-    employees = Employee.objects.all()
-    employees = filtersubordinates(request, employees, "employee.view_employee")
-    active_employees = employees.filter(is_active=True)
-    inactive_employees = employees.filter(is_active=False)
+    counts = employee_counts(request, subordinates_only=True)
     active_ratio = 0
     inactive_ratio = 0
-    if employees.exists():
-        active_ratio = f"{(len(active_employees) / len(employees)) * 100:.1f}"
-        inactive_ratio = f"{(len(inactive_employees) / len(employees)) * 100:.1f}"
+    if counts["total"]:
+        active_ratio = f"{(counts['active'] / counts['total']) * 100:.1f}"
+        inactive_ratio = f"{(counts['inactive'] / counts['total']) * 100:.1f}"
 
     return render(
         request,
         "employee/dashboard/dashboard_employee.html",
         {
             "birthdays": upcoming_birthdays,
-            "active_employees": len(active_employees),
-            "inactive_employees": len(inactive_employees),
-            "total_employees": len(employees),
+            "active_employees": counts["active"],
+            "inactive_employees": counts["inactive"],
+            "total_employees": counts["total"],
             "active_ratio": active_ratio,
             "inactive_ratio": inactive_ratio,
         },
@@ -3041,15 +2726,12 @@ def dashboard_employee(request):
         _("Active"),
         _("In-Active"),
     ]
-    employees = Employee.objects.filter()
+    counts = employee_counts(request)
     response = {
         "dataSet": [
             {
                 "label": _("Employees"),
-                "data": [
-                    len(employees.filter(is_active=True)),
-                    len(employees.filter(is_active=False)),
-                ],
+                "data": [counts["active"], counts["inactive"]],
             },
         ],
         "labels": labels,
@@ -3063,17 +2745,13 @@ def dashboard_employee_gender(request):
     This method is used to filter out gender vise employees
     """
     labels = [_("Male"), _("Female"), _("Other")]
-    employees = Employee.objects.filter(is_active=True)
+    counts = gender_counts(request)
 
     response = {
         "dataSet": [
             {
                 "label": _("Employees"),
-                "data": [
-                    len(employees.filter(gender="male")),
-                    len(employees.filter(gender="female")),
-                    len(employees.filter(gender="other")),
-                ],
+                "data": [counts["male"], counts["female"], counts["other"]],
             },
         ],
         "labels": labels,
@@ -3086,27 +2764,12 @@ def dashboard_employee_department(request):
     """
     This method is used to find the count of employees corresponding to the departments
     """
-    labels = []
-    count = []
-    departments = Department.objects.all()
-    for dept in departments:
-        if len(
-            Employee.objects.filter(
-                employee_work_info__department_id__department=dept, is_active=True
-            )
-        ):
-            labels.append(dept.department)
-            count.append(
-                len(
-                    Employee.objects.filter(
-                        employee_work_info__department_id__department=dept,
-                        is_active=True,
-                    )
-                )
-            )
+    counts = department_counts(request)
     response = {
-        "dataSet": [{"label": "Department", "data": count}],
-        "labels": labels,
+        "dataSet": [
+            {"label": "Department", "data": [count for _dept, count in counts]}
+        ],
+        "labels": [department for department, _count in counts],
         "message": _("No Data Found..."),
     }
     return JsonResponse(response)
@@ -3117,48 +2780,25 @@ def dashboard_employee_tiles(request):
     """
     This method returns json response.
     """
+    counts = joining_counts(request)
+    employees = counts["employees"]
     data = {}
     # active employees count
-    data["total_employees"] = Employee.objects.filter(is_active=True).count()
+    data["total_employees"] = employees["active"]
     # filtering newbies
-    data["newbies_today"] = Candidate.objects.filter(
-        joining_date__range=[date.today(), date.today() + timedelta(days=1)],
-        is_active=True,
-    ).count()
-    try:
-        data[
-            "newbies_today_percentage"
-        ] = f"""{
-        (EmployeeWorkInformation.objects.filter(
-            date_joining__range=[date.today(), date.today() + timedelta(days=1)]
-            ).count() / Employee.objects.filter(
-                employee_work_info__isnull=False).count()
-                ) * 100:.2f}%"""
-    except Exception:
-        data["newbies_today_percentage"] = 0
+    data["newbies_today"] = counts["candidates"]["today"]
+    data["newbies_today_percentage"] = 0
+    if employees["with_work_info"]:
+        data["newbies_today_percentage"] = (
+            f"{(employees['joined_today'] / employees['with_work_info']) * 100:.2f}%"
+        )
     # filtering newbies on this week
-
-    data["newbies_week"] = Candidate.objects.filter(
-        joining_date__range=[
-            date.today() - timedelta(days=date.today().weekday()),
-            date.today() + timedelta(days=6 - date.today().weekday()),
-        ],
-        is_active=True,
-        hired=True,
-    ).count()
-    try:
-        data[
-            "newbies_week_percentage"
-        ] = f"""{(
-            EmployeeWorkInformation.objects.filter(
-            date_joining__range=[date.today() - timedelta(days=7), date.today()]
-            ).count() / Employee.objects.filter(
-            employee_work_info__isnull=False
-            ).count()
-            ) * 100:.2f}%"""
-
-    except Exception:
-        data["newbies_week_percentage"] = 0
+    data["newbies_week"] = counts["candidates"]["week"]
+    data["newbies_week_percentage"] = 0
+    if employees["with_work_info"]:
+        data["newbies_week_percentage"] = (
+            f"{(employees['joined_week'] / employees['with_work_info']) * 100:.2f}%"
+        )
     return JsonResponse(data)
 
 
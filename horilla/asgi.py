@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "horilla.settings")
 
 application = get_asgi_application()
+
+# the server processes elect the one running the periodic jobs
+from horilla.horilla_scheduler import scheduler  # noqa: E402
+
+scheduler.autostart()
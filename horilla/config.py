@@ -83,6 +83,9 @@ def sidebar(request):
 
 
 def get_MENUS(request):
+    # the menus of the request are built once, whatever the number of renders
+    if getattr(request, "MENUS", None) is not None:
+        return {"sidebar": request.MENUS}
     ALL_MENUS[request.session.session_key] = []
     sidebar(request)
     return {"sidebar": ALL_MENUS.get(request.session.session_key)}
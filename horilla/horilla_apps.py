@@ -24,6 +24,7 @@ AUDITLOG_INCLUDE_ALL_MODELS = True
 
 AUDITLOG_EXCLUDE_TRACKING_MODELS = (
     # "<app_name>",
+    "django_apscheduler",
     # "<app_name>.<model>"
 )
 
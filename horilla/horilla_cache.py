@@ -0,0 +1,42 @@
+"""
+horilla_cache.py
+
+This module keeps the version keys the cached data of the apps is built from.
+
+A cache entry built from some stored records carries the version of those
+records in its key. Changing the records bumps the version, which makes the
+entries built from the previous version stale in every process at once. The
+helpers swallow the cache errors, so the callers keep working from the
+database while the cache is unreachable.
+"""
+
+import time
+
+from django.core.cache import cache
+
+
+def cache_version(key, timeout=None):
+    """
+    Version stored under the key, a new one is stored when it is missing.
+    None when the cache isn't reachable
+    """
+    try:
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), timeout)
+            version = cache.get(key)
+    except Exception:
+        version = None
+    return version
+
+
+def bump_version(*keys, timeout=None):
+    """
+    Stores a new version under the keys, returns the new version
+    """
+    version = time.time_ns()
+    try:
+        cache.set_many({key: version for key in keys}, timeout)
+    except Exception:
+        pass
+    return version
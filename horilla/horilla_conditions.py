@@ -0,0 +1,249 @@
+"""
+horilla_conditions.py
+
+This module compiles the conditions stored on records, like the conditions of
+the pay-heads or of the mail automations, into predicates.
+
+A condition is a (field, operator, value) triple whose value is stored as text.
+Compiling it resolves the operator once and casts the value once per type of
+the field values it is compared with, so checking it on many records only costs
+the attribute lookups and the comparisons. When every field of a set of
+conditions is a plain column comparing the same way in Python and in the
+database, the set also compiles into a ``Q`` filter deciding all the records it
+applies to with one query.
+"""
+
+import operator
+import threading
+import time
+from decimal import Decimal
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+from django.db.models import Q
+
+from horilla.horilla_cache import bump_version, cache_version
+
+OPERATORS = {
+    "equal": operator.eq,
+    "notequal": operator.ne,
+    "lt": operator.lt,
+    "gt": operator.gt,
+    "le": operator.le,
+    "ge": operator.ge,
+    "icontains": operator.contains,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# ORM lookups of the operators, "contains" is left out as its case sensitivity
+# depends on the database
+LOOKUPS = {
+    "equal": "exact",
+    "==": "exact",
+    "notequal": "exact",
+    "!=": "exact",
+    "lt": "lt",
+    "gt": "gt",
+    "le": "lte",
+    "ge": "gte",
+}
+NEGATED_OPERATORS = ("notequal", "!=")
+
+# Python type of the values of the field classes a Q filter can compare, the
+# text fields only for equality as their ordering depends on the collation
+FIELD_TYPES = (
+    (models.BooleanField, None),
+    (models.IntegerField, int),
+    (models.FloatField, float),
+    (models.DecimalField, Decimal),
+    (models.CharField, str),
+    (models.TextField, str),
+)
+
+# Seconds a process trusts its memoised conditions before checking the version key
+VERSION_CHECK_INTERVAL = 5
+
+_MISSING = object()
+
+
+def model_field(model, field_path):
+    """
+    Returns the concrete field a ``__`` separated path ends on, None when the
+    path goes through a many valued relation or doesn't end on a column
+    """
+    field = None
+    for name in field_path.split("__"):
+        if field is not None:
+            if not field.is_relation:
+                return None
+            model = field.related_model
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.many_to_many or field.one_to_many:
+            return None
+    if field is None or field.is_relation:
+        return None
+    return field
+
+
+def field_python_type(field, operator_name):
+    for field_class, python_type in FIELD_TYPES:
+        if isinstance(field, field_class):
+            if python_type is str and operator_name not in ("equal", "notequal"):
+                return None
+            return python_type
+    return None
+
+
+class Condition:
+    """
+    A compiled (field, operator, value) condition
+    """
+
+    __slots__ = ("field", "operator", "value", "compare", "_typed_values")
+
+    def __init__(self, field, operator_name, value):
+        self.field = field
+        self.operator = operator_name
+        self.value = value
+        self.compare = OPERATORS.get(operator_name)
+        self._typed_values = {}
+
+    def typed_value(self, value_type):
+        """
+        The condition value cast to ``value_type``, cast once per type
+        """
+        typed_value = self._typed_values.get(value_type, _MISSING)
+        if typed_value is _MISSING:
+            typed_value = value_type(self.value)
+            self._typed_values[value_type] = typed_value
+        return typed_value
+
+    def test(self, value):
+        """
+        Whether a field value satisfies the condition, the condition value
+        being cast to the type of the field value. A missing value never does.
+        """
+        if value is None:
+            return False
+        return self.compare(value, self.typed_value(type(value)))
+
+    def q(self, model, aliases=None):
+        """
+        Q filter equivalent to ``test`` on the rows of the model, None when
+        the condition can't be expressed as one. ``aliases`` maps fields to
+        (annotation name, model field) pairs of annotated querysets.
+        """
+        lookup = LOOKUPS.get(self.operator)
+        if lookup is None:
+            return None
+        if aliases and self.field in aliases:
+            path, field = aliases[self.field]
+        else:
+            path, field = self.field, model_field(model, self.field)
+        python_type = field_python_type(field, self.operator)
+        if python_type is None:
+            return None
+        try:
+            typed_value = python_type(self.value)
+            field.get_prep_value(typed_value)
+        except (TypeError, ValueError, ArithmeticError, ValidationError):
+            return None
+        condition = Q(**{f"{path}__{lookup}": typed_value})
+        if self.operator in NEGATED_OPERATORS:
+            condition = ~condition
+        return Q(**{f"{path}__isnull": False}) & condition
+
+
+class ConditionSet:
+    """
+    Compiled conditions that must all be satisfied
+    """
+
+    def __init__(self, conditions):
+        self.conditions = tuple(Condition(*condition) for condition in conditions)
+
+    def matches(self, resolve):
+        """
+        Whether a record satisfies every condition, ``resolve`` returns the
+        value of a condition field on the record
+        """
+        for condition in self.conditions:
+            if not condition.test(resolve(condition.field)):
+                return False
+        return True
+
+    def q(self, model, aliases=None):
+        """
+        Q filter selecting the rows of the model that satisfy every condition,
+        None when one of the conditions can't be expressed as a filter
+        """
+        combined = Q()
+        for condition in self.conditions:
+            condition_q = condition.q(model, aliases)
+            if condition_q is None:
+                return None
+            combined &= condition_q
+        return combined
+
+
+@lru_cache(maxsize=1024)
+def compile_conditions(conditions):
+    """
+    Returns the ConditionSet of a tuple of (field, operator, value) tuples,
+    equal tuples share the same compiled set
+    """
+    return ConditionSet(conditions)
+
+
+class CompiledConditions:
+    """
+    Compiled conditions of stored records memoised per record.
+
+    ``loader`` returns the (field, operator, value) conditions of a record.
+    ``invalidate`` is meant to be connected to the signals of the records, it
+    bumps a version key in Django's cache which drops the memoised conditions
+    of every process.
+    """
+
+    def __init__(self, name, loader):
+        self.loader = loader
+        self.version_key = f"horilla_conditions_{name}_version"
+        self._compiled = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, record):
+        """
+        Returns the ConditionSet of the record
+        """
+        self._sync_version()
+        compiled = self._compiled.get(record.pk)
+        if compiled is None:
+            compiled = compile_conditions(tuple(map(tuple, self.loader(record))))
+            self._compiled[record.pk] = compiled
+        return compiled
+
+    def invalidate(self, *args, **kwargs):
+        with self._lock:
+            self._compiled = {}
+            self._version = bump_version(self.version_key)
+            self._checked_at = time.monotonic()
+
+    def _sync_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        version = cache_version(self.version_key)
+        if version is None:
+            version = self._version
+        with self._lock:
+            if version != self._version:
+                self._compiled = {}
+                self._version = version
+            self._checked_at = now
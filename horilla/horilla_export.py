@@ -0,0 +1,137 @@
+"""
+horilla_export.py
+
+This module writes exports row by row, so the memory an export takes doesn't
+grow with the number of exported records.
+
+CSV exports are streamed to the client while the rows are read. XLSX exports
+are written by XlsxWriter in constant memory mode to a spooled temporary file,
+kept in memory for small exports and moved to disk past ``EXPORT_SPOOL_SIZE``
+bytes, and the finished file is streamed in chunks.
+
+Numbers, booleans and dates are written as typed cells, any other value as its
+text.
+"""
+
+import csv
+import datetime
+import tempfile
+from decimal import Decimal
+
+import xlsxwriter
+from django.http import FileResponse, StreamingHttpResponse
+
+# Records read per query while exporting a queryset
+EXPORT_CHUNK_SIZE = 2000
+
+# Bytes of an XLSX export kept in memory before it is moved to disk
+EXPORT_SPOOL_SIZE = 4 * 1024 * 1024
+
+EXPORT_FORMATS = ("xlsx", "csv")
+
+
+class Echo:
+    """
+    File-like object returning what is written, to stream the csv rows
+    """
+
+    def write(self, value):
+        return value
+
+
+def cell_value(value):
+    """
+    Value of a spreadsheet cell, the text of values other than numbers,
+    booleans and dates
+    """
+    if value is None or isinstance(value, (bool, int, float, Decimal, datetime.date)):
+        return value
+    return str(value)
+
+
+def queryset_rows(queryset, values, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the row of each record of the queryset, ``values`` returns the
+    values of the row of a record. The records are read ``chunk_size`` at a
+    time.
+    """
+    for record in queryset.iterator(chunk_size=chunk_size):
+        yield values(record)
+
+
+def csv_response(file_name, headers, rows):
+    """
+    Streams the rows as a csv file
+    """
+    writer = csv.writer(Echo())
+
+    def stream():
+        yield writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{file_name}.csv"'
+    return response
+
+
+def xlsx_response(
+    file_name, headers, rows, sheet_name=None, column_width=None, centered=False
+):
+    """
+    Writes the rows to a xlsx file and streams it
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    workbook = xlsxwriter.Workbook(
+        output,
+        {
+            "constant_memory": True,
+            "remove_timezone": True,
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+        },
+    )
+    worksheet = workbook.add_worksheet(sheet_name)
+    alignment = {"align": "center"} if centered else {}
+    header_format = workbook.add_format(
+        {"bold": True, "border": 1, "align": "center", "valign": "top"}
+    )
+    cell_format = workbook.add_format(alignment)
+    date_format = workbook.add_format(dict(alignment, num_format="yyyy-mm-dd"))
+    datetime_format = workbook.add_format(
+        dict(alignment, num_format="yyyy-mm-dd hh:mm:ss")
+    )
+    if column_width and headers:
+        worksheet.set_column(0, len(headers) - 1, column_width)
+    worksheet.write_row(0, 0, [str(header) for header in headers], header_format)
+    for row_index, row in enumerate(rows, start=1):
+        for column_index, value in enumerate(row):
+            value = cell_value(value)
+            if isinstance(value, datetime.datetime):
+                worksheet.write_datetime(
+                    row_index, column_index, value, datetime_format
+                )
+            elif isinstance(value, datetime.date):
+                worksheet.write_datetime(row_index, column_index, value, date_format)
+            elif value is None:
+                worksheet.write_blank(row_index, column_index, None, cell_format)
+            else:
+                worksheet.write(row_index, column_index, value, cell_format)
+    workbook.close()
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f"{file_name}.xlsx",
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+def export_response(export_format, file_name, headers, rows, **xlsx_options):
+    """
+    Returns the export of the rows in the format, ``xlsx`` (the default) or
+    ``csv``, ``xlsx_options`` are the options of xlsx_response
+    """
+    if export_format == "csv":
+        return csv_response(file_name, headers, rows)
+    return xlsx_response(file_name, headers, rows, **xlsx_options)
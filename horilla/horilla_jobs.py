@@ -0,0 +1,70 @@
+"""
+horilla_jobs.py
+
+This module runs long operations, like the employee import or the bulk OKR
+assignment, in a background thread while their request returns.
+
+The progress of an operation is kept in Django's cache under a job id, so the
+status views can read it from any process while the thread updates it.
+"""
+
+import logging
+import uuid
+from threading import Thread
+
+from django import db
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class CacheJob:
+    """
+    Progress of a background job, stored in the cache under the job id.
+    Subclasses name the kind of job and how long its progress is kept.
+    """
+
+    name = "job"
+
+    # Seconds the progress is kept after its last update
+    timeout = 60 * 60 * 24
+
+    def __init__(self, job_id=None):
+        self.job_id = job_id or uuid.uuid4().hex
+
+    @property
+    def key(self):
+        return f"{self.name}_job_{self.job_id}"
+
+    def state(self):
+        """
+        The progress of the job, None when it is unknown or expired
+        """
+        return cache.get(self.key)
+
+    def update(self, **values):
+        state = self.state() or {}
+        state.update(values)
+        cache.set(self.key, state, self.timeout)
+        return state
+
+
+class JobThread(Thread):
+    """
+    Runs an operation in the background, the operation has a ``run`` method
+    and its CacheJob as ``job``, a failure is logged and stored on the job
+    """
+
+    def __init__(self, operation, description):
+        Thread.__init__(self)
+        self.operation = operation
+        self.description = description
+
+    def run(self):
+        try:
+            self.operation.run()
+        except Exception as error:
+            logger.error(f"{self.description} failed: {error}")
+            self.operation.job.update(status="failed", message=str(error))
+        finally:
+            db.connections.close_all()
@@ -9,3 +9,4 @@ from horilla.settings import MIDDLEWARE
 MIDDLEWARE.append("base.middleware.CompanyMiddleware")
 MIDDLEWARE.append("base.thread_local_middleware.ThreadLocalMiddleware")
 MIDDLEWARE.append("base.middleware.MethodNotAllowedMiddleware")
+MIDDLEWARE.append("notifications.middleware.DeferredNotificationMiddleware")
@@ -0,0 +1,348 @@
+"""
+horilla_scheduler.py
+
+This module provides the single scheduler every horilla app registers its
+periodic jobs with.
+
+Apps call ``scheduler.add_job`` from their ``scheduler`` module at import time,
+exactly like they used to do with their own ``BackgroundScheduler``. Every
+process keeps the registrations, but only one process in the whole deployment
+(the elected leader) runs them. The leader persists the jobs and their
+executions in the ``django_apscheduler`` tables, so run history and average
+durations are visible in the admin, and when the leader dies another process
+takes over the schedule.
+
+Only server processes take part in the election: ``horilla.wsgi`` and
+``horilla.asgi`` call ``scheduler.autostart`` unless ``SCHEDULER_AUTOSTART`` is
+off, in which case a dedicated ``manage.py runscheduler`` process runs the
+jobs. Management commands and scripts keep the registrations only.
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from apscheduler import events
+from apscheduler.schedulers.background import BackgroundScheduler
+from django import db
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger("scheduler")
+
+LOCK_NAME = "horilla-scheduler-leader"
+STATS_CACHE_KEY = "horilla_scheduler_stats"
+
+# Seconds between two leader election rounds (and leader heartbeats)
+ELECTION_INTERVAL = getattr(settings, "SCHEDULER_ELECTION_INTERVAL", 15)
+
+# Whether the server processes join the election
+SCHEDULER_AUTOSTART = getattr(settings, "SCHEDULER_AUTOSTART", True)
+
+
+class LeaderLock:
+    """
+    Non blocking, cluster wide lock deciding which process runs the jobs.
+
+    On PostgreSQL and MySQL this is a session level advisory lock held by the
+    election thread's own database connection, so the database releases it as
+    soon as the leader process or its connection dies. Other database backends
+    fall back to an exclusive lock on a file, which covers the single node
+    deployments they are used for.
+    """
+
+    def __init__(self, name=LOCK_NAME):
+        self.name = name
+        self.held = False
+        self._file = None
+
+    @property
+    def key(self):
+        """
+        Signed 64 bit key used for the PostgreSQL advisory lock
+        """
+        digest = hashlib.sha1(self.name.encode()).digest()
+        return int.from_bytes(digest[:8], "big", signed=True)
+
+    def acquire(self):
+        """
+        Try to take the lock without waiting, returns whether it is held
+        """
+        if self.held:
+            return self.heartbeat()
+        vendor = connection.vendor
+        if vendor == "postgresql":
+            self.held = self._fetch("SELECT pg_try_advisory_lock(%s)", [self.key])
+        elif vendor == "mysql":
+            self.held = self._fetch("SELECT GET_LOCK(%s, 0)", [self.name]) == 1
+        else:
+            self.held = self._acquire_file_lock()
+        return self.held
+
+    def heartbeat(self):
+        """
+        Make sure the connection holding an advisory lock is still alive
+        """
+        if connection.vendor in ("postgresql", "mysql"):
+            try:
+                self._fetch("SELECT 1")
+            except DatabaseError:
+                logger.warning("Scheduler lost its database connection")
+                self.held = False
+                connection.close()
+        return self.held
+
+    def release(self):
+        """
+        Give the lock back so that another process can become the leader
+        """
+        if not self.held:
+            return
+        self.held = False
+        vendor = connection.vendor
+        try:
+            if vendor == "postgresql":
+                self._fetch("SELECT pg_advisory_unlock(%s)", [self.key])
+            elif vendor == "mysql":
+                self._fetch("SELECT RELEASE_LOCK(%s)", [self.name])
+        except DatabaseError:
+            connection.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def _fetch(sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+
+    def _acquire_file_lock(self):
+        path = getattr(
+            settings,
+            "SCHEDULER_LOCK_FILE",
+            os.path.join(tempfile.gettempdir(), f"{self.name}.lock"),
+        )
+        lock_file = open(path, "a+")
+        try:
+            try:
+                import fcntl
+
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except ImportError:
+                import msvcrt
+
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+
+class HorillaScheduler:
+    """
+    Registry of the periodic jobs and the leader elected scheduler running them.
+
+    ``add_job`` takes the same arguments as ``BackgroundScheduler.add_job``.
+    Jobs default to ``coalesce=True`` and ``max_instances=1``, so a run that is
+    still busy when the next one is due is skipped and counted as an overlap
+    instead of piling up a second instance.
+    """
+
+    job_defaults = {"coalesce": True, "max_instances": 1}
+
+    def __init__(self):
+        self.jobs = {}
+        self.stats = {}
+        self.identity = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self._scheduler = None
+        self._lock = LeaderLock()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._started = {}
+
+    def add_job(self, func, trigger=None, id=None, **kwargs):
+        """
+        Register a periodic job, the job id defaults to the function's dotted path
+        """
+        job_id = id or f"{func.__module__}.{func.__qualname__}"
+        self.jobs[job_id] = (func, trigger, kwargs)
+        if self._scheduler is not None:
+            self._schedule(job_id)
+        return job_id
+
+    def start(self):
+        """
+        Start the election thread, calling it more than once is harmless
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run_election, name="horilla-scheduler", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def autostart(self):
+        """
+        Start the election from a server process unless SCHEDULER_AUTOSTART
+        is off
+        """
+        if SCHEDULER_AUTOSTART:
+            self.start()
+
+    def shutdown(self):
+        """
+        Stop running the jobs and hand the leadership over
+        """
+        self._step_down()
+        self._lock.release()
+
+    def get_stats(self):
+        """
+        Per job run metrics published by the current leader
+        """
+        if self.is_leader:
+            return self._snapshot()
+        try:
+            return cache.get(STATS_CACHE_KEY) or {}
+        except Exception:
+            return {}
+
+    def _run_election(self):
+        while True:
+            try:
+                if self._lock.acquire():
+                    if self._scheduler is None:
+                        self._become_leader()
+                elif self._scheduler is not None:
+                    self._step_down()
+            except Exception as error:
+                # tables might not be migrated yet, try again next round
+                logger.warning(f"Scheduler election failed: {error}")
+                self._step_down()
+                self._lock.release()
+                connection.close()
+            time.sleep(ELECTION_INTERVAL)
+
+    def _become_leader(self):
+        from django_apscheduler.jobstores import DjangoJobStore
+
+        scheduler = BackgroundScheduler(job_defaults=self.job_defaults)
+        scheduler.add_jobstore(DjangoJobStore(), "default")
+        scheduler.add_listener(self._listener, events.EVENT_ALL)
+        scheduler.start()
+        self._scheduler = scheduler
+        self.is_leader = True
+        for job_id in list(self.jobs):
+            self._schedule(job_id)
+        for job in scheduler.get_jobs():
+            if job.id not in self.jobs:
+                job.remove()
+        logger.info(
+            f"{self.identity} is now the scheduler leader ({len(self.jobs)} jobs)"
+        )
+
+    def _step_down(self):
+        scheduler, self._scheduler = self._scheduler, None
+        self.is_leader = False
+        if scheduler is not None and scheduler.running:
+            scheduler.shutdown(wait=False)
+            logger.info(f"{self.identity} stepped down as scheduler leader")
+
+    def run_job(self, job_id, *args, **kwargs):
+        """
+        Run the registered function of the job, recording when it started
+        """
+        func = self.jobs[job_id][0]
+        with self._stats_lock:
+            self._started[job_id] = time.time()
+        return func(*args, **kwargs)
+
+    def _schedule(self, job_id):
+        func, trigger, kwargs = self.jobs[job_id]
+        kwargs = dict(kwargs)
+        kwargs.setdefault("name", func.__qualname__)
+        args = [job_id, *kwargs.pop("args", ())]
+        self._scheduler.add_job(
+            run_registered_job,
+            trigger,
+            args=args,
+            id=job_id,
+            replace_existing=True,
+            **kwargs,
+        )
+
+    def _listener(self, event):
+        job_id = getattr(event, "job_id", None)
+        if job_id is None:
+            return
+        with self._stats_lock:
+            stat = self.stats.setdefault(
+                job_id,
+                {
+                    "runs": 0,
+                    "errors": 0,
+                    "overlaps": 0,
+                    "missed": 0,
+                    "last_run": None,
+                    "last_duration": None,
+                    "max_duration": 0.0,
+                    "total_duration": 0.0,
+                },
+            )
+            if event.code in (events.EVENT_JOB_EXECUTED, events.EVENT_JOB_ERROR):
+                started = self._started.pop(job_id, None)
+                stat["runs"] += 1
+                stat["last_run"] = event.scheduled_run_time.isoformat()
+                if started is not None:
+                    duration = time.time() - started
+                    stat["last_duration"] = round(duration, 3)
+                    stat["max_duration"] = round(max(stat["max_duration"], duration), 3)
+                    stat["total_duration"] = round(stat["total_duration"] + duration, 3)
+                if event.code == events.EVENT_JOB_ERROR:
+                    stat["errors"] += 1
+                    logger.error(f"Scheduled job {job_id} failed: {event.exception}")
+                # executed/error events are dispatched from the worker thread
+                db.close_old_connections()
+            elif event.code == events.EVENT_JOB_MAX_INSTANCES:
+                stat["overlaps"] += 1
+                logger.warning(f"Skipped {job_id}, the previous run is still busy")
+            elif event.code == events.EVENT_JOB_MISSED:
+                stat["missed"] += 1
+                logger.warning(f"Missed run of {job_id} at {event.scheduled_run_time}")
+            else:
+                return
+        try:
+            cache.set(STATS_CACHE_KEY, self._snapshot(), None)
+        except Exception as error:
+            logger.debug(f"Unable to publish scheduler stats: {error}")
+
+    def _snapshot(self):
+        snapshot = {}
+        with self._stats_lock:
+            for job_id, stat in self.stats.items():
+                snapshot[job_id] = dict(stat)
+                runs = stat["runs"]
+                snapshot[job_id]["avg_duration"] = (
+                    round(stat["total_duration"] / runs, 3) if runs else None
+                )
+        return {"leader": self.identity, "jobs": snapshot}
+
+
+def run_registered_job(job_id, *args, **kwargs):
+    """
+    Function the scheduled jobs point to, it can be referenced by the job store
+    """
+    return scheduler.run_job(job_id, *args, **kwargs)
+
+
+scheduler = HorillaScheduler()
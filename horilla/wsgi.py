@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "horilla.settings")
 
 application = get_wsgi_application()
+
+# the server processes elect the one running the periodic jobs
+from horilla.horilla_scheduler import scheduler  # noqa: E402
+
+scheduler.autostart()
@@ -0,0 +1,180 @@
+"""
+dispatcher.py
+
+This module sends the mails of the mail automations.
+
+The signal handlers only snapshot the values of the fields the conditions of
+an automation track and queue one job per automation for a save or a bulk
+update. A bounded pool of threads evaluates the conditions of the records of
+the job and sends their mails through one connection. The queue blocks the
+saving thread when it is full, so a burst of updates can't pile up unbounded.
+
+The queue depth and the send latency are published in Django's cache.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from django import db
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+STATS_CACHE_KEY = "mail_automation_dispatch_stats"
+
+# Threads sending the automation mails
+DISPATCH_WORKERS = getattr(settings, "MAIL_AUTOMATION_WORKERS", 4)
+
+# Jobs waiting for a worker before the saving thread has to wait
+QUEUE_SIZE = getattr(settings, "MAIL_AUTOMATION_QUEUE_SIZE", 1000)
+
+
+class MailJob:
+    """
+    Records of one save or bulk update to check against an automation.
+
+    ``records`` yields (created, values, previous values, mail recipient pk)
+    tuples of plain values, it is only iterated by the worker so the records
+    of a bulk update are read lazily, once the update is done. ``sender_id``
+    is the pk of the employee whose request saved the records.
+    """
+
+    def __init__(self, automation, conditions, sender_id, records):
+        self.automation = automation
+        self.conditions = conditions
+        self.sender_id = sender_id
+        self.records = records
+        self.queued_at = time.monotonic()
+
+
+class MailDispatcher:
+    """
+    Bounded queue of mail jobs and the threads working through it
+    """
+
+    def __init__(self, workers=DISPATCH_WORKERS, queue_size=QUEUE_SIZE):
+        self.workers = workers
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            "queued": 0,
+            "running": 0,
+            "processed": 0,
+            "sent": 0,
+            "failed": 0,
+            "last_latency": None,
+            "max_latency": None,
+        }
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self.work,
+                    name=f"mail-automation-{index}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, automation, conditions, sender_id, records):
+        """
+        Queue the records of a save or a bulk update for an automation
+        """
+        self.start()
+        self.jobs.put(MailJob(automation, conditions, sender_id, records))
+        with self._lock:
+            self.stats["queued"] = self.jobs.qsize()
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            with self._lock:
+                self.stats["queued"] = self.jobs.qsize()
+                self.stats["running"] += 1
+            sent = failed = 0
+            db.close_old_connections()
+            try:
+                sent, failed = self.process(job)
+            except Exception as error:
+                logger.error(f"Mail automation {job.automation} failed: {error}")
+            finally:
+                db.close_old_connections()
+                self.jobs.task_done()
+            latency = round(time.monotonic() - job.queued_at, 3)
+            with self._lock:
+                stats = self.stats
+                stats["running"] -= 1
+                stats["processed"] += 1
+                stats["sent"] += sent
+                stats["failed"] += failed
+                stats["last_latency"] = latency
+                stats["max_latency"] = max(stats["max_latency"] or 0, latency)
+            self.publish()
+
+    def process(self, job):
+        """
+        Send the mails of the records of the job that satisfy the automation,
+        returns the number of mails sent and failed
+        """
+        from horilla_automations.signals import automation_mail, mail_applicable
+
+        messages = []
+        for created, values, previous_values, mail_to in job.records:
+            if mail_applicable(
+                created, job.automation, job.conditions, values, previous_values
+            ):
+                email = automation_mail(job.sender_id, job.automation, mail_to)
+                if email is not None:
+                    messages.append(email)
+        if not messages:
+            return 0, 0
+        sent = failed = 0
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as error:
+            logger.error(error)
+            return 0, len(messages)
+        try:
+            for email in messages:
+                try:
+                    connection.send_messages([email])
+                    sent += 1
+                except Exception as error:
+                    failed += 1
+                    logger.error(error)
+        finally:
+            connection.close()
+        return sent, failed
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, queued=self.jobs.qsize())
+
+    def publish(self):
+        try:
+            cache.set(STATS_CACHE_KEY, self.snapshot(), None)
+        except Exception as error:
+            logger.debug(f"Unable to publish mail automation stats: {error}")
+
+
+def dispatch_stats():
+    """
+    Queue depth, mails sent/failed and latency (seconds from the save to the
+    mails being sent) of the automation mails, as last published
+    """
+    try:
+        return cache.get(STATS_CACHE_KEY) or dispatcher.snapshot()
+    except Exception:
+        return dispatcher.snapshot()
+
+
+dispatcher = MailDispatcher()
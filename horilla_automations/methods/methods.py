@@ -4,9 +4,11 @@ horilla_automations/methods/methods.py
 """
 
 import operator
+import types
 from django.http import QueryDict
 from django.core.exceptions import FieldDoesNotExist
 from employee.models import Employee
+from horilla.horilla_conditions import Condition
 from horilla.models import HorillaModel
 from recruitment.models import Candidate
 
@@ -115,6 +117,52 @@ def evaluate_condition(value1, operator_str, value2):
     return op_func(value1, value2)
 
 
+def attribute_getter(attr):
+    """
+    Returns a callable reading the ``__`` separated attribute path of an
+    instance the way the ``getattribute`` template filter does
+    """
+    attrs = attr.split("__")
+
+    def get_attribute(value):
+        result = ""
+        for name in attrs:
+            if hasattr(value, name):
+                result = getattr(value, name)
+                if isinstance(result, types.MethodType):
+                    result = result()
+                value = result
+        return result
+
+    return get_attribute
+
+
+def compile_query_strings(query_strings):
+    """
+    Compile the split condition query strings of an automation once into
+    (attribute getter, condition, logic) tuples, the "on"/"off" values being
+    converted to booleans
+    """
+    conditions = []
+    for query in query_strings:
+        condition = query.getlist("condition")
+        if not condition:
+            continue
+        attr, operator_str, value = condition[0], condition[1], condition[2]
+        if value == "on":
+            value = True
+        elif value == "off":
+            value = False
+        conditions.append(
+            (
+                attribute_getter(attr),
+                Condition(attr, operator_str, value),
+                query.get("logic"),
+            )
+        )
+    return conditions
+
+
 def get_related_field_model(model: Employee, field_path):
     parts = field_path.split("__")
     for part in parts:
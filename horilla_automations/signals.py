@@ -3,8 +3,6 @@ horilla_automation/signals.py
 
 """
 
-import copy
-import threading
 import types
 from django import template
 from django.db.models.signals import post_save, pre_save, post_delete
@@ -15,18 +13,6 @@ from django.core.mail import EmailMessage
 from base.thread_local_middleware import _thread_locals
 from horilla.signals import pre_bulk_update, post_bulk_update
 
-
-@classmethod
-def from_list(cls, object_list):
-    # Create a queryset-like object from the list
-    queryset_like_object = cls(model=object_list[0].__class__)
-    queryset_like_object._result_cache = list(object_list)
-    queryset_like_object._prefetch_related_lookups = ()
-    return queryset_like_object
-
-
-setattr(QuerySet, "from_list", from_list)
-
 SIGNAL_HANDLERS = []
 INSTANCE_HANDLERS = []
 
@@ -35,8 +21,10 @@ def start_automation():
     """
     Automation signals
     """
+    from horilla_automations.dispatcher import dispatcher
     from horilla_automations.models import MailAutomation
     from horilla_automations.methods.methods import (
+        compile_query_strings,
         split_query_string,
         get_model_class,
     )
@@ -50,6 +38,16 @@ def start_automation():
         start_connection()
         track_previous_instance()
 
+    def automation_conditions(automation):
+        """
+        Compiled conditions of the automation, the handlers are reconnected on
+        every save of an automation
+        """
+        condition_querystring = automation.condition_querystring.replace(
+            "automation_multiple_", ""
+        )
+        return compile_query_strings(split_query_string(condition_querystring))
+
     def clear_connection():
         """
         Method to clear signals handlers
@@ -59,36 +57,20 @@ def start_automation():
             post_bulk_update.disconnect(handler, sender=handler.model_class)
         SIGNAL_HANDLERS.clear()
 
-    def create_post_bulk_update_handler(automation, model_class, query_strings):
+    def create_post_bulk_update_handler(automation, model_class, conditions):
         def post_bulk_update_handler(sender, queryset, *args, **kwargs):
-            def _bulk_update_thread_handler(
-                queryset, previous_queryset_copy, automation
-            ):
-                request = getattr(queryset, "request", None)
-
-                if request:
-                    for index, instance in enumerate(queryset):
-                        previous_instance = previous_queryset_copy[index]
-                        send_automated_mail(
-                            request,
-                            False,
-                            automation,
-                            query_strings,
-                            instance,
-                            previous_instance,
-                        )
-
-            previous_bulk_record = getattr(_thread_locals, "previous_bulk_record", None)
-            previous_queryset = None
-            if previous_bulk_record:
-                previous_queryset = previous_bulk_record["queryset"]
-                previous_queryset_copy = previous_bulk_record["queryset_copy"]
-
-            bulk_thread = threading.Thread(
-                target=_bulk_update_thread_handler,
-                args=(queryset, previous_queryset_copy, automation),
-            )
-            bulk_thread.start()
+            request = getattr(queryset, "request", None)
+            previous_bulk_values = getattr(_thread_locals, "previous_bulk_values", {})
+            previous_values = previous_bulk_values.pop(automation.pk, None)
+            if request and previous_values:
+                dispatcher.submit(
+                    automation,
+                    conditions,
+                    request_sender(request),
+                    bulk_update_records(
+                        automation, conditions, model_class, previous_values
+                    ),
+                )
 
         func_name = f"{automation.method_title}_post_bulk_signal_handler"
 
@@ -115,45 +97,46 @@ def start_automation():
         automations = MailAutomation.objects.filter(is_active=True)
         for automation in automations:
 
-            condition_querystring = automation.condition_querystring.replace(
-                "automation_multiple_", ""
-            )
-
-            query_strings = split_query_string(condition_querystring)
+            conditions = automation_conditions(automation)
 
             model_path = automation.model
             model_class = get_model_class(model_path)
 
             handler = create_post_bulk_update_handler(
-                automation, model_class, query_strings
+                automation, model_class, conditions
             )
             SIGNAL_HANDLERS.append(handler)
 
             post_bulk_update.connect(handler, sender=model_class)
 
-            def create_signal_handler(name, automation, query_strings):
+            def create_signal_handler(name, automation, conditions):
                 def signal_handler(sender, instance, created, **kwargs):
                     """
                     Signal handler for post-save events of the model instances.
                     """
                     request = getattr(_thread_locals, "request", None)
-                    previous_record = getattr(_thread_locals, "previous_record", None)
-                    previous_instance = None
-                    if previous_record:
-                        previous_instance = previous_record["instance"]
-
-                    args = (
-                        request,
-                        created,
-                        automation,
-                        query_strings,
-                        instance,
-                        previous_instance,
-                    )
-                    thread = threading.Thread(
-                        target=lambda: send_automated_mail(*args),
-                    )
-                    thread.start()
+                    previous_record = getattr(_thread_locals, "previous_record", {})
+                    previous = previous_record.pop(automation.pk, None)
+                    previous_values = None
+                    if previous and previous[0] == instance.pk:
+                        previous_values = previous[1]
+                    if request:
+                        # the worker only gets the values of the record at
+                        # save time, not the instance the request may change
+                        dispatcher.submit(
+                            automation,
+                            conditions,
+                            request_sender(request),
+                            [
+                                automation_record(
+                                    automation,
+                                    conditions,
+                                    created,
+                                    instance,
+                                    previous_values,
+                                )
+                            ],
+                        )
 
                 signal_handler.__name__ = name
                 signal_handler.model_class = model_class
@@ -163,21 +146,24 @@ def start_automation():
             # Create and connect the signal handler
             handler_name = f"{automation.method_title}_signal_handler"
             dynamic_signal_handler = create_signal_handler(
-                handler_name, automation, query_strings
+                handler_name, automation, conditions
             )
             SIGNAL_HANDLERS.append(dynamic_signal_handler)
             post_save.connect(
                 dynamic_signal_handler, sender=dynamic_signal_handler.model_class
             )
 
-    def create_pre_bulk_update_handler(automation, model_class):
+    def create_pre_bulk_update_handler(automation, model_class, conditions):
         def pre_bulk_update_handler(sender, queryset, *args, **kwargs):
             request = getattr(_thread_locals, "request", None)
             if request:
-                _thread_locals.previous_bulk_record = {
-                    "automation": automation,
-                    "queryset": queryset,
-                    "queryset_copy": QuerySet.from_list(copy.deepcopy(list(queryset))),
+                # only the tracked values of the records, by pk, to compare
+                # them with the updated records
+                if not hasattr(_thread_locals, "previous_bulk_values"):
+                    _thread_locals.previous_bulk_values = {}
+                _thread_locals.previous_bulk_values[automation.pk] = {
+                    instance.pk: condition_values(conditions, instance)
+                    for instance in queryset.iterator()
                 }
 
         func_name = f"{automation.method_title}_pre_bulk_signal_handler"
@@ -197,6 +183,28 @@ def start_automation():
 
         return handler
 
+    def create_instance_handler(automation, model_class, conditions):
+        def instance_handler(sender, instance, **kwargs):
+            """
+            Signal handler for pres-save events of the model instances.
+            """
+            # prevented storing the scheduled activities
+            request = getattr(_thread_locals, "request", None)
+            if request and instance.pk:
+                # to get the previous values
+                previous_instance = model_class.objects.filter(id=instance.pk).first()
+                if not hasattr(_thread_locals, "previous_record"):
+                    _thread_locals.previous_record = {}
+                _thread_locals.previous_record[automation.pk] = (
+                    instance.pk,
+                    condition_values(conditions, previous_instance),
+                )
+
+        instance_handler.__name__ = f"{automation.method_title}_instance_handler"
+        instance_handler.model_class = model_class
+        instance_handler.automation = automation
+        return instance_handler
+
     def track_previous_instance():
         """
         method to add signal to track the automations model previous instances
@@ -215,117 +223,123 @@ def start_automation():
         automations = MailAutomation.objects.filter(is_active=True)
         for automation in automations:
             model_class = get_model_class(automation.model)
+            conditions = automation_conditions(automation)
 
-            handler = create_pre_bulk_update_handler(automation, model_class)
+            handler = create_pre_bulk_update_handler(
+                automation, model_class, conditions
+            )
             INSTANCE_HANDLERS.append(handler)
             pre_bulk_update.connect(handler, sender=model_class)
 
-            @receiver(pre_save, sender=model_class)
-            def instance_handler(sender, instance, **kwargs):
-                """
-                Signal handler for pres-save events of the model instances.
-                """
-                # prevented storing the scheduled activities
-                request = getattr(_thread_locals, "request", None)
-                if instance.pk:
-                    # to get the previous instance
-                    instance = model_class.objects.filter(id=instance.pk).first()
-                if request:
-                    _thread_locals.previous_record = {
-                        "automation": automation,
-                        "instance": instance,
-                    }
-                instance_handler.__name__ = (
-                    f"{automation.method_title}_instance_handler"
-                )
-                return instance_handler
-
-            instance_handler.model_class = model_class
-            instance_handler.automation = automation
-
+            instance_handler = create_instance_handler(
+                automation, model_class, conditions
+            )
             INSTANCE_HANDLERS.append(instance_handler)
+            pre_save.connect(instance_handler, sender=model_class)
 
     track_previous_instance()
     start_connection()
 
 
-def send_automated_mail(
-    request,
-    created,
-    automation,
-    query_strings,
-    instance,
-    previous_instance,
-):
-    from horilla_automations.methods.methods import evaluate_condition, operator_map
+def condition_values(conditions, instance):
+    """
+    Values of the fields tracked by the compiled conditions of an automation,
+    related records are tracked by their pk
+    """
+    values = []
+    for get_attribute, _condition, _logic in conditions:
+        value = get_attribute(instance)
+        if getattr(value, "pk", None) and isinstance(value, models.Model):
+            value = str(value.pk)
+        elif isinstance(value, QuerySet):
+            value = tuple(value.values_list("pk", flat=True))
+        values.append(value)
+    return values
+
+
+def request_sender(request):
+    """
+    Pk of the employee of the request user, the sender of the automation mails
+    """
+    employee = getattr(request.user, "employee_get", None)
+    return employee.pk if employee else None
+
+
+def automation_record(automation, conditions, created, instance, previous_values):
+    """
+    Plain values of a saved record the mail of an automation is checked with:
+    (created, tracked values, previous values, pk of the mail recipient record)
+    """
     from horilla_views.templatetags.generic_template_filters import getattribute
 
-    applicable = False
-    and_exists = False
-    false_exists = False
-    instance_values = []
-    previous_instance_values = []
-    for condition in query_strings:
-        if condition.getlist("condition"):
-            attr = condition.getlist("condition")[0]
-            operator = condition.getlist("condition")[1]
-            value = condition.getlist("condition")[2]
-
-            if value == "on":
-                value = True
-            elif value == "off":
-                value = False
-            instance_value = getattribute(instance, attr)
-            previous_instance_value = getattribute(previous_instance, attr)
-            # The send mail method only trigger when actually any changes
-            # b/w the previous, current instance's `attr` field's values and
-            # if applicable for the automation
-            if getattr(instance_value, "pk", None) and isinstance(
-                instance_value, models.Model
-            ):
-                instance_value = str(getattr(instance_value, "pk", None))
-                previous_instance_value = str(
-                    getattr(previous_instance_value, "pk", None)
-                )
-            elif isinstance(instance_value, QuerySet):
-                instance_value = list(instance_value.values_list("pk", flat=True))
-                previous_instance_value = list(
-                    previous_instance_value.values_list("pk", flat=True)
-                )
+    mail_to = getattribute(instance, automation.mail_details)
+    if isinstance(mail_to, models.Model):
+        mail_to = mail_to.pk
+    return (
+        created,
+        condition_values(conditions, instance),
+        previous_values,
+        mail_to,
+    )
 
-            instance_values.append(instance_value)
 
-            previous_instance_values.append(previous_instance_value)
+def bulk_update_records(automation, conditions, model_class, previous_values):
+    """
+    Yields the records of a bulk update with their previous values, the
+    records are read again after the update by their pk
+    """
+    instances = model_class._base_manager.filter(pk__in=list(previous_values))
+    for instance in instances.iterator():
+        yield automation_record(
+            automation, conditions, False, instance, previous_values[instance.pk]
+        )
 
-            if not condition.get("logic"):
 
-                applicable = evaluate_condition(instance_value, operator, value)
-            logic = condition.get("logic")
-            if logic:
-                applicable = operator_map[logic](
-                    applicable,
-                    evaluate_condition(instance_value, operator, value),
-                )
-            if not applicable:
-                false_exists = True
-            if logic == "and":
-                and_exists = True
-            if false_exists and and_exists:
-                applicable = False
-                break
+def mail_applicable(created, automation, conditions, values, previous_values):
+    """
+    Whether the record whose tracked values are ``values`` triggers the mail
+    of the automation, ``previous_values`` are the values before the update
+    """
+    from horilla_automations.methods.methods import operator_map
+
+    if automation.trigger == "on_create" and not created:
+        return False
+
+    applicable = False
+    and_exists = False
+    false_exists = False
+    for (_get_attribute, condition, logic), value in zip(conditions, values):
+        if condition.compare is None:
+            raise ValueError(f"Invalid operator: {condition.operator}")
+        satisfied = condition.compare(value, condition.value)
+        if not logic:
+            applicable = satisfied
+        else:
+            applicable = operator_map[logic](applicable, satisfied)
+        if not applicable:
+            false_exists = True
+        if logic == "and":
+            and_exists = True
+        if false_exists and and_exists:
+            applicable = False
+            break
     if applicable:
         if created and automation.trigger == "on_create":
-            send_mail(request, automation, instance)
-        elif (automation.trigger == "on_update") and (
-            set(previous_instance_values) != set(instance_values)
+            return True
+        # The mail is only sent on update when the tracked values changed
+        if (
+            automation.trigger == "on_update"
+            and previous_values is not None
+            and set(previous_values) != set(values)
         ):
-
-            send_mail(request, automation, instance)
+            return True
+    return False
 
 
-def send_mail(request, automation, instance):
+def automation_mail(sender_id, automation, mail_to):
     """
-    mail sending method
+    Returns the mail of the automation to the record whose pk is ``mail_to``,
+    None when there is no one to send it to
     """
     from horilla_views.templatetags.generic_template_filters import getattribute
     from horilla_automations.methods.methods import (
@@ -334,13 +348,12 @@ def send_mail(request, automation, instance):
     )
     from base.methods import generate_pdf
     from base.backends import ConfiguredEmailBackend
-    from horilla.decorators import logger
+    from employee.models import Employee
 
     mail_template = automation.mail_template
-    pk = getattribute(instance, automation.mail_details)
     model_class = get_model_class(automation.model)
     model_class = get_related_field_model(model_class, automation.mail_details)
-    mail_to_instance = model_class.objects.filter(pk=pk).first()
+    mail_to_instance = model_class.objects.filter(pk=mail_to).first()
     tos = []
     for mapping in eval(automation.mail_to):
         tos.append(getattribute(mail_to_instance, mapping))
@@ -348,39 +361,27 @@ def send_mail(request, automation, instance):
     cc = tos[1:]
     email_backend = ConfiguredEmailBackend()
     host = email_backend.dynamic_username
-    if mail_to_instance and request:
-        attachments = []
-        try:
-            sender = request.user.employee_get
-        except:
-            sender = None
-        for template_attachment in automation.template_attachments.all():
-            template_bdy = template.Template(template_attachment.body)
-            context = template.Context({"instance": mail_to_instance, "self": sender})
-            render_bdy = template_bdy.render(context)
-            attachments.append(
-                (
-                    "Document",
-                    generate_pdf(render_bdy, {}, path=False, title="Document").content,
-                    "application/pdf",
-                )
-            )
-
-        template_bdy = template.Template(mail_template.body)
+    if not mail_to_instance:
+        return None
+    attachments = []
+    sender = Employee._base_manager.filter(pk=sender_id).first()
+    for template_attachment in automation.template_attachments.all():
+        template_bdy = template.Template(template_attachment.body)
         context = template.Context({"instance": mail_to_instance, "self": sender})
         render_bdy = template_bdy.render(context)
-        email = EmailMessage(automation.title, render_bdy, host, to=to, cc=cc)
-        email.content_subtype = "html"
-
-        email.attachments = attachments
+        attachments.append(
+            (
+                "Document",
+                generate_pdf(render_bdy, {}, path=False, title="Document").content,
+                "application/pdf",
+            )
+        )
 
-        def _send_mail(email):
-            try:
-                email.send()
-            except Exception as e:
-                logger.error(e)
+    template_bdy = template.Template(mail_template.body)
+    context = template.Context({"instance": mail_to_instance, "self": sender})
+    render_bdy = template_bdy.render(context)
+    email = EmailMessage(automation.title, render_bdy, host, to=to, cc=cc)
+    email.content_subtype = "html"
 
-        thread = threading.Thread(
-            target=lambda: _send_mail(email),
-        )
-        thread.start()
+    email.attachments = attachments
+    return email
@@ -78,7 +78,7 @@ class Document(HorillaModel):
     document = models.FileField(upload_to="employee/documents", null=True)
     status = models.CharField(choices=STATUS, max_length=10, default="requested")
     reject_reason = models.TextField(blank=True, null=True, max_length=255)
-    expiry_date = models.DateField(null=True, blank=True)
+    expiry_date = models.DateField(null=True, blank=True, db_index=True)
     notify_before = models.IntegerField(default=1, null=True)
     is_digital_asset = models.BooleanField(default=False)
     objects = HorillaCompanyManager(
@@ -2,6 +2,9 @@
 horilla/cbv_methods.py
 """
 
+import base64
+import binascii
+import json
 from urllib.parse import urlencode
 import uuid
 from venv import logger
@@ -12,15 +15,20 @@ from django.template.loader import render_to_string
 from django.template.defaultfilters import register
 from django.urls import reverse
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import HttpResponse, QueryDict
 from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q, QuerySet
+from django.db.models.expressions import OrderBy
 from django.middleware.csrf import get_token
 from django.utils.html import format_html
 from django.utils.functional import lazy
 from django.utils.safestring import SafeString
 
 from horilla import settings
+from horilla.horilla_conditions import model_field
 from horilla_views.templatetags.generic_template_filters import getattribute
+from horilla_views.view_state import sort_state
 from base.thread_local_middleware import _thread_locals
 
 
@@ -192,14 +200,6 @@ def get_short_uuid(length: int, prefix: str = "hlv"):
     return prefix + str(uuid_str[:length]).replace("-", "")
 
 
-def update_initial_cache(request: object, cache: dict, view: object):
-    if cache.get(request.session.session_key):
-        cache[request.session.session_key].update({view: {}})
-        return
-    cache.update({request.session.session_key: {view: {}}})
-    return
-
-
 def structured(self):
     """
     Render the form fields as HTML table rows with Bootstrap styling.
@@ -213,12 +213,19 @@ def structured(self):
     return table_html
 
 
-class Reverse:
-    reverse: bool = True
-    page: str = ""
-
-
-cache = {}
+def sort_expressions(queryset, sort_key, descending):
+    """
+    Ordering of the queryset by the sort key, the rows without a value last
+    and the previous ordering of the queryset breaking the ties
+    """
+    field = F(sort_key)
+    expression = (
+        field.desc(nulls_last=True) if descending else field.asc(nulls_last=True)
+    )
+    previous_ordering = list(queryset.query.order_by)
+    if not previous_ordering and queryset.query.default_ordering:
+        previous_ordering = list(queryset.model._meta.ordering)
+    return [expression] + previous_ordering + ["pk"]
 
 
 def sortby(
@@ -226,67 +233,240 @@ def sortby(
 ):
     """
     New simplified method to sort the queryset/lists
+
+    Sort keys that are fields of the model (or of its single valued relations)
+    are sorted by the database, the queryset stays lazy. Other keys, like
+    methods or properties, are sorted in python.
     """
     request = getattr(_thread_locals, "request", None)
     sort_key = query_dict[key]
-    if not cache.get(request.session.session_key):
-        cache[request.session.session_key] = Reverse()
-        cache[request.session.session_key].page = (
-            "1" if not query_dict.get(page) else query_dict.get(page)
-        )
-    reverse = cache[request.session.session_key].reverse
-    none_ids = []
-
-    def _sortby(object):
-        result = getattribute(object, attr=sort_key)
-        if result is None:
-            none_ids.append(object.pk)
-        return result
+    session_key = request.session.session_key
+    state = sort_state.get(session_key)
+    if state is None:
+        state = {
+            "reverse": True,
+            "page": "1" if not query_dict.get(page) else query_dict.get(page),
+        }
+    reverse = state["reverse"]
 
     order = not reverse
     current_page = query_dict.get(page)
     if current_page or is_first_sort:
         order = not order
-        if (
-            cache[request.session.session_key].page == current_page
-            and not is_first_sort
-        ):
+        if state["page"] == current_page and not is_first_sort:
             order = not order
-        cache[request.session.session_key].page = current_page
-    try:
-        queryset = sorted(queryset, key=_sortby, reverse=order)
-    except TypeError:
-        none_queryset = list(queryset.filter(id__in=none_ids))
-        queryset = sorted(queryset.exclude(id__in=none_ids), key=_sortby, reverse=order)
-        queryset = queryset + none_queryset
-
-    cache[request.session.session_key].reverse = order
+        state["page"] = current_page
+
+    if isinstance(queryset, QuerySet) and model_field(queryset.model, sort_key):
+        queryset = queryset.order_by(*sort_expressions(queryset, sort_key, order))
+    else:
+        # records without a value are kept last, in their previous order
+        records = []
+        none_records = []
+        for record in queryset:
+            result = getattribute(record, attr=sort_key)
+            if result is None:
+                none_records.append(record)
+            else:
+                records.append((result, record))
+        records.sort(key=lambda item: item[0], reverse=order)
+        queryset = [record for _result, record in records] + none_records
+
+    state["reverse"] = order
+    sort_state.set(session_key, state)
     order = "asc" if not order else "desc"
     setattr(request, "sort_order", order)
     setattr(request, "sort_key", sort_key)
     return queryset
 
 
+class OrderedIds:
+    """
+    Ids of the records of a list view in their listed order, read only when
+    a row attribute renders them
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self._ids = None
+
+    def ids(self):
+        if self._ids is None:
+            if isinstance(self.records, QuerySet):
+                self._ids = list(self.records.values_list("id", flat=True))
+            else:
+                self._ids = [record.id for record in self.records]
+        return self._ids
+
+    def __iter__(self):
+        return iter(self.ids())
+
+    def __len__(self):
+        return len(self.ids())
+
+    def __str__(self):
+        return str(self.ids())
+
+
+class RequestOrderedIds:
+    """
+    ``ordered_ids`` attribute of the listed models, the ids listed for the
+    model in the current request
+    """
+
+    def __get__(self, instance, owner):
+        request = getattr(_thread_locals, "request", None)
+        ordered_ids = getattr(request, "ordered_ids", {})
+        for model in owner.__mro__:
+            if model in ordered_ids:
+                return ordered_ids[model]
+        return []
+
+
+def set_ordered_ids(request, model, records):
+    """
+    Sets the records listed for the model in the request, rendered by the
+    ``{ordered_ids}`` of the row attributes
+    """
+    if not isinstance(model.__dict__.get("ordered_ids"), RequestOrderedIds):
+        setattr(model, "ordered_ids", RequestOrderedIds())
+    if not hasattr(request, "ordered_ids"):
+        request.ordered_ids = {}
+    request.ordered_ids[model] = OrderedIds(records)
+
+
+class KeysetPage:
+    """
+    Page of a queryset paginated by the values of its ordering, the cursor
+    of the next page being the ordering values of the last record
+    """
+
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, next_cursor, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self.next_cursor = next_cursor
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+def encode_cursor(values):
+    data = json.dumps(values, cls=DjangoJSONEncoder).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor, length):
+    """
+    Ordering values of a cursor, None when it isn't one of ``length`` values
+    (the first page is requested with ``cursor=first``)
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+
+def keyset_filter(ordering, values):
+    """
+    Q filter of the rows after ``values`` in the ordering, a list of
+    (field path, descending) pairs sorting the rows without a value last
+    """
+    after = Q(pk__in=[])
+    equal = Q()
+    for (path, descending), value in zip(ordering, values):
+        if value is None:
+            # no row comes after a missing value on this field
+            equal &= Q(**{f"{path}__isnull": True})
+            continue
+        lookup = "lt" if descending else "gt"
+        after |= equal & (
+            Q(**{f"{path}__{lookup}": value}) | Q(**{f"{path}__isnull": True})
+        )
+        equal &= Q(**{path: value})
+    return after
+
+
+def keyset_ordering(queryset):
+    """
+    Ordering of the queryset as (field path, descending) pairs, the fields
+    ordered by expressions other than plain fields are left out
+    """
+    ordering = list(queryset.query.order_by)
+    if not ordering and queryset.query.default_ordering:
+        ordering = list(queryset.model._meta.ordering)
+    pairs = []
+    for item in ordering:
+        if isinstance(item, str) and item.lstrip("-") != "?":
+            pairs.append((item.lstrip("-"), item.startswith("-")))
+        elif isinstance(item, OrderBy) and isinstance(item.expression, F):
+            pairs.append((item.expression.name, item.descending))
+    return pairs
+
+
+def keyset_paginate(queryset, cursor=None, records_per_page=50):
+    """
+    Returns the KeysetPage of the queryset after the cursor, the rows are
+    ordered as the queryset with the rows without a value last and the pk
+    making the ordering unique
+    """
+    ordering = [
+        item for item in keyset_ordering(queryset) if item[0] not in ("pk", "id")
+    ]
+    ordering.append(("pk", False))
+    expressions = [
+        F(path).desc(nulls_last=True) if descending else F(path).asc(nulls_last=True)
+        for path, descending in ordering
+    ]
+    aliases = {f"keyset_{index}": F(path) for index, (path, _) in enumerate(ordering)}
+    queryset = queryset.annotate(**aliases).order_by(*expressions)
+    values = decode_cursor(cursor, len(ordering)) if cursor else None
+    if values is not None:
+        queryset = queryset.filter(keyset_filter(ordering, values))
+    records = list(queryset[: records_per_page + 1])
+    has_next = len(records) > records_per_page
+    records = records[:records_per_page]
+    next_cursor = None
+    if has_next:
+        last = records[-1]
+        next_cursor = encode_cursor([getattr(last, alias) for alias in aliases])
+    return KeysetPage(records, has_next, next_cursor, values is not None)
+
+
 def update_saved_filter_cache(request, cache):
     """
     Method to save filter on cache
     """
-    if cache.get(request.session.session_key):
-        cache[request.session.session_key].update(
-            {
-                "path": request.path,
-                "query_dict": request.GET,
-                "request": request,
-            }
-        )
-        return cache
-    cache.update(
-        {
-            request.session.session_key: {
-                "path": request.path,
-                "query_dict": request.GET,
-                "request": request,
-            }
-        }
+    cache.set(
+        request.session.session_key,
+        {"path": request.path, "query_dict": request.GET.urlencode()},
     )
     return cache
+
+
+def get_saved_filters(request, cache):
+    """
+    Method to get the filters saved on cache for the session, None when
+    there are none
+    """
+    state = cache.get(request.session.session_key)
+    if state is None:
+        return None
+    return QueryDict(state["query_dict"])
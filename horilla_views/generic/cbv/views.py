@@ -4,13 +4,14 @@ horilla/generic/views.py
 
 import json
 from django import forms
-from django.http import HttpRequest, HttpResponse, QueryDict
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, QueryDict
 from django.shortcuts import render
 from django.urls import reverse
 from typing import Any
 from django.urls import resolve
-from urllib.parse import parse_qs
+from urllib.parse import parse_qs, urlencode
 from django.core.paginator import Page
+from django.db.models import QuerySet
 from django.views.generic import ListView, DetailView, TemplateView, FormView
 from attendance.methods.group_by import group_by_queryset
 from base.methods import (
@@ -18,11 +19,14 @@ from base.methods import (
     get_key_instances,
 )
 from horilla.filters import FilterSet
+from horilla.horilla_export import export_response, queryset_rows
 from horilla_views import models
 from horilla_views.cbv_methods import (
+    get_saved_filters,
     get_short_uuid,
+    keyset_paginate,
     paginator_qry,
-    update_initial_cache,
+    set_ordered_ids,
     sortby,
     update_saved_filter_cache,
 )
@@ -30,10 +34,11 @@ from base.thread_local_middleware import _thread_locals
 from horilla_views.cbv_methods import structured
 from horilla_views.forms import ToggleColumnForm
 from horilla_views.templatetags.generic_template_filters import getattribute
+from horilla_views.view_state import saved_filters
 
 
-cache = {}
-saved_filters = {}
+# List views by their view path, exported through the export-list-view route
+LIST_VIEWS = {}
 
 
 class HorillaListView(ListView):
@@ -70,6 +75,12 @@ class HorillaListView(ListView):
     filter_keys_to_remove: list = []
 
     records_per_page: int = 50
+    # paginate by the ordering values of the last record instead of by page
+    # number, the pages are read without OFFSET and COUNT queries
+    keyset_pagination: bool = False
+
+    # set by the export-list-view route, the request exports the selected ids
+    exporting: bool = False
 
     def __init__(self, **kwargs: Any) -> None:
         self.view_id = get_short_uuid(4)
@@ -77,11 +88,31 @@ class HorillaListView(ListView):
 
         request = getattr(_thread_locals, "request", None)
         self.request = request
-        update_initial_cache(request, cache, HorillaListView)
+        self.update_visible_columns(request.path_info)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        LIST_VIEWS[cls.view_path()] = cls
+
+    @classmethod
+    def view_path(cls):
+        """
+        Stable id of the list view
+        """
+        return f"{cls.__module__}.{cls.__qualname__}"
 
+    def get(self, request, *args, **kwargs):
+        if self.exporting:
+            return self.export_data()
+        return super().get(request, *args, **kwargs)
+
+    def update_visible_columns(self, path):
+        """
+        Hides the columns the user hid on the list view of the path
+        """
         # hidden columns configuration
         existing_instance = models.ToggleColumn.objects.filter(
-            user_id=request.user, path=request.path_info
+            user_id=self.request.user, path=path
         ).first()
 
         hidden_fields = (
@@ -102,10 +133,10 @@ class HorillaListView(ListView):
             query_dict = self.request.GET
             if "filter_applied" in query_dict.keys():
                 update_saved_filter_cache(self.request, saved_filters)
-            elif saved_filters.get(self.request.session.session_key):
-                query_dict = saved_filters[self.request.session.session_key][
-                    "query_dict"
-                ]
+            else:
+                query_dict = (
+                    get_saved_filters(self.request, saved_filters) or query_dict
+                )
 
             self._saved_filters = query_dict
             queryset = self.filter_class(query_dict, queryset).qs
@@ -159,7 +190,6 @@ class HorillaListView(ListView):
             context["filter_dict"] = data_dict
 
         request = self.request
-        ordered_ids = list(queryset.values_list("id", flat=True))
         model = queryset.model
         is_first_sort = False
         query_dict = self.request.GET
@@ -175,14 +205,22 @@ class HorillaListView(ListView):
 
         if query_dict.get(self.sortby_key):
             queryset = sortby(
-                query_dict, queryset, self.sortby_key, is_first_sort=is_first_sort
+                query_dict,
+                queryset,
+                self.sortby_key,
+                page="cursor" if self.keyset_pagination else "page",
+                is_first_sort=is_first_sort,
             )
-            ordered_ids = [instance.id for instance in queryset]
-        setattr(model, "ordered_ids", ordered_ids)
+        set_ordered_ids(request, model, queryset)
 
-        context["queryset"] = paginator_qry(
-            queryset, self._saved_filters.get("page"), self.records_per_page
-        )
+        if self.keyset_pagination and isinstance(queryset, QuerySet):
+            context["queryset"] = keyset_paginate(
+                queryset, self._saved_filters.get("cursor"), self.records_per_page
+            )
+        else:
+            context["queryset"] = paginator_qry(
+                queryset, self._saved_filters.get("page"), self.records_per_page
+            )
 
         if request and self._saved_filters.get("field"):
             field = self._saved_filters.get("field")
@@ -197,12 +235,10 @@ class HorillaListView(ListView):
             context["groups"] = paginator_qry(
                 groups, self._saved_filters.get("page"), 10
             )
-        cache[self.request.session.session_key][HorillaListView] = context
-        from horilla.urls import urlpatterns, path
-
-        self.export_path = f"export-list-view-{get_short_uuid(4)}/"
-
-        urlpatterns.append(path(self.export_path, self.export_data))
+        self.export_path = "{}?{}".format(
+            reverse("export-list-view", args=[self.view_path()]),
+            urlencode({"path": request.path_info}),
+        )
         context["export_path"] = self.export_path
         return context
 
@@ -212,52 +248,45 @@ class HorillaListView(ListView):
         """
         return json.dumps(list(self.get_queryset().values_list("id", flat=True)))
 
+    def export_ids(self):
+        """
+        The ids of the records to export, None when the ids parameter isn't a
+        JSON list of ids
+        """
+        try:
+            ids = json.loads(self.request.GET.get("ids", ""))
+        except ValueError:
+            return None
+        if not isinstance(ids, list) or not all(str(pk).isdigit() for pk in ids):
+            return None
+        return [int(pk) for pk in ids]
+
     def export_data(self, *args, **kwargs):
         """
         Export list view visible columns
         """
-        from import_export import resources, fields
-
-        request = getattr(_thread_locals, "request", None)
-        ids = eval(request.GET["ids"])
-        queryset = self.model.objects.filter(id__in=ids)
-
-        MODEL = self.model
-        FIELDS = self.visible_column
-
-        class HorillaListViewResorce(resources.ModelResource):
-            id = fields.Field(column_name="ID")
-
-            class Meta:
-                model = MODEL
-                fields = []
-
-            def dehydrate_id(self, instance):
-                return instance.pk
-
-            def before_export(self, queryset, *args, **kwargs):
-                return super().before_export(queryset, *args, **kwargs)
-
-            for field_tuple in FIELDS:
-                dynamic_fn_str = f"def dehydrate_{field_tuple[1]}(self, instance):return str(getattribute(instance, '{field_tuple[1]}'))"
-                exec(dynamic_fn_str)
-                dynamic_fn = locals()[f"dehydrate_{field_tuple[1]}"]
-                locals()[field_tuple[1]] = fields.Field(column_name=field_tuple[0])
-
-        book_resource = HorillaListViewResorce()
+        request = self.request
+        ids = self.export_ids()
+        if ids is None:
+            return HttpResponseBadRequest("ids must be a JSON list of record ids")
+        self.update_visible_columns(request.GET.get("path", ""))
+        queryset = self.get_queryset().filter(id__in=ids)
 
-        # Export the data using the resource
-        dataset = book_resource.export(queryset)
+        headers = ["ID"] + [str(column[0]) for column in self.visible_column]
+        attrs = [column[1] for column in self.visible_column]
 
-        excel_data = dataset.export("xls")
+        def values(instance):
+            return [instance.pk] + [str(getattribute(instance, attr)) for attr in attrs]
 
-        # Set the response headers
         file_name = self.export_file_name
         if not file_name:
             file_name = "quick_export"
-        response = HttpResponse(excel_data, content_type="application/vnd.ms-excel")
-        response["Content-Disposition"] = f'attachment; filename="{file_name}.xls"'
-        return response
+        return export_response(
+            request.GET.get("format"),
+            file_name,
+            headers,
+            queryset_rows(queryset, values),
+        )
 
 
 class HorillaSectionView(TemplateView):
@@ -269,7 +298,6 @@ class HorillaSectionView(TemplateView):
         super().__init__(**kwargs)
         request = getattr(_thread_locals, "request", None)
         self.request = request
-        update_initial_cache(request, cache, HorillaListView)
 
     nav_url: str = ""
     view_url: str = ""
@@ -311,7 +339,6 @@ class HorillaDetailedView(DetailView):
         super().__init__(**kwargs)
         request = getattr(_thread_locals, "request", None)
         self.request = request
-        update_initial_cache(request, cache, HorillaDetailedView)
 
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
@@ -345,8 +372,6 @@ class HorillaDetailedView(DetailView):
         context["actions"] = self.actions
         context["action_method"] = self.action_method
 
-        cache[self.request.session.session_key][HorillaDetailedView] = context
-
         return context
 
 
@@ -363,7 +388,6 @@ class HorillaTabView(TemplateView):
         super().__init__(**kwargs)
         request = getattr(_thread_locals, "request", None)
         self.request = request
-        update_initial_cache(request, cache, HorillaTabView)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -375,8 +399,6 @@ class HorillaTabView(TemplateView):
                 context["active_target"] = active_tab.tab_target
         context["tabs"] = self.tabs
 
-        cache[self.request.session.session_key][HorillaTabView] = context
-
         return context
 
 
@@ -411,7 +433,6 @@ class HorillaCardView(ListView):
         super().__init__(**kwargs)
         request = getattr(_thread_locals, "request", None)
         self.request = request
-        update_initial_cache(request, cache, HorillaCardView)
         self._saved_filters = QueryDict()
 
     def get_queryset(self):
@@ -420,10 +441,10 @@ class HorillaCardView(ListView):
             query_dict = self.request.GET
             if "filter_applied" in query_dict.keys():
                 update_saved_filter_cache(self.request, saved_filters)
-            elif saved_filters.get(self.request.session.session_key):
-                query_dict = saved_filters[self.request.session.session_key][
-                    "query_dict"
-                ]
+            else:
+                query_dict = (
+                    get_saved_filters(self.request, saved_filters) or query_dict
+                )
 
             self._saved_filters = query_dict
             queryset = self.filter_class(query_dict, queryset).qs
@@ -460,7 +481,6 @@ class HorillaCardView(ListView):
                 data_dict.pop(key)
             context["filter_dict"] = data_dict
 
-        cache[self.request.session.session_key][HorillaCardView] = context
         return context
 
 
@@ -545,7 +565,6 @@ class HorillaFormView(FormView):
         super().__init__(**kwargs)
         request = getattr(_thread_locals, "request", None)
         self.request = request
-        update_initial_cache(request, cache, HorillaFormView)
 
         if self.form_class:
             setattr(self.form_class, "structured", structured)
@@ -628,7 +647,6 @@ class HorillaFormView(FormView):
             self.form_class.verbose_name = self.new_display_title
         form.close_button_attrs = self.close_button_attrs
         form.submit_button_attrs = self.submit_button_attrs
-        cache[self.request.session.session_key][HorillaFormView] = form
         self.form = form
         return form
 
@@ -660,7 +678,6 @@ class HorillaNavView(TemplateView):
         super().__init__(**kwargs)
         request = getattr(_thread_locals, "request", None)
         self.request = request
-        update_initial_cache(request, cache, HorillaNavView)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -677,5 +694,4 @@ class HorillaNavView(TemplateView):
         context["filter_instance_context_name"] = self.filter_instance
         if self.filter_instance:
             context[self.filter_form_context_name] = self.filter_instance.form
-        cache[self.request.session.session_key][HorillaNavView] = context
         return context
@@ -13,4 +13,9 @@ urlpatterns = [
     path("active-group", views.ActiveGroup.as_view(), name="cbv-active-group"),
     path("reload-field", views.ReloadField.as_view(), name="reload-field"),
     path("reload-messages", ReloadMessages.as_view(), name="reload-messages"),
+    path(
+        "export-list-view/<str:view_path>/",
+        views.ExportListView.as_view(),
+        name="export-list-view",
+    ),
 ]
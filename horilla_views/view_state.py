@@ -0,0 +1,131 @@
+"""
+view_state.py
+
+This module keeps the state the generic views carry between the requests of a
+session: the filters saved by the list and card views and the sort order of
+the list views.
+
+The state is stored in Django's cache, so every worker reads the state the
+others wrote. Only plain values are stored, the query string of the filters
+and the sort flags. An entry expires ``VIEW_STATE_TIMEOUT`` seconds after it
+was last written and entries above ``VIEW_STATE_MAX_BYTES`` aren't stored.
+``VIEW_STATE_CACHE`` names the cache of the entries; the least recently used
+entries are evicted by its backend once it is full, e.g. by the MAX_ENTRIES
+of a local memory cache or the maxmemory policy of redis.
+
+Hits, misses, writes and stored sizes are counted per process, ``manage.py
+listviewqueries`` reports them after running the list views.
+"""
+
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Cache alias the view states are stored in
+VIEW_STATE_CACHE = getattr(settings, "VIEW_STATE_CACHE", "default")
+
+# Seconds a view state is kept after it was last written
+VIEW_STATE_TIMEOUT = getattr(settings, "VIEW_STATE_TIMEOUT", 60 * 60 * 24)
+
+# Largest view state stored, in bytes of its JSON
+VIEW_STATE_MAX_BYTES = getattr(settings, "VIEW_STATE_MAX_BYTES", 16 * 1024)
+
+
+class ViewStateStore:
+    """
+    States of one kind stored per session key, a state is a dict of plain
+    values
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "rejected": 0,
+            "bytes_written": 0,
+            "largest": 0,
+        }
+        self._lock = threading.Lock()
+
+    def key(self, session_key):
+        return f"horilla_views_{self.namespace}_{session_key}"
+
+    def _count(self, stat, amount=1):
+        with self._lock:
+            self.stats[stat] += amount
+
+    def get(self, session_key):
+        """
+        Returns the state of the session, None when there is none
+        """
+        if not session_key:
+            return None
+        try:
+            state = caches[VIEW_STATE_CACHE].get(self.key(session_key))
+        except Exception as error:
+            logger.error(f"Unable to read the {self.namespace} view state: {error}")
+            state = None
+        self._count("hits" if state is not None else "misses")
+        return state
+
+    def set(self, session_key, state):
+        """
+        Stores the state of the session, states larger than
+        VIEW_STATE_MAX_BYTES are dropped
+        """
+        if not session_key:
+            return
+        size = len(json.dumps(state))
+        if size > VIEW_STATE_MAX_BYTES:
+            self._count("rejected")
+            self.delete(session_key)
+            return
+        try:
+            caches[VIEW_STATE_CACHE].set(
+                self.key(session_key), state, VIEW_STATE_TIMEOUT
+            )
+        except Exception as error:
+            logger.error(f"Unable to store the {self.namespace} view state: {error}")
+            return
+        with self._lock:
+            self.stats["writes"] += 1
+            self.stats["bytes_written"] += size
+            self.stats["largest"] = max(self.stats["largest"], size)
+
+    def delete(self, session_key):
+        try:
+            caches[VIEW_STATE_CACHE].delete(self.key(session_key))
+        except Exception as error:
+            logger.error(f"Unable to drop the {self.namespace} view state: {error}")
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        reads = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / reads, 3) if reads else None
+        stats["average_size"] = (
+            stats["bytes_written"] // stats["writes"] if stats["writes"] else None
+        )
+        return stats
+
+
+# Query string of the filters last applied in the session
+saved_filters = ViewStateStore("saved_filters")
+
+# Sort order of the list views of the session
+sort_state = ViewStateStore("sort_state")
+
+
+def view_state_stats():
+    """
+    Hits, misses, writes, dropped (rejected) writes and the sizes in bytes of
+    the view states of this process
+    """
+    return {store.namespace: store.snapshot() for store in (saved_filters, sort_state)}
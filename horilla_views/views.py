@@ -1,11 +1,13 @@
 import importlib
 from django import forms
-from django.http import HttpResponse, JsonResponse
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from django.views import View
 from horilla_views import models
 from horilla_views.cbv_methods import get_short_uuid
-from horilla_views.generic.cbv.views import dynamic_create_cache
+from horilla_views.generic.cbv.views import LIST_VIEWS, dynamic_create_cache
 
 # Create your views here.
 
@@ -131,3 +133,20 @@ class ActiveGroup(View):
             instance.group_target = target
             instance.save()
         return JsonResponse({"message": "Success"})
+
+
+@method_decorator(login_required, name="dispatch")
+class ExportListView(View):
+    """
+    ExportListView
+    """
+
+    def get(self, request, view_path, *args, **kwargs):
+        """
+        Http method to export the selected records of a list view, the request
+        goes through the dispatch of the list view to apply its permissions
+        """
+        view_class = LIST_VIEWS.get(view_path)
+        if view_class is None:
+            raise Http404
+        return view_class.as_view(exporting=True)(request, *args, **kwargs)
@@ -0,0 +1,319 @@
+"""
+holiday_calendar.py
+
+This module keeps a per company calendar of the non working days, that is the
+holidays and the company leaves, so that attendance, leave and payroll can check
+dates against sets instead of re-reading and expanding every Holiday and
+CompanyLeave row on each call.
+
+The raw rows of a company are shared between processes through Django's cache,
+the expanded per year date sets and the per date range calendars are memoised
+in process. Saving or deleting a Holiday or CompanyLeave bumps a version key
+which drops all of them.
+"""
+
+import calendar
+import threading
+import time
+from datetime import date
+
+from django.core.cache import cache
+
+from base.thread_local_middleware import _thread_locals
+from horilla.horilla_cache import bump_version, cache_version
+
+CACHE_VERSION_KEY = "leave_holiday_calendar_version"
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# Seconds a process trusts its memoised calendars before checking the version key
+VERSION_CHECK_INTERVAL = 5
+
+# Date range calendars kept per process, the oldest is dropped past this size
+RANGE_CACHE_SIZE = 512
+
+_state = {
+    "version": None,
+    "checked_at": 0.0,
+    "companies": {},
+    "years": {},
+    "ranges": {},
+}
+_lock = threading.Lock()
+
+
+class YearCalendar:
+    """
+    Non working days of a company for one year
+    """
+
+    def __init__(self, year, holidays, company_leaves):
+        self.year = year
+        self.holidays = frozenset(holidays)
+        self.company_leaves = frozenset(company_leaves)
+        self.non_working_days = self.holidays | self.company_leaves
+
+    def is_holiday(self, check_date):
+        return check_date in self.holidays
+
+    def is_company_leave(self, check_date):
+        return check_date in self.company_leaves
+
+    def is_non_working_day(self, check_date):
+        return check_date in self.non_working_days
+
+
+class RangeCalendar:
+    """
+    Working and non working days of a company between two dates (both
+    included).
+
+    The days are kept as a mask indexed by the day offset from the start date,
+    so the counts and the working days are computed once when the calendar is
+    built.
+    """
+
+    HOLIDAY = 1
+    COMPANY_LEAVE = 2
+
+    def __init__(self, start_date, end_date, year_calendars):
+        self.start_date = start_date
+        self.end_date = end_date
+        first = start_date.toordinal()
+        size = max(0, end_date.toordinal() - first + 1)
+        mask = bytearray(size)
+        for year_calendar in year_calendars:
+            for flag, days in (
+                (self.HOLIDAY, year_calendar.holidays),
+                (self.COMPANY_LEAVE, year_calendar.company_leaves),
+            ):
+                for day in days:
+                    offset = day.toordinal() - first
+                    if 0 <= offset < size:
+                        mask[offset] |= flag
+        self.holidays = frozenset(
+            date.fromordinal(first + offset)
+            for offset, flags in enumerate(mask)
+            if flags & self.HOLIDAY
+        )
+        self.company_leaves = frozenset(
+            date.fromordinal(first + offset)
+            for offset, flags in enumerate(mask)
+            if flags & self.COMPANY_LEAVE
+        )
+        self.non_working_days = self.holidays | self.company_leaves
+        self.working_days = tuple(
+            date.fromordinal(first + offset)
+            for offset, flags in enumerate(mask)
+            if not flags
+        )
+        self.total_days = size
+        self.total_working_days = len(self.working_days)
+
+
+def _company_key(company):
+    if company is None or company == "all":
+        return None
+    return getattr(company, "pk", company)
+
+
+def request_company():
+    """
+    Returns the company selected in the current request, None when all
+    companies are selected or outside of a request
+    """
+    request = getattr(_thread_locals, "request", None)
+    session = getattr(request, "session", None)
+    selected_company = session.get("selected_company") if session else None
+    return None if selected_company == "all" else selected_company
+
+
+def _cache_call(method, *args):
+    """
+    The calendars still work from process memory when the cache is unreachable
+    """
+    try:
+        return getattr(cache, method)(*args)
+    except Exception:
+        return None
+
+
+def _sync_version():
+    """
+    Drop the memoised calendars when another process changed the holidays
+    """
+    now = time.monotonic()
+    if now - _state["checked_at"] < VERSION_CHECK_INTERVAL:
+        return _state["version"]
+    version = cache_version(CACHE_VERSION_KEY)
+    if version is None:
+        version = _state["version"] or 0
+    with _lock:
+        if version != _state["version"]:
+            _state["companies"] = {}
+            _state["years"] = {}
+            _state["ranges"] = {}
+            _state["version"] = version
+        _state["checked_at"] = now
+    return version
+
+
+def _load_company(company_id):
+    """
+    Holiday ranges and company leave rules of a company, the rows without a
+    company apply to every company. ``None`` loads the rows of all companies.
+    """
+    from django.db.models import Q
+
+    from leave.models import CompanyLeave, Holiday
+
+    holidays = Holiday._base_manager.all()
+    company_leaves = CompanyLeave._base_manager.all()
+    if company_id is not None:
+        company_filter = Q(company_id=company_id) | Q(company_id__isnull=True)
+        holidays = holidays.filter(company_filter)
+        company_leaves = company_leaves.filter(company_filter)
+    return {
+        "holidays": [
+            (start.toordinal(), (end or start).toordinal())
+            for start, end in holidays.values_list("start_date", "end_date")
+        ],
+        "company_leaves": list(
+            company_leaves.values_list("based_on_week", "based_on_week_day")
+        ),
+    }
+
+
+def _company_data(company_id):
+    version = _sync_version()
+    data = _state["companies"].get(company_id)
+    if data is None:
+        cache_key = f"leave_holiday_calendar_{version}_{company_id}"
+        data = _cache_call("get", cache_key)
+        if data is None:
+            data = _load_company(company_id)
+            _cache_call("set", cache_key, data, CACHE_TIMEOUT)
+        _state["companies"][company_id] = data
+    return data
+
+
+def _company_leave_dates(year, rules):
+    dates = set()
+    # Sunday is the first day of the week for the week based company leaves
+    sunday_first = calendar.Calendar(firstweekday=6)
+    for based_on_week, based_on_week_day in rules:
+        weekday = int(based_on_week_day)
+        for month in range(1, 13):
+            if based_on_week is not None:
+                weeks = sunday_first.monthdatescalendar(year, month)
+                if int(based_on_week) >= len(weeks):
+                    continue
+                days = weeks[int(based_on_week)]
+            else:
+                days = sunday_first.itermonthdates(year, month)
+            dates.update(
+                day for day in days if day.month == month and day.weekday() == weekday
+            )
+    return dates
+
+
+def _holiday_dates(year, ranges):
+    first = date(year, 1, 1).toordinal()
+    last = date(year, 12, 31).toordinal()
+    dates = set()
+    for start, end in ranges:
+        for ordinal in range(max(start, first), min(end, last) + 1):
+            dates.add(date.fromordinal(ordinal))
+    return dates
+
+
+def get_year_calendar(year, company=None):
+    """
+    Returns the YearCalendar of the company, ``None`` covers all companies
+    """
+    company_id = _company_key(company)
+    _sync_version()
+    key = (company_id, year)
+    year_calendar = _state["years"].get(key)
+    if year_calendar is None:
+        data = _company_data(company_id)
+        year_calendar = YearCalendar(
+            year,
+            _holiday_dates(year, data["holidays"]),
+            _company_leave_dates(year, data["company_leaves"]),
+        )
+        _state["years"][key] = year_calendar
+    return year_calendar
+
+
+def holiday_dates(year=None, company=None):
+    """
+    Returns the set of holiday dates of a year, or of every year when no
+    year is given
+    """
+    if year is not None:
+        return set(get_year_calendar(year, company).holidays)
+    dates = set()
+    for start, end in _company_data(_company_key(company))["holidays"]:
+        dates.update(date.fromordinal(ordinal) for ordinal in range(start, end + 1))
+    return dates
+
+
+def company_leave_dates(year, company=None):
+    """
+    Returns the set of company leave dates of a year
+    """
+    return set(get_year_calendar(year, company).company_leaves)
+
+
+def is_non_working_day(check_date, company=None):
+    """
+    Whether the date is a holiday or a company leave of the company
+    """
+    return get_year_calendar(check_date.year, company).is_non_working_day(check_date)
+
+
+def get_range_calendar(start_date, end_date, company=None):
+    """
+    Returns the RangeCalendar of the company between two dates (both
+    included), ``None`` covers all companies
+    """
+    company_id = _company_key(company)
+    _sync_version()
+    key = (company_id, start_date, end_date)
+    ranges = _state["ranges"]
+    range_calendar = ranges.get(key)
+    if range_calendar is None:
+        range_calendar = RangeCalendar(
+            start_date,
+            end_date,
+            [
+                get_year_calendar(year, company_id)
+                for year in range(start_date.year, end_date.year + 1)
+            ],
+        )
+        with _lock:
+            if len(ranges) >= RANGE_CACHE_SIZE:
+                ranges.pop(next(iter(ranges)), None)
+            ranges[key] = range_calendar
+    return range_calendar
+
+
+def non_working_days(start_date, end_date, company=None):
+    """
+    Returns the holidays and company leaves between two dates (both included)
+    as two sets
+    """
+    range_calendar = get_range_calendar(start_date, end_date, company)
+    return set(range_calendar.holidays), set(range_calendar.company_leaves)
+
+
+def invalidate_calendar(*args, **kwargs):
+    """
+    Signal receiver dropping the calendars of every process
+    """
+    with _lock:
+        _state["companies"] = {}
+        _state["years"] = {}
+        _state["ranges"] = {}
+        _state["version"] = bump_version(CACHE_VERSION_KEY)
+        _state["checked_at"] = time.monotonic()
@@ -0,0 +1,155 @@
+"""
+leave_clashes.py
+
+This module keeps the ``leave_clashes_count`` of the leave requests, the
+number of other requests whose dates overlap and whose employee is in the same
+department or job position.
+
+Clashing is symmetric, so a change of one request only changes the counts of
+the requests clashing with its previous and its new dates. Those are found by
+one interval query over the department, the job position and the date range
+and adjusted by one ``UPDATE`` each, instead of recounting every request. A
+change of an employee's department or job position isn't tracked,
+``rebuild_leave_clashes`` (the ``rebuild_leave_clashes`` command) recounts
+every request from scratch.
+"""
+
+from django.db.models import F, Func, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+# Leave requests recounted per query by rebuild_leave_clashes
+REBUILD_BATCH_SIZE = 1000
+
+
+def employee_scope(employee_id):
+    """
+    (department id, job position id) of the work information of the employee
+    """
+    from employee.models import EmployeeWorkInformation
+
+    return (
+        EmployeeWorkInformation._base_manager.filter(employee_id=employee_id)
+        .values_list("department_id", "job_position_id")
+        .first()
+    ) or (None, None)
+
+
+def clash_filter(department_id, job_position_id, start_date, end_date):
+    """
+    Filter of the leave requests clashing with a request of an employee of the
+    department and job position over the dates, None when nothing can clash
+    """
+    scope = Q()
+    if department_id is not None:
+        scope |= Q(employee_id__employee_work_info__department_id=department_id)
+    if job_position_id is not None:
+        scope |= Q(employee_id__employee_work_info__job_position_id=job_position_id)
+    if not scope or start_date is None:
+        return None
+    return scope & Q(start_date__lte=end_date or start_date, end_date__gte=start_date)
+
+
+def clashing_requests(leave_request, dates=None, scope=None):
+    """
+    Leave requests clashing with the leave request, over ``dates``
+    (start date, end date) instead of its own dates when given
+    """
+    from leave.models import LeaveRequest
+
+    department_id, job_position_id = scope or employee_scope(
+        leave_request.employee_id_id
+    )
+    start_date, end_date = dates or (leave_request.start_date, leave_request.end_date)
+    condition = clash_filter(department_id, job_position_id, start_date, end_date)
+    if condition is None:
+        return LeaveRequest._base_manager.none()
+    return LeaveRequest._base_manager.filter(condition).exclude(id=leave_request.id)
+
+
+def count_clashes(leave_request):
+    """
+    Number of leave requests clashing with the leave request
+    """
+    return clashing_requests(leave_request).count()
+
+
+def shift_clashes(leave_request, previous_dates=None, removed=False):
+    """
+    Adjusts the counts of the requests clashing with the previous dates or
+    with the current dates of the leave request, ``previous_dates`` is None
+    for a new request and ``removed`` is True for a deleted one
+    """
+    dates = (leave_request.start_date, leave_request.end_date)
+    if removed:
+        previous_dates = previous_dates or dates
+    elif previous_dates == dates:
+        return
+    scope = employee_scope(leave_request.employee_id_id)
+    current = (
+        None if removed else clashing_requests(leave_request, scope=scope).values("id")
+    )
+    previous = (
+        None
+        if previous_dates is None
+        else clashing_requests(leave_request, previous_dates, scope).values("id")
+    )
+    if previous is not None:
+        stale = clashing_requests(leave_request, previous_dates, scope)
+        if current is not None:
+            stale = stale.exclude(id__in=current)
+        stale.update(leave_clashes_count=F("leave_clashes_count") - 1)
+    if current is not None:
+        added = clashing_requests(leave_request, scope=scope)
+        if previous is not None:
+            added = added.exclude(id__in=previous)
+        added.update(leave_clashes_count=F("leave_clashes_count") + 1)
+
+
+def rebuild_leave_clashes(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recounts the clashes of every leave request, returns the number of
+    requests whose count changed
+    """
+    from leave.models import LeaveRequest
+
+    work_info = "employee_id__employee_work_info__"
+    clashes = (
+        LeaveRequest._base_manager.filter(
+            Q(**{f"{work_info}department_id": OuterRef(f"{work_info}department_id")})
+            | Q(
+                **{
+                    f"{work_info}job_position_id": OuterRef(
+                        f"{work_info}job_position_id"
+                    )
+                }
+            ),
+            start_date__lte=Coalesce(OuterRef("end_date"), OuterRef("start_date")),
+            end_date__gte=OuterRef("start_date"),
+        )
+        .exclude(id=OuterRef("id"))
+        .order_by()
+        .annotate(count=Func(F("id"), function="COUNT"))
+        .values("count")
+    )
+    requests = LeaveRequest._base_manager.annotate(
+        clashes=Coalesce(Subquery(clashes), 0)
+    ).order_by("id")
+    changed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            requests.filter(id__gt=last_id).values_list(
+                "id", "leave_clashes_count", "clashes"
+            )[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        updates = [
+            LeaveRequest(id=leave_id, leave_clashes_count=clashes)
+            for leave_id, count, clashes in batch
+            if count != clashes
+        ]
+        LeaveRequest._base_manager.bulk_update(updates, ["leave_clashes_count"])
+        changed += len(updates)
+    return changed
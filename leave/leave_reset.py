@@ -0,0 +1,137 @@
+"""
+leave_reset.py
+
+This module resets the available leaves whose reset date is due and expires
+the carried forward days whose expiry date is due.
+
+Only the due rows are read, by their indexed ``reset_date`` and
+``expired_date``, a batch of ``RESET_BATCH_SIZE`` rows at a time. The carry
+forward and the next reset and expiry dates are computed with the methods of
+``AvailableLeave`` and each batch is written with one ``bulk_update`` that
+keeps the audit history.
+
+Rows whose date passed while the job didn't run are caught up: they are reset
+once and get their next date after the day of the run, so running the job
+again the same day finds nothing to do. The summary of the last run is kept
+in Django's cache.
+"""
+
+import logging
+import time
+from datetime import date
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from simple_history.utils import bulk_update_with_history
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_CACHE_KEY = "leave_reset_summary"
+
+# Available leaves updated per query
+RESET_BATCH_SIZE = 500
+
+RESET_FIELDS = [
+    "available_days",
+    "carryforward_days",
+    "total_leave_days",
+    "reset_date",
+    "expired_date",
+]
+
+
+def reset_leave(available_leave, today):
+    """
+    Resets and expires the available leave when their dates are due, returns
+    whether it was reset and whether it expired
+    """
+    reset = expired = False
+    if available_leave.reset_date is not None and available_leave.reset_date <= today:
+        available_leave.update_carryforward()
+        available_leave.reset_date = available_leave.set_reset_date(
+            assigned_date=today, available_leave=available_leave
+        )
+        reset = True
+    if (
+        available_leave.expired_date is not None
+        and available_leave.expired_date <= today
+    ):
+        available_leave.expired_date = available_leave.set_expired_date(
+            available_leave=available_leave, assigned_date=today
+        )
+        expired = True
+    # same totals as AvailableLeave.save
+    available_leave.total_leave_days = max(
+        available_leave.available_days + available_leave.carryforward_days, 0
+    )
+    available_leave.carryforward_days = max(available_leave.carryforward_days, 0)
+    return reset, expired
+
+
+def reset_available_leaves(today=None):
+    """
+    Resets and expires every due available leave of the leave types with reset
+    enabled, returns the summary of the run
+    """
+    from leave.models import AvailableLeave
+
+    today = today or date.today()
+    started = time.perf_counter()
+    summary = {
+        "date": today.isoformat(),
+        "reset": 0,
+        "expired": 0,
+        "overdue": 0,
+        "batches": 0,
+    }
+    due_leaves = (
+        AvailableLeave._base_manager.filter(leave_type_id__reset=True)
+        .filter(Q(reset_date__lte=today) | Q(expired_date__lte=today))
+        .select_related("leave_type_id")
+        .order_by("pk")
+    )
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                due_leaves.filter(pk__gt=last_pk).select_for_update(of=("self",))[
+                    :RESET_BATCH_SIZE
+                ]
+            )
+            if not batch:
+                break
+            for available_leave in batch:
+                if (available_leave.reset_date or today) < today or (
+                    available_leave.expired_date or today
+                ) < today:
+                    summary["overdue"] += 1
+                reset, expired = reset_leave(available_leave, today)
+                summary["reset"] += reset
+                summary["expired"] += expired
+            bulk_update_with_history(
+                batch,
+                AvailableLeave,
+                RESET_FIELDS,
+                default_change_reason="Leave reset",
+            )
+        summary["batches"] += 1
+        last_pk = batch[-1].pk
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Leave reset: {summary}")
+    try:
+        cache.set(SUMMARY_CACHE_KEY, summary, None)
+    except Exception:
+        pass
+    return summary
+
+
+def last_reset_summary():
+    """
+    Summary of the last leave reset run, None when it didn't run yet
+    """
+    try:
+        return cache.get(SUMMARY_CACHE_KEY)
+    except Exception:
+        return None
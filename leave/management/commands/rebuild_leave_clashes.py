@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from leave.leave_clashes import REBUILD_BATCH_SIZE, rebuild_leave_clashes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recounts the leave clashes of every leave request, e.g. after employees "
+        "changed department or job position"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=REBUILD_BATCH_SIZE,
+            help="Leave requests recounted per query",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        changed = rebuild_leave_clashes(batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated the clashes count of {changed} leave requests "
+                f"in {elapsed:.1f}s"
+            )
+        )
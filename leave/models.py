@@ -1,4 +1,3 @@
-import calendar
 import math
 import operator
 import sys
@@ -11,7 +10,8 @@ from django.contrib import messages
 from django.core.exceptions import ValidationError
 from django.core.files.storage import default_storage
 from django.db import models
-from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
@@ -28,7 +28,14 @@ from employee.models import Employee, EmployeeWorkInformation
 from horilla.models import HorillaModel
 from horilla_audit.methods import get_diff
 from horilla_audit.models import HorillaAuditInfo, HorillaAuditLog
-from leave.threading import LeaveClashThread
+from leave.holiday_calendar import (
+    company_leave_dates,
+    get_range_calendar,
+    holiday_dates,
+    invalidate_calendar,
+    request_company,
+)
+from leave.leave_clashes import count_clashes, shift_clashes
 
 from .methods import attendance_days, calculate_requested_days
 
@@ -266,6 +273,17 @@ class CompanyLeave(HorillaModel):
         return f"{dict(WEEK_DAYS).get(self.based_on_week_day)} | {dict(WEEKS).get(self.based_on_week)}"
 
 
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+@receiver(post_save, sender=CompanyLeave)
+@receiver(post_delete, sender=CompanyLeave)
+def holiday_calendar_post_change(sender, **kwargs):
+    """
+    Drop the cached holiday calendars when a holiday or company leave changes
+    """
+    invalidate_calendar()
+
+
 class AvailableLeave(HorillaModel):
     employee_id = models.ForeignKey(
         Employee,
@@ -307,6 +325,10 @@ class AvailableLeave(HorillaModel):
 
     class Meta:
         unique_together = ("leave_type_id", "employee_id")
+        indexes = [
+            models.Index(fields=["reset_date"]),
+            models.Index(fields=["expired_date"]),
+        ]
 
     def __str__(self):
         return f"{self.employee_id} | {self.leave_type_id}"
@@ -517,6 +539,7 @@ class LeaveRequest(HorillaModel):
 
     class Meta:
         ordering = ["-id"]
+        indexes = [models.Index(fields=["start_date", "end_date"])]
 
     def tracking(self):
         return get_diff(self)
@@ -545,66 +568,47 @@ class LeaveRequest(HorillaModel):
             requested_dates.append(date)
         return requested_dates
 
+    def calendar_years(self):
+        """
+        :return: the company of the request's employee and the years covered by
+        the request, ``LeaveRequest.holiday_dates(None)`` uses the selected company
+        """
+        if not self:
+            return request_company(), [date.today().year]
+        work_info = getattr(self.employee_id, "employee_work_info", None)
+        company = getattr(work_info, "company_id_id", None)
+        end_date = self.end_date or self.start_date
+        return company, range(self.start_date.year, end_date.year + 1)
+
     def holiday_dates(self):
         """
         :return: this functions returns a list of all holiday dates.
         """
-        holiday_dates = []
-        holidays = Holiday.objects.all()
-        for holiday in holidays:
-            holiday_start_date = holiday.start_date
-            holiday_end_date = holiday.end_date
-            if holiday_end_date is None:
-                holiday_end_date = holiday_start_date
-            holiday_days = holiday_end_date - holiday_start_date
-            for i in range(holiday_days.days + 1):
-                date = holiday_start_date + timedelta(i)
-                holiday_dates.append(date)
-        return holiday_dates
+        if not self:
+            return list(holiday_dates(company=request_company()))
+        company, years = LeaveRequest.calendar_years(self)
+        dates = set()
+        for year in years:
+            dates |= holiday_dates(year, company)
+        return list(dates)
 
     def company_leave_dates(self):
         """
         :return: This function returns a list of all company leave dates"""
-        from datetime import date
+        company, years = LeaveRequest.calendar_years(self)
+        dates = set()
+        for year in years:
+            dates |= company_leave_dates(year, company)
+        return list(dates)
 
-        company_leaves = CompanyLeave.objects.all()
-        company_leave_dates = []
-        for company_leave in company_leaves:
-            if self:
-                year = self.start_date.year
-            else:
-                year = date.today().year
-            based_on_week = company_leave.based_on_week
-            based_on_week_day = company_leave.based_on_week_day
-            for month in range(1, 13):
-                if based_on_week != None:
-                    # Set Sunday as the first day of the week
-                    calendar.setfirstweekday(6)
-                    month_calendar = calendar.monthcalendar(year, month)
-                    weeks = month_calendar[int(based_on_week)]
-                    weekdays_in_weeks = [day for day in weeks if day != 0]
-                    for day in weekdays_in_weeks:
-                        date = datetime.strptime(
-                            f"{year}-{month:02}-{day:02}", "%Y-%m-%d"
-                        ).date()
-                        if (
-                            date.weekday() == int(based_on_week_day)
-                            and date not in company_leave_dates
-                        ):
-                            company_leave_dates.append(date)
-                else:
-                    # Set Monday as the first day of the week
-                    calendar.setfirstweekday(0)
-                    month_calendar = calendar.monthcalendar(year, month)
-                    for week in month_calendar:
-                        if week[int(based_on_week_day)] != 0:
-                            date = datetime.strptime(
-                                f"{year}-{month:02}-{week[int(based_on_week_day)]:02}",
-                                "%Y-%m-%d",
-                            ).date()
-                            if date not in company_leave_dates:
-                                company_leave_dates.append(date)
-        return company_leave_dates
+    def range_calendar(self):
+        """
+        :return: the holidays and company leaves of the requested dates
+        """
+        company, _years = LeaveRequest.calendar_years(self)
+        return get_range_calendar(
+            self.start_date, self.end_date or self.start_date, company
+        )
 
     def save(self, *args, **kwargs):
 
@@ -622,10 +626,16 @@ class LeaveRequest(HorillaModel):
         else:
             self.exclude_leaves()
 
+        previous_dates = (
+            LeaveRequest._base_manager.filter(id=self.id)
+            .values_list("start_date", "end_date")
+            .first()
+            if self.id
+            else None
+        )
         self.leave_clashes_count = self.count_leave_clashes()
-
-        self.update_leave_clashes_count()
         super().save(*args, **kwargs)
+        self.update_leave_clashes_count(previous_dates)
         work_info = EmployeeWorkInformation.objects.filter(employee_id=self.employee_id)
         department_id = None
         conditions = None
@@ -702,31 +712,15 @@ class LeaveRequest(HorillaModel):
         return cleaned_data
 
     def exclude_all_leaves(self):
-        requested_dates = self.requested_dates()
-        holiday_dates = self.holiday_dates()
-        company_leave_dates = self.company_leave_dates()
-        total_leaves = list(set(holiday_dates + company_leave_dates))
-        total_leave_count = sum(
-            requested_date in total_leaves for requested_date in requested_dates
-        )
+        total_leave_count = len(self.range_calendar().non_working_days)
         self.requested_days = self.requested_days - total_leave_count
 
     def exclude_leaves(self):
-        holiday_count = 0
         if self.leave_type_id.exclude_holiday == "yes":
-            requested_dates = self.requested_dates()
-            holiday_dates = self.holiday_dates()
-            for requested_date in requested_dates:
-                if requested_date in holiday_dates:
-                    holiday_count += 1
+            holiday_count = len(self.range_calendar().holidays)
             self.requested_days = self.requested_days - holiday_count
         if self.leave_type_id.exclude_company_leave == "yes":
-            requested_dates = self.requested_dates()
-            company_leave_dates = self.company_leave_dates()
-            company_leave_count = sum(
-                requested_date in company_leave_dates
-                for requested_date in requested_dates
-            )
+            company_leave_count = len(self.range_calendar().company_leaves)
             self.requested_days = self.requested_days - company_leave_count
 
     def no_approval(self):
@@ -792,8 +786,7 @@ class LeaveRequest(HorillaModel):
 
             super().delete(*args, **kwargs)
 
-            clash_thread = LeaveClashThread(leave_request)
-            clash_thread.start()
+            leave_request.update_leave_clashes_count(removed=True)
 
         else:
             if request:
@@ -803,39 +796,19 @@ class LeaveRequest(HorillaModel):
                     _("The {} leave request cannot be deleted !").format(self.status),
                 )
 
-    def update_leave_clashes_count(self):
+    def update_leave_clashes_count(self, previous_dates=None, removed=False):
         """
-        Update the leave clashes count for all leave requests.
+        Update the leave clashes count of the leave requests clashing with the
+        previous (start date, end date) or the current dates of this request.
         """
-        leave_requests_to_update = LeaveRequest.objects.all().exclude(id=self.id)
-
-        for leave_request in leave_requests_to_update:
-            leave_request.leave_clashes_count = leave_request.count_leave_clashes()
-
-        # Bulk update leave clashes count for all leave requests
-        LeaveRequest.objects.bulk_update(
-            leave_requests_to_update, ["leave_clashes_count"]
-        )
+        shift_clashes(self, previous_dates, removed)
 
     def count_leave_clashes(self):
         """
         Method to count leave clashes where this employee's leave request overlaps
         with other employees' requested dates.
         """
-        work_info = EmployeeWorkInformation.objects.filter(employee_id=self.employee_id)
-        if work_info.exists():
-            overlapping_requests = LeaveRequest.objects.exclude(id=self.id).filter(
-                Q(
-                    employee_id__employee_work_info__department_id=self.employee_id.employee_work_info.department_id
-                )
-                | Q(
-                    employee_id__employee_work_info__job_position_id=self.employee_id.employee_work_info.job_position_id
-                ),
-                start_date__lte=self.end_date,
-                end_date__gte=self.start_date,
-            )
-            return overlapping_requests.count()
-        return 0
+        return count_clashes(self)
 
 
 class LeaverequestFile(models.Model):
@@ -2,44 +2,21 @@ import calendar
 import datetime as dt
 from datetime import datetime, timedelta
 
-from apscheduler.schedulers.background import BackgroundScheduler
 from dateutil.relativedelta import relativedelta
 
-today = datetime.now()
+from horilla.horilla_scheduler import scheduler
 
 
 def leave_reset():
-    from leave.models import LeaveType
+    from leave.leave_reset import reset_available_leaves
 
-    today_date = today.date()
-    leave_types = LeaveType.objects.filter(reset=True)
-    # Looping through filtered leave types with reset is true
-    for leave_type in leave_types:
-        # #Looping through all available leaves
-        available_leaves = leave_type.employee_available_leave.all()
-
-        for available_leave in available_leaves:
-            reset_date = available_leave.reset_date
-            expired_date = available_leave.expired_date
-            if reset_date == today_date:
-                available_leave.update_carryforward()
-                # new_reset_date = available_leave.set_reset_date(assigned_date=today_date,available_leave = available_leave)
-                new_reset_date = available_leave.set_reset_date(
-                    assigned_date=today_date, available_leave=available_leave
-                )
-                available_leave.reset_date = new_reset_date
-                available_leave.save()
-            if expired_date == today_date:
-                new_expired_date = available_leave.set_expired_date(
-                    available_leave=available_leave, assigned_date=today_date
-                )
-                available_leave.expired_date = new_expired_date
-                available_leave.save()
+    reset_available_leaves()
 
 
 def recurring_holiday():
     from leave.models import Holiday
 
+    today = datetime.now()
     recurring_holidays = Holiday.objects.filter(recurring=True)
     # Looping through all recurring holiday
     for recurring_holiday in recurring_holidays:
@@ -58,8 +35,5 @@ def recurring_holiday():
         recurring_holiday.save()
 
 
-scheduler = BackgroundScheduler()
 scheduler.add_job(leave_reset, "interval", hours=4)
 scheduler.add_job(recurring_holiday, "interval", hours=4)
-
-scheduler.start()
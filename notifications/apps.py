@@ -14,3 +14,16 @@ class Config(AppConfig):
         import notifications.signals
 
         notifications.notify = notifications.signals.notify
+
+        from django.db.models.signals import post_delete, post_save
+        from swapper import load_model
+
+        from notifications.unread import touch_notification
+
+        Notification = load_model("notifications", "Notification")
+        post_save.connect(
+            touch_notification, sender=Notification, dispatch_uid="notifications_unread"
+        )
+        post_delete.connect(
+            touch_notification, sender=Notification, dispatch_uid="notifications_unread"
+        )
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=too-many-lines
+import logging
+import threading
 from distutils.version import (  # pylint: disable=no-name-in-module,import-error
     StrictVersion,
 )
@@ -18,8 +20,11 @@ from swapper import load_model
 
 from notifications import settings as notifications_settings
 from notifications.signals import notify
+from notifications.unread import touch_unread
 from notifications.utils import id2slug
 
+logger = logging.getLogger(__name__)
+
 if StrictVersion(get_version()) >= StrictVersion("1.8.0"):
     from django.contrib.contenttypes.fields import GenericForeignKey  # noqa
 else:
@@ -42,6 +47,17 @@ def assert_soft_delete():
         raise ImproperlyConfigured(msg)
 
 
+def update_notifications(qset, **values):
+    """
+    Updates the notifications and makes the unread data of their recipients
+    stale
+    """
+    recipients = list(qset.order_by().values_list("recipient_id", flat=True).distinct())
+    updated = qset.update(**values)
+    touch_unread(recipients)
+    return updated
+
+
 class NotificationQuerySet(models.query.QuerySet):
     """Notification QuerySet"""
 
@@ -80,7 +96,7 @@ class NotificationQuerySet(models.query.QuerySet):
         if recipient:
             qset = qset.filter(recipient=recipient)
 
-        return qset.update(unread=False)
+        return update_notifications(qset, unread=False)
 
     def mark_all_as_unread(self, recipient=None):
         """Mark as unread any read messages in the current queryset.
@@ -92,7 +108,7 @@ class NotificationQuerySet(models.query.QuerySet):
         if recipient:
             qset = qset.filter(recipient=recipient)
 
-        return qset.update(unread=True)
+        return update_notifications(qset, unread=True)
 
     def deleted(self):
         """Return only deleted items in the current queryset"""
@@ -113,7 +129,7 @@ class NotificationQuerySet(models.query.QuerySet):
         if recipient:
             qset = qset.filter(recipient=recipient)
 
-        return qset.update(deleted=True)
+        return update_notifications(qset, deleted=True)
 
     def mark_all_as_active(self, recipient=None):
         """Mark current queryset as active(un-deleted).
@@ -124,7 +140,7 @@ class NotificationQuerySet(models.query.QuerySet):
         if recipient:
             qset = qset.filter(recipient=recipient)
 
-        return qset.update(deleted=False)
+        return update_notifications(qset, deleted=False)
 
     def mark_as_unsent(self, recipient=None):
         qset = self.sent()
@@ -270,65 +286,144 @@ class AbstractNotification(models.Model):
             self.save()
 
 
-def notify_handler(verb, **kwargs):
+# Notifications inserted per query
+NOTIFY_CHUNK_SIZE = 500
+
+_deferred = threading.local()
+
+
+def get_recipients(recipient):
     """
-    Handler function to create Notification instance upon action signal call.
+    Users to notify of a user, a group, a list or a queryset of users
+    """
+    if isinstance(recipient, Group):
+        return recipient.user_set.all()
+    if isinstance(recipient, QuerySet):
+        return recipient.iterator(chunk_size=NOTIFY_CHUNK_SIZE)
+    if isinstance(recipient, (list, tuple, set)):
+        return recipient
+    return [recipient]
+
+
+def build_notifications(verb, actor, recipients, **kwargs):
+    """
+    Yields the unsaved notifications of the recipients, the content types and
+    the localized verbs are resolved once for all of them
     """
-    # Pull the options out of kwargs
     kwargs.pop("signal", None)
-    recipient = kwargs.pop("recipient")
-    actor = kwargs.pop("sender")
     optional_objs = [
         (kwargs.pop(opt, None), opt) for opt in ("target", "action_object")
     ]
-    public = bool(kwargs.pop("public", True))
-    description = kwargs.pop("description", None)
-    timestamp = kwargs.pop("timestamp", timezone.now())
     Notification = load_model("notifications", "Notification")
-    level = kwargs.pop("level", Notification.LEVELS.info)
+    values = {
+        "actor_content_type": ContentType.objects.get_for_model(actor),
+        "actor_object_id": actor.pk,
+        "verb": str(verb),
+        "public": bool(kwargs.pop("public", True)),
+        "description": kwargs.pop("description", None),
+        "timestamp": kwargs.pop("timestamp", timezone.now()),
+        "level": kwargs.pop("level", Notification.LEVELS.info),
+    }
+    # Set optional objects
+    for obj, opt in optional_objs:
+        if obj is not None:
+            values["%s_object_id" % opt] = obj.pk
+            values["%s_content_type" % opt] = ContentType.objects.get_for_model(obj)
+    if kwargs and EXTRA_DATA:
+        values["data"] = kwargs
+        for language in ("ar", "de", "es", "fr"):
+            values[f"verb_{language}"] = kwargs.get(f"verb_{language}", None)
 
-    # Check if User or Group
-    if isinstance(recipient, Group):
-        recipients = recipient.user_set.all()
-    elif isinstance(recipient, (QuerySet, list)):
-        recipients = recipient
-    else:
-        recipients = [recipient]
+    for recipient in recipients:
+        if recipient is not None:
+            yield Notification(recipient=recipient, **values)
 
-    new_notifications = []
 
-    for recipient in recipients:
-        newnotify = Notification(
-            recipient=recipient,
-            actor_content_type=ContentType.objects.get_for_model(actor),
-            actor_object_id=actor.pk,
-            verb=str(verb),
-            public=public,
-            description=description,
-            timestamp=timestamp,
-            level=level,
-        )
-
-        # Set optional objects
-        for obj, opt in optional_objs:
-            if obj is not None:
-                setattr(newnotify, "%s_object_id" % opt, obj.pk)
-                setattr(
-                    newnotify,
-                    "%s_content_type" % opt,
-                    ContentType.objects.get_for_model(obj),
-                )
+def save_notifications(notifications):
+    """
+    Inserts the notifications NOTIFY_CHUNK_SIZE at a time, returns them
+    """
+    Notification = load_model("notifications", "Notification")
+    saved = []
+    chunk = []
+    for notification in notifications:
+        chunk.append(notification)
+        if len(chunk) == NOTIFY_CHUNK_SIZE:
+            saved.extend(Notification.objects.bulk_create(chunk))
+            chunk = []
+    if chunk:
+        saved.extend(Notification.objects.bulk_create(chunk))
+    touch_unread(notification.recipient_id for notification in saved)
+    return saved
+
+
+class deferred_notifications:
+    """
+    Context manager collecting the notifications sent with ``defer=True``
+    in the current thread and inserting them together when it exits, used by
+    DeferredNotificationMiddleware for the requests. They are discarded when
+    the block raised, and a failing insert is logged without raising.
+    """
+
+    def __enter__(self):
+        self.outer = getattr(_deferred, "notifications", None)
+        _deferred.notifications = []
+        return self
+
+    def __exit__(self, *exc_info):
+        notifications = _deferred.notifications
+        _deferred.notifications = self.outer
+        if exc_info[0] is not None:
+            return
+        try:
+            save_notifications(notifications)
+        except Exception as error:
+            logger.error(f"Inserting the deferred notifications failed: {error}")
+
+    def discard(self):
+        """
+        Drops the notifications collected so far
+        """
+        _deferred.notifications = []
+
+
+def notify_bulk(sender, recipient, verb, defer=False, **kwargs):
+    """
+    Notifies every user of ``recipient`` (a user, a group, a list or a
+    queryset of users) with bulk inserts, returns the number of notifications.
+
+    With ``defer`` the notifications are inserted with the other deferred
+    notifications of the request once its response is ready, they are
+    inserted right away outside of a request.
+    """
+    notifications = build_notifications(
+        verb, sender, get_recipients(recipient), **kwargs
+    )
+    buffer = getattr(_deferred, "notifications", None)
+    if defer and buffer is not None:
+        count = len(buffer)
+        buffer.extend(notifications)
+        return len(buffer) - count
+    return len(save_notifications(notifications))
 
-        if kwargs and EXTRA_DATA:
-            newnotify.data = kwargs
-            newnotify.verb_ar = newnotify.data.get("verb_ar", None)
-            newnotify.verb_de = newnotify.data.get("verb_de", None)
-            newnotify.verb_es = newnotify.data.get("verb_es", None)
-            newnotify.verb_fr = newnotify.data.get("verb_fr", None)
-        newnotify.save()
-        new_notifications.append(newnotify)
 
-    return new_notifications
+def notify_handler(verb, **kwargs):
+    """
+    Handler function to create Notification instance upon action signal call.
+    """
+    # Pull the options out of kwargs
+    kwargs.pop("signal", None)
+    recipient = kwargs.pop("recipient")
+    actor = kwargs.pop("sender")
+    defer = kwargs.pop("defer", False)
+    notifications = list(
+        build_notifications(verb, actor, get_recipients(recipient), **kwargs)
+    )
+    buffer = getattr(_deferred, "notifications", None)
+    if defer and buffer is not None:
+        buffer.extend(notifications)
+        return notifications
+    return save_notifications(notifications)
 
 
 # connect the signal
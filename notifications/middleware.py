@@ -0,0 +1,19 @@
+from notifications.base.models import deferred_notifications
+
+
+class DeferredNotificationMiddleware:
+    """
+    Inserts the notifications sent with ``defer=True`` during the request
+    together once the response is ready, they are dropped when the request
+    failed with a server error
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with deferred_notifications() as deferred:
+            response = self.get_response(request)
+            if response.status_code >= 500:
+                deferred.discard()
+        return response
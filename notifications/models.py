@@ -1,7 +1,13 @@
 from django.db import models
 from swapper import swappable_setting
 
-from .base.models import AbstractNotification, notify_handler  # noqa
+from .base.models import (  # noqa
+    AbstractNotification,
+    build_notifications,
+    notify_bulk,
+    notify_handler,
+    save_notifications,
+)
 
 
 class Notification(AbstractNotification):
@@ -6,6 +6,7 @@ var notify_unread_url;
 var notify_mark_all_unread_url;
 var notify_refresh_period = 15000;
 var consecutive_misfires = 0;
+var notify_etag = null;
 var registered_functions = [];
 
 function fill_notification_badge(data) {
@@ -48,23 +49,30 @@ function register_notifier(func) {
 }
 
 function fetch_api_data() {
-    if (registered_functions.length > 0) {
-        //only fetch data if a function is setup
+    if (registered_functions.length > 0 && !document.hidden) {
+        //only fetch data if a function is setup and the tab is visible
         var r = new XMLHttpRequest();
         r.addEventListener('readystatechange', function(event){
             if (this.readyState === 4){
                 if (this.status === 200){
                     consecutive_misfires = 0;
+                    notify_etag = r.getResponseHeader('ETag');
                     var data = JSON.parse(r.responseText);
                     for(var i = 0; i < registered_functions.length; i++) {
                        registered_functions[i](data);
                     }
+                }else if (this.status === 304){
+                    //nothing changed since the last fetch
+                    consecutive_misfires = 0;
                 }else{
                     consecutive_misfires++;
                 }
             }
         })
         r.open("GET", notify_api_url+'?max='+notify_fetch_count, true);
+        if (notify_etag) {
+            r.setRequestHeader('If-None-Match', notify_etag);
+        }
         r.send();
     }
     if (consecutive_misfires < 10) {
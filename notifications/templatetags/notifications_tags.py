@@ -16,6 +16,8 @@ except ImportError:
         reverse,
     )
 
+from notifications.unread import unread_count
+
 register = Library()
 
 
@@ -23,7 +25,7 @@ def notifications_unread(context):
     user = user_context(context)
     if not user:
         return ""
-    return user.notifications.unread().count()
+    return unread_count(user)
 
 
 if StrictVersion(get_version()) >= StrictVersion("2.0"):
@@ -39,7 +41,7 @@ else:
 @register.filter
 def has_notification(user):
     if user:
-        return user.notifications.unread().exists()
+        return unread_count(user) > 0
     return False
 
 
@@ -93,7 +95,7 @@ def live_notify_badge(context, badge_class="live_notify_badge"):
         return ""
 
     html = "<span class='{badge_class}'>{unread}</span>".format(
-        badge_class=badge_class, unread=user.notifications.unread().count()
+        badge_class=badge_class, unread=unread_count(user)
     )
     return format_html(html)
 
@@ -0,0 +1,105 @@
+"""Django notifications unread counter file
+
+The unread count and the latest unread notifications of each user are kept in
+Django's cache under a per-user version. Creating, reading, deleting or
+restoring notifications bumps the version of their recipients, the live
+endpoints send the version as ETag and answer 304 without touching the
+database while it doesn't change.
+"""
+
+# -*- coding: utf-8 -*-
+
+from django.core.cache import cache
+from django.forms import model_to_dict
+
+from horilla.horilla_cache import bump_version, cache_version
+from notifications.utils import id2slug
+
+# Seconds the unread data of a user is kept in the cache
+UNREAD_CACHE_TIMEOUT = 60 * 60
+
+
+def version_key(user_id):
+    return f"notifications_unread_version_{user_id}"
+
+
+def unread_version(user_id):
+    """
+    Version of the unread notifications of the user, None when the cache
+    isn't reachable
+    """
+    return cache_version(version_key(user_id), UNREAD_CACHE_TIMEOUT)
+
+
+def touch_unread(user_ids):
+    """
+    Makes the cached unread data of the users stale
+    """
+    keys = [version_key(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        bump_version(*keys, timeout=UNREAD_CACHE_TIMEOUT)
+
+
+def touch_notification(sender, instance, **kwargs):
+    """
+    Signal receiver making the unread data of the recipient stale
+    """
+    touch_unread([instance.recipient_id])
+
+
+def notification_struct(notification):
+    """
+    Json data of the notification
+    """
+    struct = model_to_dict(notification)
+    struct["slug"] = id2slug(notification.id)
+    if notification.actor:
+        struct["actor"] = str(notification.actor)
+    if notification.target:
+        struct["target"] = str(notification.target)
+    if notification.action_object:
+        struct["action_object"] = str(notification.action_object)
+    if notification.data:
+        struct["data"] = notification.data
+    return struct
+
+
+def unread_data(user, num_to_fetch=0, version=None):
+    """
+    Unread count and the ``num_to_fetch`` latest unread notifications of the
+    user, read from the cache entry of the version when given
+    """
+
+    def compute():
+        unread = user.notifications.unread()
+        data = {"unread_count": unread.count()}
+        if num_to_fetch:
+            data["unread_list"] = [
+                notification_struct(notification)
+                for notification in unread[0:num_to_fetch]
+            ]
+        return data
+
+    if version is None:
+        version = unread_version(user.pk)
+        if version is None:
+            return compute()
+    key = f"notifications_unread_{user.pk}_{version}_{num_to_fetch}"
+    try:
+        data = cache.get(key)
+    except Exception:
+        data = None
+    if data is None:
+        data = compute()
+        try:
+            cache.set(key, data, UNREAD_CACHE_TIMEOUT)
+        except Exception:
+            pass
+    return data
+
+
+def unread_count(user):
+    """
+    Number of unread notifications of the user
+    """
+    return unread_data(user)["unread_count"]
@@ -6,7 +6,7 @@ from distutils.version import (  # pylint: disable=no-name-in-module,import-erro
 
 from django import get_version
 from django.contrib.auth.decorators import login_required
-from django.forms import model_to_dict
+from django.http import HttpResponseNotModified
 from django.shortcuts import get_object_or_404, redirect
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import never_cache
@@ -15,7 +15,8 @@ from swapper import load_model
 
 from notifications import settings
 from notifications.settings import get_config
-from notifications.utils import id2slug, slug2id
+from notifications.unread import notification_struct, unread_data, unread_version
+from notifications.utils import slug2id
 
 Notification = load_model("notifications", "Notification")
 
@@ -132,6 +133,23 @@ def delete(request, slug=None):
     return redirect("notifications:all")
 
 
+def unread_response(request, num_to_fetch=0):
+    """
+    Unread data of the user with the version of the data as ETag, 304 when
+    the browser already has that version
+    """
+    version = unread_version(request.user.pk)
+    if version is None:
+        return JsonResponse(unread_data(request.user, num_to_fetch))
+    etag = f'"{request.user.pk}-{version}-{num_to_fetch}"'
+    if request.META.get("HTTP_IF_NONE_MATCH") == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(unread_data(request.user, num_to_fetch, version))
+    response["ETag"] = etag
+    return response
+
+
 @never_cache
 def live_unread_notification_count(request):
     try:
@@ -141,11 +159,8 @@ def live_unread_notification_count(request):
 
     if not user_is_authenticated:
         data = {"unread_count": 0}
-    else:
-        data = {
-            "unread_count": request.user.notifications.unread().count(),
-        }
-    return JsonResponse(data)
+        return JsonResponse(data)
+    return unread_response(request)
 
 
 @never_cache
@@ -170,22 +185,14 @@ def live_unread_notification_list(request):
     except ValueError:  # If casting to an int fails.
         num_to_fetch = default_num_to_fetch
 
+    if not request.GET.get("mark_as_read"):
+        return unread_response(request, num_to_fetch)
+
     unread_list = []
 
     for notification in request.user.notifications.unread()[0:num_to_fetch]:
-        struct = model_to_dict(notification)
-        struct["slug"] = id2slug(notification.id)
-        if notification.actor:
-            struct["actor"] = str(notification.actor)
-        if notification.target:
-            struct["target"] = str(notification.target)
-        if notification.action_object:
-            struct["action_object"] = str(notification.action_object)
-        if notification.data:
-            struct["data"] = notification.data
-        unread_list.append(struct)
-        if request.GET.get("mark_as_read"):
-            notification.mark_as_read()
+        unread_list.append(notification_struct(notification))
+        notification.mark_as_read()
     data = {
         "unread_count": request.user.notifications.unread().count(),
         "unread_list": unread_list,
@@ -218,17 +225,7 @@ def live_all_notification_list(request):
     all_list = []
 
     for notification in request.user.notifications.all()[0:num_to_fetch]:
-        struct = model_to_dict(notification)
-        struct["slug"] = id2slug(notification.id)
-        if notification.actor:
-            struct["actor"] = str(notification.actor)
-        if notification.target:
-            struct["target"] = str(notification.target)
-        if notification.action_object:
-            struct["action_object"] = str(notification.action_object)
-        if notification.data:
-            struct["data"] = notification.data
-        all_list.append(struct)
+        all_list.append(notification_struct(notification))
         if request.GET.get("mark_as_read"):
             notification.mark_as_read()
     data = {"all_count": request.user.notifications.count(), "all_list": all_list}
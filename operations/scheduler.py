@@ -6,8 +6,7 @@ This module is used to register scheduled tasks
 
 from datetime import date, timedelta
 
-from apscheduler.schedulers.background import BackgroundScheduler
-
+from horilla.horilla_scheduler import scheduler
 from notifications.signals import notify
 
 
@@ -77,7 +76,5 @@ def notify_expiring_documents():
     return
 
 
-scheduler = BackgroundScheduler()
 scheduler.add_job(notify_expiring_assets, "interval", hours=4)
 scheduler.add_job(notify_expiring_documents, "interval", hours=4)
-scheduler.start()
@@ -5,75 +5,38 @@ Payroll related module to write custom calculation methods
 """
 
 import calendar
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 
 from dateutil.relativedelta import relativedelta
 from django.core.paginator import Paginator
-from django.db.models import F, Q
+from django.db.models import F
 
 from attendance.models import Attendance
 from base.methods import get_pagination
-from leave.models import CompanyLeave, Holiday
+from leave.holiday_calendar import (
+    company_leave_dates,
+    get_range_calendar,
+    non_working_days,
+    request_company,
+)
 from payroll.models.models import Contract, Deduction, Payslip
 
 
-def get_holiday_dates(range_start: date, range_end: date) -> list:
+def get_holiday_dates(range_start: date, range_end: date, company=None) -> list:
     """
     :return: this functions returns a list of all holiday dates.
     """
-    pay_range_dates = get_date_range(start_date=range_start, end_date=range_end)
-    query = Q()
-    for check_date in pay_range_dates:
-        query |= Q(start_date__lte=check_date, end_date__gte=check_date)
-    holidays = Holiday.objects.filter(query)
-    holiday_dates = set([])
-    for holiday in holidays:
-        holiday_dates = holiday_dates | (
-            set(
-                get_date_range(start_date=holiday.start_date, end_date=holiday.end_date)
-            )
-        )
-    return list(set(holiday_dates))
+    holiday_dates, _ = non_working_days(
+        range_start, range_end, company or request_company()
+    )
+    return list(holiday_dates)
 
 
-def get_company_leave_dates(year):
+def get_company_leave_dates(year, company=None):
     """
     :return: This function returns a list of all company leave dates
     """
-    company_leaves = CompanyLeave.objects.all()
-    company_leave_dates = []
-    for company_leave in company_leaves:
-        based_on_week = company_leave.based_on_week
-        based_on_week_day = company_leave.based_on_week_day
-        for month in range(1, 13):
-            if based_on_week is not None:
-                # Set Sunday as the first day of the week
-                calendar.setfirstweekday(6)
-                month_calendar = calendar.monthcalendar(year, month)
-                weeks = month_calendar[int(based_on_week)]
-                weekdays_in_weeks = [day for day in weeks if day != 0]
-                for day in weekdays_in_weeks:
-                    leave_date = datetime.strptime(
-                        f"{year}-{month:02}-{day:02}", "%Y-%m-%d"
-                    ).date()
-                    if (
-                        leave_date.weekday() == int(based_on_week_day)
-                        and leave_date not in company_leave_dates
-                    ):
-                        company_leave_dates.append(leave_date)
-            else:
-                # Set Monday as the first day of the week
-                calendar.setfirstweekday(0)
-                month_calendar = calendar.monthcalendar(year, month)
-                for week in month_calendar:
-                    if week[int(based_on_week_day)] != 0:
-                        leave_date = datetime.strptime(
-                            f"{year}-{month:02}-{week[int(based_on_week_day)]:02}",
-                            "%Y-%m-%d",
-                        ).date()
-                        if leave_date not in company_leave_dates:
-                            company_leave_dates.append(leave_date)
-    return company_leave_dates
+    return list(company_leave_dates(year, company or request_company()))
 
 
 def get_date_range(start_date, end_date):
@@ -125,49 +88,27 @@ def get_total_days(start_date, end_date):
     return total_days
 
 
-def get_working_days(start_date, end_date):
+def get_working_days(start_date, end_date, company=None):
     """
     This method is used to calculate the total working days, total leave, worked days on that period
 
     Args:
         start_date (_type_): the start date from the data needed
         end_date (_type_): the end date till the date needed
+        company (_type_): the company of the holidays, defaults to the selected company
     """
 
-    holiday_dates = get_holiday_dates(start_date, end_date)
-
-    # appending company/holiday leaves
-    # Note: Duplicate entry may exist
-    company_leave_dates = (
-        list(
-            set(
-                get_company_leave_dates(start_date.year)
-                + get_company_leave_dates(end_date.year)
-            )
-        )
-        + holiday_dates
+    range_calendar = get_range_calendar(
+        start_date, end_date, company or request_company()
     )
 
-    date_range = get_date_range(start_date, end_date)
-
-    # making unique list of company/holiday leave dates then filtering
-    # the leave dates only between the start and end date
-    company_leave_dates = [
-        date
-        for date in list(set(company_leave_dates))
-        if start_date <= date <= end_date
-    ]
-
-    working_days_between_ranges = list(set(date_range) - set(company_leave_dates))
-    total_working_days = len(working_days_between_ranges)
-
     return {
         # Total working days on that period
-        "total_working_days": total_working_days,
+        "total_working_days": range_calendar.total_working_days,
         # All the working dates between the start and end date
-        "working_days_on": working_days_between_ranges,
+        "working_days_on": list(range_calendar.working_days),
         # All the company/holiday leave dates between the range
-        "company_leave_dates": company_leave_dates,
+        "company_leave_dates": list(range_calendar.non_working_days),
     }
 
 
@@ -249,24 +190,20 @@ def get_attendance(employee, start_date, end_date):
         attendance_validated=True,
     )
     present_on = [attendance.attendance_date for attendance in attendances_on_period]
-    working_days_between_range = get_working_days(start_date, end_date)[
+    company = request_company()
+    working_days_between_range = get_working_days(start_date, end_date, company)[
         "working_days_on"
     ]
     leave_dates = get_leaves(employee, start_date, end_date)["leave_dates"]
     conflict_dates = list(
         set(working_days_between_range) - set(attendances_on_period) - set(leave_dates)
     )
+    # the attendances are within the range, so are their holidays/company leaves
+    non_working_dates = get_range_calendar(
+        start_date, end_date, company
+    ).non_working_days
     conflict_dates = conflict_dates + [
-        date
-        for date in present_on
-        if date in get_holiday_dates(start_date, end_date)
-        or date
-        in list(
-            set(
-                get_company_leave_dates(start_date.year)
-                + get_company_leave_dates(end_date.year)
-            )
-        )
+        date for date in present_on if date in non_working_dates
     ]
 
     return {
@@ -394,14 +331,14 @@ def daily_computation(employee, wage, start_date, end_date):
     }
 
 
-def get_daily_salary(wage, wage_date) -> dict:
+def get_daily_salary(wage, wage_date, company=None) -> dict:
     """
     This method is used to calculate daily salary for the date
     """
     last_day = calendar.monthrange(wage_date.year, wage_date.month)[1]
     end_date = date(wage_date.year, wage_date.month, last_day)
     start_date = date(wage_date.year, wage_date.month, 1)
-    working_days = get_working_days(start_date, end_date)["total_working_days"]
+    working_days = get_working_days(start_date, end_date, company)["total_working_days"]
     day_wage = wage / working_days  # if working_days != 0 else 0
 
     return {
@@ -409,7 +346,7 @@ def get_daily_salary(wage, wage_date) -> dict:
     }
 
 
-def months_between_range(wage, start_date, end_date):
+def months_between_range(wage, start_date, end_date, company=None):
     """
     This method is used to find the months between range
     """
@@ -435,7 +372,9 @@ def months_between_range(wage, start_date, end_date):
         current_end_date = current_date + relativedelta(day=days_in_month)
         current_end_date = min(current_end_date, end_date)
         working_days_on_month = get_working_days(
-            current_date.replace(day=1), current_date.replace(day=days_in_month)
+            current_date.replace(day=1),
+            current_date.replace(day=days_in_month),
+            company,
         )["total_working_days"]
 
         month_start_date = (
@@ -444,7 +383,7 @@ def months_between_range(wage, start_date, end_date):
             else start_date
         )
         total_working_days_on_period = get_working_days(
-            month_start_date, current_end_date
+            month_start_date, current_end_date, company
         )["total_working_days"]
 
         month_info = {
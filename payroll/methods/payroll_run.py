@@ -0,0 +1,819 @@
+"""
+payroll_run.py
+
+This module computes the payslips of a list of employees for one pay period.
+
+Reading the allowances, deductions, contract, leaves and attendances of one
+employee at a time costs a few dozen queries per payslip. A ``PayrollRun``
+loads all of them once for the whole run (the component catalog with the
+conditions and employees of every allowance and deduction, then the contracts,
+approved leaves, attendance aggregates and tax brackets of the employees) and
+computes every payslip in memory. ``payroll_calculation`` is a run of a single
+employee, so single and bulk payslips follow the same rules.
+"""
+
+import json
+from collections import defaultdict
+from datetime import date
+
+from django.db.models import (
+    Count,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    prefetch_related_objects,
+)
+
+from attendance.models import Attendance
+from employee.models import Employee
+from horilla.horilla_conditions import compile_conditions, model_field
+from leave.holiday_calendar import request_company
+from leave.models import LeaveRequest
+from payroll.methods.limits import compute_limit
+from payroll.methods.methods import (
+    get_daily_salary,
+    get_working_days,
+    months_between_range,
+)
+from payroll.methods.payslip_calc import (
+    calculate_based_on_basic_pay,
+    calculate_based_on_gross_pay,
+    calculate_net_pay_deduction,
+    if_condition_on,
+)
+from payroll.models.models import (
+    Allowance,
+    Contract,
+    Deduction,
+    allowance_conditions,
+    deduction_conditions,
+)
+from payroll.models.tax_models import TaxBracket
+
+
+def field_value(employee, attribute_path, contract):
+    """
+    Value of a pay-head condition field of the employee, like ``dynamic_attr``
+    the ``contract_set`` fields are read on the first active contract
+    """
+    value = employee
+    for attribute in attribute_path.split("__"):
+        if attribute == "contract_set" and value is employee:
+            value = contract
+        else:
+            value = getattr(value, attribute, None)
+        if value is None:
+            break
+    return value
+
+
+def contract_alias(field):
+    """
+    Annotation reading a ``contract_set`` condition field on the first active
+    contract of the employee, None when the field isn't a contract column
+    """
+    contract_field = field.split("__", 1)[1]
+    column = model_field(Contract, contract_field)
+    if column is None:
+        return None
+    return Subquery(
+        Contract._base_manager.filter(employee_id=OuterRef("pk"), is_active=True)
+        .order_by("pk")
+        .values(contract_field)[:1],
+        output_field=column,
+    )
+
+
+class ComponentCatalog:
+    """
+    Allowances and deductions of a pay period, with the ids of their specific
+    and excluded employees and their conditions
+    """
+
+    def __init__(self, start_date, end_date):
+        self.allowances = self.load(
+            Allowance, allowance_conditions, start_date, end_date
+        )
+        deductions = self.load(Deduction, deduction_conditions, start_date, end_date)
+        self.compensation_deductions = defaultdict(list)
+        self.pretax_deductions = []
+        self.post_tax_deductions = []
+        self.tax_deductions = []
+        for deduction in deductions:
+            if deduction.update_compensation is not None:
+                self.compensation_deductions[deduction.update_compensation].append(
+                    deduction
+                )
+            elif deduction.is_pretax and not deduction.is_tax:
+                self.pretax_deductions.append(deduction)
+            elif not deduction.is_pretax and deduction.is_tax:
+                self.tax_deductions.append(deduction)
+            elif not deduction.is_pretax and not deduction.is_tax:
+                self.post_tax_deductions.append(deduction)
+        self.deductions = {deduction.pk: deduction for deduction in deductions}
+
+    @staticmethod
+    def load(model, compiled_conditions, start_date, end_date):
+        components = list(
+            model.objects.exclude(one_time_date__lt=start_date)
+            .exclude(one_time_date__gt=end_date)
+            .order_by("pk")
+        )
+        by_id = {component.pk: component for component in components}
+        for component in components:
+            component.specific_ids = set()
+            component.excluded_ids = set()
+            component.conditions = component.main_condition = None
+            if component.is_condition_based:
+                # memoised per pay-head until a pay-head or condition changes
+                component.conditions = compiled_conditions.get(component)
+                component.main_condition = compile_conditions(
+                    (
+                        (
+                            component.field,
+                            component.condition,
+                            component.value.lower().replace(" ", "_"),
+                        ),
+                    )
+                )
+        component_field = f"{model._meta.model_name}_id"
+        for relation, attribute in (
+            (model.specific_employees, "specific_ids"),
+            (model.exclude_employees, "excluded_ids"),
+        ):
+            rows = relation.through.objects.filter(
+                **{f"{component_field}__in": list(by_id)}
+            ).values_list(component_field, "employee_id")
+            for component_id, employee_id in rows:
+                getattr(by_id[component_id], attribute).add(employee_id)
+        return components
+
+    @staticmethod
+    def in_period(component, start_date, end_date):
+        one_time_date = component.one_time_date
+        return one_time_date is None or start_date <= one_time_date <= end_date
+
+    def employee_components(
+        self, components, employee_id, start_date, end_date, condition_based=True
+    ):
+        """
+        Components given to the employee, by specific employee, by condition
+        or to every active employee
+        """
+        return [
+            component
+            for component in components
+            if self.in_period(component, start_date, end_date)
+            and (
+                employee_id in component.specific_ids
+                or (
+                    (
+                        (condition_based and component.is_condition_based)
+                        or component.include_active_employees
+                    )
+                    and employee_id not in component.excluded_ids
+                )
+            )
+        ]
+
+    def compensation_components(
+        self, compensation_type, employee_id, start_date, end_date
+    ):
+        return [
+            deduction
+            for deduction in self.compensation_deductions[compensation_type]
+            if employee_id in deduction.specific_ids
+            and self.in_period(deduction, start_date, end_date)
+        ]
+
+
+class PayrollRun:
+    """
+    Payslips of a list of employees for the period from ``start_date`` to
+    ``end_date``, employees whose contract started within the period are paid
+    from their contract start date.
+
+    ``calculate`` returns the payslip data of an employee, the installments
+    being a list of deductions.
+    """
+
+    def __init__(self, employees, start_date, end_date, company=None):
+        self.employees = list(employees)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.company = company if company is not None else request_company()
+        self.contracts = defaultdict(list)
+        self.periods = {}
+        self.leaves = defaultdict(list)
+        self.attendances = defaultdict(list)
+        self.tax_brackets = defaultdict(list)
+        self.catalog = None
+        self.matching_employees = {}
+        self._working_days = {}
+
+    def load(self):
+        """
+        Read everything the payslips of the run need
+        """
+        prefetch_related_objects(self.employees, "employee_work_info")
+        employee_ids = [employee.pk for employee in self.employees]
+        contracts = (
+            Contract.objects.filter(employee_id__in=employee_ids)
+            .select_related("filing_status", "department")
+            .order_by("pk")
+        )
+        for contract in contracts:
+            self.contracts[contract.employee_id_id].append(contract)
+
+        employees_by_start = defaultdict(list)
+        for employee in self.employees:
+            contract = self.contract(employee)
+            if contract is None:
+                continue
+            start_date = max(self.start_date, contract.contract_start_date)
+            self.periods[employee.pk] = (start_date, self.end_date)
+            employees_by_start[start_date].append(employee.pk)
+        if not self.periods:
+            return self
+        first_start = min(employees_by_start)
+
+        self.catalog = ComponentCatalog(first_start, self.end_date)
+        self.match_conditions()
+
+        leaves = (
+            LeaveRequest.objects.filter(
+                employee_id__in=list(self.periods),
+                status="approved",
+                start_date__lte=self.end_date,
+            )
+            .filter(Q(end_date__gte=first_start) | Q(end_date__isnull=True))
+            .select_related("leave_type_id")
+        )
+        for leave in leaves:
+            self.leaves[leave.employee_id_id].append(leave)
+
+        for start_date, employee_ids in employees_by_start.items():
+            attendances = (
+                Attendance.objects.filter(
+                    employee_id__in=employee_ids,
+                    attendance_date__range=(start_date, self.end_date),
+                )
+                .order_by()
+                .values(
+                    "employee_id",
+                    "shift_id",
+                    "work_type_id",
+                    "attendance_validated",
+                    "attendance_overtime_approve",
+                )
+                .annotate(
+                    count=Count("id"),
+                    at_work_second=Sum("at_work_second"),
+                    overtime_second=Sum("overtime_second"),
+                )
+            )
+            for row in attendances:
+                self.attendances[row["employee_id"]].append(row)
+            self.working_days(start_date, self.end_date)
+
+        filing_ids = {
+            contract.filing_status_id
+            for contracts in self.contracts.values()
+            for contract in contracts
+            if contract.filing_status_id
+        }
+        if filing_ids:
+            tax_brackets = TaxBracket.objects.filter(
+                filing_status_id__in=filing_ids
+            ).order_by("min_income")
+            for tax_bracket in tax_brackets:
+                self.tax_brackets[tax_bracket.filing_status_id_id].append(tax_bracket)
+        return self
+
+    def match_conditions(self):
+        """
+        Decide with one query per distinct set of conditions which employees
+        of the run satisfy the conditions that can be expressed as a filter
+        """
+        catalog = self.catalog
+        condition_sets = {
+            component.conditions
+            for component in catalog.allowances + catalog.pretax_deductions
+            if component.is_condition_based
+        } | {
+            deduction.main_condition
+            for deduction in catalog.post_tax_deductions
+            if deduction.is_condition_based
+        }
+        annotations = {}
+        aliases = {}
+        for condition_set in condition_sets:
+            for condition in condition_set.conditions:
+                field = condition.field
+                if field in aliases or not field.startswith("contract_set__"):
+                    continue
+                annotation = contract_alias(field)
+                if annotation is not None:
+                    name = f"condition_field_{len(annotations)}"
+                    annotations[name] = annotation
+                    aliases[field] = (name, annotation.output_field)
+        employees = Employee._base_manager.filter(pk__in=list(self.periods))
+        if annotations:
+            employees = employees.annotate(**annotations)
+        for condition_set in condition_sets:
+            condition_q = condition_set.q(Employee, aliases)
+            if condition_q is not None:
+                self.matching_employees[condition_set] = set(
+                    employees.filter(condition_q).values_list("pk", flat=True)
+                )
+
+    def conditions_match(self, employee, conditions):
+        """
+        Whether the employee satisfies the conditions
+        """
+        matching_employees = self.matching_employees.get(conditions)
+        if matching_employees is not None:
+            return employee.pk in matching_employees
+        contract = next(
+            (
+                contract
+                for contract in self.contracts[employee.pk]
+                if contract.is_active
+            ),
+            None,
+        )
+        return conditions.matches(lambda field: field_value(employee, field, contract))
+
+    def contract(self, employee):
+        """
+        Active contract of the employee
+        """
+        for contract in self.contracts[employee.pk]:
+            if contract.contract_status == "active":
+                return contract
+        return None
+
+    def working_days(self, start_date, end_date):
+        key = (start_date, end_date)
+        if key not in self._working_days:
+            self._working_days[key] = get_working_days(
+                start_date, end_date, self.company
+            )
+        return self._working_days[key]
+
+    def attendance_rows(self, employee, validated=True, **fields):
+        return [
+            row
+            for row in self.attendances[employee.pk]
+            if (not validated or row["attendance_validated"])
+            and all(row[field] == value for field, value in fields.items())
+        ]
+
+    def attendance_count(self, employee, **fields):
+        return sum(row["count"] for row in self.attendance_rows(employee, **fields))
+
+    def leave_data(self, employee, start_date, end_date):
+        """
+        Paid and unpaid leave days (holidays and company leaves excluded) and
+        the unpaid half days of the employee within the period
+        """
+        company_leave_dates = set(
+            self.working_days(start_date, end_date)["company_leave_dates"]
+        )
+        paid_leave_dates = set()
+        unpaid_leave_dates = set()
+        unpaid_half_days = 0
+        for leave in self.leaves[employee.pk]:
+            leave_dates = {
+                leave_date
+                for leave_date in leave.requested_dates()
+                if start_date <= leave_date <= end_date
+            }
+            payment = leave.leave_type_id.payment
+            if payment == "paid":
+                paid_leave_dates |= leave_dates
+            else:
+                unpaid_leave_dates |= leave_dates
+            if payment != "unpaid":
+                continue
+            if (
+                start_date <= leave.start_date <= end_date
+                and leave.start_date_breakdown != "full_day"
+            ):
+                unpaid_half_days += 1
+            if (
+                leave.end_date is not None
+                and start_date <= leave.end_date <= end_date
+                and leave.end_date_breakdown != "full_day"
+                and leave.start_date != leave.end_date
+            ):
+                unpaid_half_days += 1
+        return {
+            "paid_leaves": len(paid_leave_dates - company_leave_dates),
+            "unpaid_leaves": len(unpaid_leave_dates - company_leave_dates),
+            "unpaid_half_leaves": unpaid_half_days * 0.5,
+        }
+
+    def salary_on_period(self, employee, contract, start_date, end_date):
+        """
+        Basic pay and loss of pay of the period, see ``compute_salary_on_period``
+        """
+        wage = contract.wage
+        month_data = months_between_range(wage, start_date, end_date, self.company)
+        leave_data = self.leave_data(employee, start_date, end_date)
+        unpaid_leaves = leave_data["unpaid_leaves"] - leave_data["unpaid_half_leaves"]
+        loss_of_pay = 0
+        leave_contract = next(
+            (
+                active_contract
+                for active_contract in self.contracts[employee.pk]
+                if active_contract.is_active
+                and active_contract.contract_status == "active"
+            ),
+            contract,
+        )
+        if contract.wage_type == "hourly":
+            worked_second = sum(
+                (row["at_work_second"] or 0) - (row["overtime_second"] or 0)
+                for row in self.attendance_rows(employee)
+            )
+            wage_in_second = wage / 3600
+            basic_pay = float(f"{(wage_in_second * worked_second):.2f}")
+        else:
+            if contract.wage_type == "daily":
+                day_wage = wage
+                basic_pay = (
+                    wage * self.working_days(start_date, end_date)["total_working_days"]
+                )
+            else:
+                unpaid_leaves = abs(unpaid_leaves)
+                day_wage = get_daily_salary(wage, start_date, self.company)["day_wage"]
+                basic_pay = 0
+                for data in month_data:
+                    basic_pay = basic_pay + (
+                        data["working_days_on_period"] * data["per_day_amount"]
+                    )
+            if leave_contract.calculate_daily_leave_amount:
+                loss_of_pay = unpaid_leaves * day_wage
+            else:
+                loss_of_pay = (
+                    unpaid_leaves * leave_contract.deduction_for_one_leave_amount
+                )
+            if leave_contract.deduct_leave_from_basic_pay:
+                basic_pay = basic_pay - loss_of_pay
+        return {
+            "basic_pay": basic_pay,
+            "loss_of_pay": loss_of_pay,
+            "month_data": month_data,
+            "unpaid_days": unpaid_leaves,
+            "paid_days": month_data[0]["working_days_on_period"] - unpaid_leaves,
+        }
+
+    def compensation_deduction(
+        self, employee, compensation_amount, compensation_type, start_date, end_date
+    ):
+        """
+        See ``update_compensation_deduction``
+        """
+        deductions = []
+        for deduction in self.catalog.compensation_components(
+            compensation_type, employee.pk, start_date, end_date
+        ):
+            amount = deduction.amount if deduction.amount else 0
+            compensation_amount = compensation_amount - float(amount)
+            employer_contribution_amount = 0
+            if max(0, deduction.employer_rate):
+                employer_contribution_amount = (amount * deduction.employer_rate) / 100
+            deductions.append(
+                {
+                    "deduction_id": deduction.id,
+                    "title": deduction.title,
+                    "amount": amount,
+                    "employer_contribution_rate": deduction.employer_rate,
+                    "employer_contribution_amount": employer_contribution_amount,
+                }
+            )
+        return compensation_amount, deductions
+
+    def component_amount(self, component, employee, pay):
+        """
+        Amount of a pay-head before its if condition, ``pay`` holds the basic
+        pay, total allowance, taxable gross pay and working days of the payslip
+        """
+        if component.is_fixed:
+            return component.amount
+        based_on = component.based_on
+        day_dict = pay["day_dict"]
+        if based_on == "basic_pay":
+            return calculate_based_on_basic_pay(
+                component=component, basic_pay=pay["basic_pay"], day_dict=day_dict
+            )
+        if based_on == "gross_pay":
+            return calculate_based_on_gross_pay(
+                component=component,
+                basic_pay=pay["basic_pay"],
+                total_allowance=pay["total_allowance"],
+            )
+        if based_on == "taxable_gross_pay":
+            return pay["taxable_gross_pay"] * component.rate / 100
+        if based_on == "attendance":
+            amount = (
+                self.attendance_count(employee) * component.per_attendance_fixed_amount
+            )
+        elif based_on == "shift_id":
+            amount = (
+                self.attendance_count(employee, shift_id=component.shift_id_id)
+                * component.shift_per_attendance_amount
+            )
+        elif based_on == "work_type_id":
+            amount = (
+                self.attendance_count(employee, work_type_id=component.work_type_id_id)
+                * component.work_type_per_attendance_amount
+            )
+        elif based_on == "overtime":
+            overtime = sum(
+                row["overtime_second"] or 0
+                for row in self.attendance_rows(
+                    employee, validated=False, attendance_overtime_approve=True
+                )
+            )
+            amount = round(overtime * (component.amount_per_one_hr / (60 * 60)), 2)
+        else:
+            raise ValueError(f"Unknown pay-head basis {based_on}")
+        return compute_limit(component, amount, day_dict)
+
+    def applied_amounts(self, components, employee, pay):
+        return [
+            if_condition_on(
+                component=component,
+                amount=self.component_amount(component, employee, pay),
+                basic_pay=pay["basic_pay"],
+                total_allowance=pay["total_allowance"],
+            )
+            for component in components
+        ]
+
+    def allowances(self, employee, contract, start_date, end_date, pay):
+        """
+        See ``calculate_allowance``
+        """
+        allowances = []
+        for allowance in self.catalog.employee_components(
+            self.catalog.allowances, employee.pk, start_date, end_date
+        ):
+            if allowance.is_condition_based:
+                if not self.conditions_match(employee, allowance.conditions):
+                    continue
+            elif allowance.based_on == "attendance":
+                if not self.attendance_count(employee):
+                    continue
+            elif allowance.based_on == "shift_id":
+                if not self.attendance_count(employee, shift_id=allowance.shift_id_id):
+                    continue
+            elif allowance.based_on == "work_type_id":
+                if not self.attendance_count(
+                    employee, work_type_id=allowance.work_type_id_id
+                ):
+                    continue
+            elif allowance.based_on == "overtime":
+                if not self.attendance_count(
+                    employee, attendance_overtime_approve=True
+                ):
+                    continue
+            allowances.append(allowance)
+        allowances = [allowance for allowance in allowances if allowance.is_taxable] + [
+            allowance for allowance in allowances if not allowance.is_taxable
+        ]
+        return [
+            {
+                "allowance_id": allowance.id,
+                "title": allowance.title,
+                "is_taxable": allowance.is_taxable,
+                "amount": amount,
+            }
+            for allowance, amount in zip(
+                allowances, self.applied_amounts(allowances, employee, pay)
+            )
+        ]
+
+    def deductions(self, deductions, employee, pay, kind):
+        return [
+            {
+                "deduction_id": deduction.id,
+                "title": deduction.title,
+                kind: getattr(deduction, kind),
+                "amount": amount,
+                "employer_contribution_rate": deduction.employer_rate,
+            }
+            for deduction, amount in zip(
+                deductions, self.applied_amounts(deductions, employee, pay)
+            )
+        ]
+
+    def federal_tax(self, contract, start_date, end_date, pay):
+        """
+        See ``calculate_taxable_amount``
+        """
+        filing = contract.filing_status
+        if filing is None:
+            return 0
+        num_days = (end_date - start_date).days + 1
+        if filing.based_on == "taxable_gross_pay":
+            income = float(pay["taxable_gross_pay"])
+        elif filing.based_on == "gross_pay":
+            income = float(pay["total_allowance"] + pay["basic_pay"])
+        else:
+            income = float(pay["basic_pay"])
+        year = end_date.year
+        total_days = (date(year, 12, 31) - date(year, 1, 1)).days + 1
+        yearly_income = round(income / num_days * total_days, 2)
+        tax_brackets = self.tax_brackets[filing.pk]
+        if not tax_brackets:
+            return 0
+        federal_tax = 0
+        remaining_income = yearly_income
+        if tax_brackets[0].min_income <= yearly_income:
+            for tax_bracket in tax_brackets:
+                if remaining_income <= 0:
+                    break
+                taxable_amount = min(
+                    remaining_income, tax_bracket.max_income - tax_bracket.min_income
+                )
+                federal_tax += taxable_amount * tax_bracket.tax_rate / 100
+                remaining_income -= taxable_amount
+        return federal_tax / total_days * num_days
+
+    def calculate(self, employee):
+        """
+        Payslip data of the employee, None when the employee has no active
+        contract
+        """
+        contract = self.contract(employee)
+        if contract is None or employee.pk not in self.periods:
+            return None
+        start_date, end_date = self.periods[employee.pk]
+        catalog = self.catalog
+
+        salary = self.salary_on_period(employee, contract, start_date, end_date)
+        contract_wage = contract.wage
+        loss_of_pay = salary["loss_of_pay"]
+        basic_pay, basic_pay_deductions = self.compensation_deduction(
+            employee, salary["basic_pay"], "basic_pay", start_date, end_date
+        )
+        loss_of_pay_amount = (
+            float(loss_of_pay) if not contract.deduct_leave_from_basic_pay else 0
+        )
+        basic_pay = basic_pay - loss_of_pay_amount
+        pay = {
+            "basic_pay": basic_pay,
+            "total_allowance": None,
+            "day_dict": salary["month_data"],
+        }
+
+        allowances = self.allowances(employee, contract, start_date, end_date, pay)
+        total_allowance = sum(allowance["amount"] for allowance in allowances)
+        pay["total_allowance"] = total_allowance
+        gross_pay, gross_pay_deductions = self.compensation_deduction(
+            employee, total_allowance + basic_pay, "gross_pay", start_date, end_date
+        )
+
+        pretax_candidates = catalog.employee_components(
+            catalog.pretax_deductions, employee.pk, start_date, end_date
+        )
+        post_tax_candidates = catalog.employee_components(
+            catalog.post_tax_deductions, employee.pk, start_date, end_date
+        )
+        installments = [
+            deduction
+            for deduction in pretax_candidates + post_tax_candidates
+            if deduction.is_installment
+        ]
+        pretax_deductions = self.deductions(
+            [
+                deduction
+                for deduction in pretax_candidates
+                if not deduction.is_condition_based
+                or self.conditions_match(employee, deduction.conditions)
+            ],
+            employee,
+            pay,
+            "is_pretax",
+        )
+        non_taxable_allowance_total = sum(
+            allowance["amount"]
+            for allowance in allowances
+            if not allowance["is_taxable"]
+        )
+        pretax_deduction_total = sum(
+            deduction["amount"]
+            for deduction in pretax_deductions
+            if deduction["is_pretax"]
+        )
+        taxable_gross_pay = (
+            (total_allowance + basic_pay)
+            - non_taxable_allowance_total
+            - pretax_deduction_total
+        )
+        pay["taxable_gross_pay"] = taxable_gross_pay
+
+        post_tax = [
+            deduction
+            for deduction in post_tax_candidates
+            if not deduction.is_condition_based
+            # post tax deductions only check their main condition
+            or self.conditions_match(employee, deduction.main_condition)
+        ]
+        post_tax_deductions = self.deductions(
+            [
+                deduction
+                for deduction in post_tax
+                if deduction.is_fixed or deduction.based_on != "net_pay"
+            ],
+            employee,
+            pay,
+            "is_pretax",
+        )
+        net_pay_deduction = [
+            {"deduction": deduction}
+            for deduction in post_tax
+            if deduction.based_on == "net_pay"
+        ]
+        tax_deductions = self.deductions(
+            catalog.employee_components(
+                catalog.tax_deductions,
+                employee.pk,
+                start_date,
+                end_date,
+                condition_based=False,
+            ),
+            employee,
+            pay,
+            "is_tax",
+        )
+        federal_tax = self.federal_tax(contract, start_date, end_date, pay)
+
+        total_pretax_deduction = sum(item["amount"] for item in pretax_deductions)
+        total_post_tax_deduction = sum(item["amount"] for item in post_tax_deductions)
+        total_tax_deductions = sum(item["amount"] for item in tax_deductions)
+        total_deductions = (
+            total_pretax_deduction
+            + total_post_tax_deduction
+            + total_tax_deductions
+            + federal_tax
+            + loss_of_pay_amount
+        )
+        net_pay = (basic_pay + total_allowance) - total_deductions
+        net_pay, update_net_pay_deductions = self.compensation_deduction(
+            employee, net_pay, "net_pay", start_date, end_date
+        )
+        net_pay_deductions = calculate_net_pay_deduction(
+            net_pay, net_pay_deduction, **pay
+        )
+        net_pay_deduction_list = (
+            net_pay_deductions["net_pay_deductions"] + update_net_pay_deductions
+        )
+        net_pay = net_pay - net_pay_deductions["net_deduction"]
+
+        payslip_data = {
+            "employee": employee,
+            "contract_wage": contract_wage,
+            "basic_pay": basic_pay,
+            "gross_pay": gross_pay,
+            "taxable_gross_pay": taxable_gross_pay,
+            "net_pay": net_pay,
+            "allowances": allowances,
+            "paid_days": salary["paid_days"],
+            "unpaid_days": salary["unpaid_days"],
+            "basic_pay_deductions": basic_pay_deductions,
+            "gross_pay_deductions": gross_pay_deductions,
+            "pretax_deductions": pretax_deductions,
+            "post_tax_deductions": post_tax_deductions,
+            "tax_deductions": tax_deductions,
+            "net_deductions": net_pay_deduction_list,
+            "total_deductions": total_deductions,
+            "loss_of_pay": loss_of_pay,
+            "federal_tax": federal_tax,
+            "start_date": start_date,
+            "end_date": end_date,
+            "range": f"{start_date.strftime('%b %d %Y')} - {end_date.strftime('%b %d %Y')}",
+        }
+        data_to_json = payslip_data.copy()
+        data_to_json["employee"] = employee.id
+        data_to_json["start_date"] = start_date.strftime("%Y-%m-%d")
+        data_to_json["end_date"] = end_date.strftime("%Y-%m-%d")
+        payslip_data["json_data"] = json.dumps(data_to_json)
+        payslip_data["installments"] = installments
+        return payslip_data
+
+    def run(self):
+        """
+        Load the run and return the payslip data of every employee with an
+        active contract
+        """
+        self.load()
+        return [
+            self.calculate(employee)
+            for employee in self.employees
+            if employee.pk in self.periods
+        ]
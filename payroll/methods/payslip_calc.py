@@ -9,6 +9,7 @@ import contextlib
 import operator
 
 from attendance.models import Attendance
+from horilla.horilla_conditions import compile_conditions
 from payroll.methods.limits import compute_limit
 from payroll.models import models
 from payroll.models.models import (
@@ -17,6 +18,8 @@ from payroll.models.models import (
     Deduction,
     LoanAccount,
     MultipleCondition,
+    allowance_conditions,
+    deduction_conditions,
 )
 
 operator_mapping = {
@@ -284,29 +287,8 @@ def calculate_allowance(**kwargs):
     # Append allowances based on condition, or unconditionally to employee
     for allowance in allowances:
         if allowance.is_condition_based:
-            conditions = list(
-                allowance.other_conditions.values_list("field", "condition", "value")
-            )
-            condition_field = allowance.field
-            condition_operator = allowance.condition
-            condition_value = allowance.value.lower().replace(" ", "_")
-            conditions.append((condition_field, condition_operator, condition_value))
-            applicable = True
-            for condition in conditions:
-                val = dynamic_attr(employee, condition[0])
-                if val is not None:
-                    operator_func = operator_mapping.get(condition[1])
-                    condition_value = type(val)(condition[2])
-                    if operator_func(val, condition_value):
-                        applicable = applicable * True
-                        continue
-                    else:
-                        applicable = False
-                        break
-                else:
-                    applicable = False
-                    break
-            if applicable:
+            conditions = allowance_conditions.get(allowance)
+            if conditions.matches(lambda field: dynamic_attr(employee, field)):
                 employee_allowances.append(allowance)
         else:
             if allowance.based_on in filter_mapping:
@@ -505,30 +487,8 @@ def calculate_pre_tax_deduction(*_args, **kwargs):
 
     for deduction in deductions:
         if deduction.is_condition_based:
-            conditions = list(
-                deduction.other_conditions.values_list("field", "condition", "value")
-            )
-            condition_field = deduction.field
-            condition_operator = deduction.condition
-            condition_value = deduction.value.lower().replace(" ", "_")
-            conditions.append((condition_field, condition_operator, condition_value))
-            operator_func = operator_mapping.get(condition_operator)
-            applicable = True
-            for condition in conditions:
-                val = dynamic_attr(employee, condition[0])
-                if val is not None:
-                    operator_func = operator_mapping.get(condition[1])
-                    condition_value = type(val)(condition[2])
-                    if operator_func(val, condition_value):
-                        applicable = applicable * True
-                        continue
-                    else:
-                        applicable = False
-                        break
-                else:
-                    applicable = False
-                    break
-            if applicable:
+            conditions = deduction_conditions.get(deduction)
+            if conditions.matches(lambda field: dynamic_attr(employee, field)):
                 pre_tax_deductions.append(deduction)
         else:
             pre_tax_deductions.append(deduction)
@@ -613,15 +573,13 @@ def calculate_post_tax_deduction(*_args, **kwargs):
 
     for deduction in deductions:
         if deduction.is_condition_based:
-            condition_field = deduction.field
-            condition_operator = deduction.condition
+            # only the main condition of the post tax deductions is checked
             condition_value = deduction.value.lower().replace(" ", "_")
-            employee_value = dynamic_attr(employee, condition_field)
-            operator_func = operator_mapping.get(condition_operator)
-            if employee_value is not None:
-                condition_value = type(employee_value)(condition_value)
-                if operator_func(employee_value, condition_value):
-                    post_tax_deductions.append(deduction)
+            conditions = compile_conditions(
+                ((deduction.field, deduction.condition, condition_value),)
+            )
+            if conditions.matches(lambda field: dynamic_attr(employee, field)):
+                post_tax_deductions.append(deduction)
         else:
             post_tax_deductions.append(deduction)
     for deduction in post_tax_deductions:
@@ -651,7 +609,13 @@ def calculate_post_tax_deduction(*_args, **kwargs):
                 amount = if_condition_on(**kwargs)
                 post_tax_deductions_amt.append(amount)
 
-    for deduction, amount in zip(post_tax_deductions, post_tax_deductions_amt):
+    # the net pay deductions are computed once the net pay is known
+    calculated_deductions = [
+        deduction
+        for deduction in post_tax_deductions
+        if deduction.is_fixed or deduction.based_on != "net_pay"
+    ]
+    for deduction, amount in zip(calculated_deductions, post_tax_deductions_amt):
         serialized_deduction = {
             "deduction_id": deduction.id,
             "title": deduction.title,
@@ -10,7 +10,13 @@ from django import forms
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models.signals import post_save, pre_delete, pre_save
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
 from django.http import QueryDict
 from django.utils import timezone
@@ -29,7 +35,9 @@ from base.models import (
     WorkType,
 )
 from employee.models import BonusPoint, Employee, EmployeeWorkInformation
+from horilla.horilla_conditions import CompiledConditions
 from horilla.models import HorillaModel
+from horilla.signals import post_bulk_update
 from horilla_audit.models import HorillaAuditInfo, HorillaAuditLog
 from leave.models import LeaveRequest, LeaveType
 
@@ -1282,6 +1290,60 @@ class Deduction(HorillaModel):
             super().save()
 
 
+def pay_head_conditions(pay_head):
+    """
+    The (field, condition, value) conditions of a condition based allowance or
+    deduction, its other conditions first
+    """
+    conditions = list(
+        pay_head.other_conditions.values_list("field", "condition", "value")
+    )
+    conditions.append(
+        (
+            pay_head.field,
+            pay_head.condition,
+            pay_head.value.lower().replace(" ", "_"),
+        )
+    )
+    return conditions
+
+
+allowance_conditions = CompiledConditions("allowance", pay_head_conditions)
+deduction_conditions = CompiledConditions("deduction", pay_head_conditions)
+
+
+@receiver(post_save, sender=Allowance)
+@receiver(post_delete, sender=Allowance)
+@receiver(post_bulk_update, sender=Allowance)
+@receiver(m2m_changed, sender=Allowance.other_conditions.through)
+def allowance_conditions_post_change(sender, **kwargs):
+    """
+    Drop the compiled allowance conditions when an allowance changes
+    """
+    allowance_conditions.invalidate()
+
+
+@receiver(post_save, sender=Deduction)
+@receiver(post_delete, sender=Deduction)
+@receiver(post_bulk_update, sender=Deduction)
+@receiver(m2m_changed, sender=Deduction.other_conditions.through)
+def deduction_conditions_post_change(sender, **kwargs):
+    """
+    Drop the compiled deduction conditions when a deduction changes
+    """
+    deduction_conditions.invalidate()
+
+
+@receiver(post_save, sender=MultipleCondition)
+@receiver(post_delete, sender=MultipleCondition)
+def multiple_condition_post_change(sender, **kwargs):
+    """
+    Drop the compiled pay-head conditions when one of their conditions changes
+    """
+    allowance_conditions.invalidate()
+    deduction_conditions.invalidate()
+
+
 class Payslip(HorillaModel):
     """
     Payslip model
@@ -6,7 +6,7 @@ This module is used to register scheduled tasks
 
 from datetime import date
 
-from apscheduler.schedulers.background import BackgroundScheduler
+from horilla.horilla_scheduler import scheduler
 
 from .models.models import Contract
 
@@ -22,6 +22,4 @@ def expire_contract():
     return
 
 
-scheduler = BackgroundScheduler()
 scheduler.add_job(expire_contract, "interval", hours=4)
-scheduler.start()
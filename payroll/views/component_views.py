@@ -42,23 +42,12 @@ from payroll.filters import (
     ReimbursementFilter,
 )
 from payroll.forms import component_forms as forms
-from payroll.methods.deductions import update_compensation_deduction
 from payroll.methods.methods import (
     calculate_employer_contribution,
-    compute_salary_on_period,
     paginator_qry,
     save_payslip,
 )
-from payroll.methods.payslip_calc import (
-    calculate_allowance,
-    calculate_gross_pay,
-    calculate_net_pay_deduction,
-    calculate_post_tax_deduction,
-    calculate_pre_tax_deduction,
-    calculate_tax_deduction,
-    calculate_taxable_gross_pay,
-)
-from payroll.methods.tax_calc import calculate_taxable_amount
+from payroll.methods.payroll_run import PayrollRun
 from payroll.models.models import (
     Allowance,
     Deduction,
@@ -93,144 +82,11 @@ def payroll_calculation(employee, start_date, end_date):
 
 
     Returns:
-        dict: A dictionary containing the calculated payroll components:
+        dict: A dictionary containing the calculated payroll components, None
+        when the employee has no active contract
     """
-
-    basic_pay_details = compute_salary_on_period(employee, start_date, end_date)
-    contract = basic_pay_details["contract"]
-    contract_wage = basic_pay_details["contract_wage"]
-    basic_pay = basic_pay_details["basic_pay"]
-    loss_of_pay = basic_pay_details["loss_of_pay"]
-    paid_days = basic_pay_details["paid_days"]
-    unpaid_days = basic_pay_details["unpaid_days"]
-
-    working_days_details = basic_pay_details["month_data"]
-
-    updated_basic_pay_data = update_compensation_deduction(
-        employee, basic_pay, "basic_pay", start_date, end_date
-    )
-    basic_pay = updated_basic_pay_data["compensation_amount"]
-    basic_pay_deductions = updated_basic_pay_data["deductions"]
-
-    loss_of_pay_amount = (
-        float(loss_of_pay) if not contract.deduct_leave_from_basic_pay else 0
-    )
-
-    basic_pay = basic_pay - loss_of_pay_amount
-
-    kwargs = {
-        "employee": employee,
-        "start_date": start_date,
-        "end_date": end_date,
-        "basic_pay": basic_pay,
-        "day_dict": working_days_details,
-    }
-    # basic pay will be basic_pay = basic_pay - update_compensation_amount
-    allowances = calculate_allowance(**kwargs)
-
-    # finding the total allowance
-    total_allowance = sum(allowance["amount"] for allowance in allowances["allowances"])
-
-    kwargs["allowances"] = allowances
-    kwargs["total_allowance"] = total_allowance
-    gross_pay = calculate_gross_pay(**kwargs)["gross_pay"]
-    updated_gross_pay_data = update_compensation_deduction(
-        employee, gross_pay, "gross_pay", start_date, end_date
-    )
-    gross_pay = updated_gross_pay_data["compensation_amount"]
-    gross_pay_deductions = updated_gross_pay_data["deductions"]
-
-    kwargs["gross_pay"] = gross_pay
-    pretax_deductions = calculate_pre_tax_deduction(**kwargs)
-    post_tax_deductions = calculate_post_tax_deduction(**kwargs)
-
-    installments = (
-        pretax_deductions["installments"] | post_tax_deductions["installments"]
-    )
-
-    taxable_gross_pay = calculate_taxable_gross_pay(**kwargs)
-    tax_deductions = calculate_tax_deduction(**kwargs)
-    federal_tax = calculate_taxable_amount(**kwargs)
-
-    # gross_pay = (basic_pay + total_allowances)
-    # deduction = (
-    #   post_tax_deductions_amount
-    #   + pre_tax_deductions _amount
-    #   + tax_deductions + federal_tax_amount
-    #   + lop_amount
-    #   + one_time_basic_deduction_amount
-    #   + one_time_gross_deduction_amount
-    #   )
-    # net_pay = gross_pay - deduction
-    # net_pay = net_pay - net_pay_deduction
-
-    total_allowance = sum(item["amount"] for item in allowances["allowances"])
-    total_pretax_deduction = sum(
-        item["amount"] for item in pretax_deductions["pretax_deductions"]
-    )
-    total_post_tax_deduction = sum(
-        item["amount"] for item in post_tax_deductions["post_tax_deductions"]
-    )
-    total_tax_deductions = sum(
-        item["amount"] for item in tax_deductions["tax_deductions"]
-    )
-
-    total_deductions = (
-        total_pretax_deduction
-        + total_post_tax_deduction
-        + total_tax_deductions
-        + federal_tax
-        + loss_of_pay_amount
-    )
-
-    net_pay = (basic_pay + total_allowance) - total_deductions
-    updated_net_pay_data = update_compensation_deduction(
-        employee, net_pay, "net_pay", start_date, end_date
-    )
-    net_pay = updated_net_pay_data["compensation_amount"]
-    update_net_pay_deductions = updated_net_pay_data["deductions"]
-
-    net_pay_deductions = calculate_net_pay_deduction(
-        net_pay,
-        post_tax_deductions["net_pay_deduction"],
-        **kwargs,
-    )
-    net_pay_deduction_list = net_pay_deductions["net_pay_deductions"]
-    for deduction in update_net_pay_deductions:
-        net_pay_deduction_list.append(deduction)
-    net_pay = net_pay - net_pay_deductions["net_deduction"]
-    payslip_data = {
-        "employee": employee,
-        "contract_wage": contract_wage,
-        "basic_pay": basic_pay,
-        "gross_pay": gross_pay,
-        "taxable_gross_pay": taxable_gross_pay["taxable_gross_pay"],
-        "net_pay": net_pay,
-        "allowances": allowances["allowances"],
-        "paid_days": paid_days,
-        "unpaid_days": unpaid_days,
-        "basic_pay_deductions": basic_pay_deductions,
-        "gross_pay_deductions": gross_pay_deductions,
-        "pretax_deductions": pretax_deductions["pretax_deductions"],
-        "post_tax_deductions": post_tax_deductions["post_tax_deductions"],
-        "tax_deductions": tax_deductions["tax_deductions"],
-        "net_deductions": net_pay_deduction_list,
-        "total_deductions": total_deductions,
-        "loss_of_pay": loss_of_pay,
-        "federal_tax": federal_tax,
-        "start_date": start_date,
-        "end_date": end_date,
-        "range": f"{start_date.strftime('%b %d %Y')} - {end_date.strftime('%b %d %Y')}",
-    }
-    data_to_json = payslip_data.copy()
-    data_to_json["employee"] = employee.id
-    data_to_json["start_date"] = start_date.strftime("%Y-%m-%d")
-    data_to_json["end_date"] = end_date.strftime("%Y-%m-%d")
-    json_data = json.dumps(data_to_json)
-
-    payslip_data["json_data"] = json_data
-    payslip_data["installments"] = installments
-    return payslip_data
+    payslips = PayrollRun([employee], start_date, end_date).run()
+    return payslips[0] if payslips else None
 
 
 @login_required
@@ -575,13 +431,9 @@ def generate_payslip(request):
             start_date = form.cleaned_data["start_date"]
             end_date = form.cleaned_data["end_date"]
             group_name = form.cleaned_data["group_name"]
-            for employee in employees:
-                contract = payroll.models.models.Contract.objects.filter(
-                    employee_id=employee, contract_status="active"
-                ).first()
-                if start_date < contract.contract_start_date:
-                    start_date = contract.contract_start_date
-                payslip = payroll_calculation(employee, start_date, end_date)
+            payroll_run = PayrollRun(employees, start_date, end_date)
+            for payslip in payroll_run.run():
+                employee = payslip["employee"]
                 payslips.append(payslip)
                 json_data.append(payslip["json_data"])
 
@@ -612,7 +464,7 @@ def generate_payslip(request):
                     redirect=f"/payroll/view-payslip/{instance.id}",
                     icon="close",
                 )
-            messages.success(request, f"{employees.count()} payslip saved as draft")
+            messages.success(request, f"{len(instances)} payslip saved as draft")
             return redirect(
                 f"/payroll/view-payslip?group_by=group_name&active_group={group_name}"
             )
@@ -651,12 +503,15 @@ def create_payslip(request, new_post_data=None):
                 employee = form.cleaned_data["employee_id"]
                 start_date = form.cleaned_data["start_date"]
                 end_date = form.cleaned_data["end_date"]
-                contract = payroll.models.models.Contract.objects.filter(
-                    employee_id=employee, contract_status="active"
-                ).first()
-                if start_date < contract.contract_start_date:
-                    start_date = contract.contract_start_date
                 payslip_data = payroll_calculation(employee, start_date, end_date)
+                if payslip_data is None:
+                    messages.warning(
+                        request,
+                        _(
+                            "No active contract found for  {} during this payslip period"
+                        ).format(employee),
+                    )
+                    return render(request, "payroll/common/form.html", {"form": form})
                 payslip_data["payslip"] = payslip
                 data = {}
                 data["employee"] = employee
@@ -751,7 +606,20 @@ def view_individual_payslip(request, employee_id, start_date, end_date):
     This method is used to render the template for viewing a payslip.
     """
 
-    payslip_data = payroll_calculation(employee_id, start_date, end_date)
+    employee = Employee.objects.filter(id=employee_id).first()
+    start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+    payslip_data = (
+        payroll_calculation(employee, start_date, end_date) if employee else None
+    )
+    if payslip_data is None:
+        messages.warning(
+            request,
+            _("No active contract found for  {} during this payslip period").format(
+                employee
+            ),
+        )
+        return HttpResponse("<script>window.location.reload()</script>")
     return render(
         request,
         "payroll/payslip/individual_payslip.html",
@@ -209,15 +209,21 @@ class EmployeeObjective(HorillaModel):
     def __str__(self):
         return f"{self.objective_id} | {self.employee_id}"
 
+    def set_end_date(self):
+        """
+        sets the end date from the start date and the duration of the objective
+        """
+        duration = self.objective_id.duration
+        if self.objective_id.duration_unit == "days":
+            self.end_date = self.start_date + relativedelta(days=duration)
+        elif self.objective_id.duration_unit == "months":
+            self.end_date = self.start_date + relativedelta(months=duration)
+        elif self.objective_id.duration_unit == "years":
+            self.end_date = self.start_date + relativedelta(years=duration)
+
     def save(self, *args, **kwargs):
         if not self.pk and self.objective_id and self.start_date:
-            duration = self.objective_id.duration
-            if self.objective_id.duration_unit == "days":
-                self.end_date = self.start_date + relativedelta(days=duration)
-            elif self.objective_id.duration_unit == "months":
-                self.end_date = self.start_date + relativedelta(months=duration)
-            elif self.objective_id.duration_unit == "years":
-                self.end_date = self.start_date + relativedelta(years=duration)
+            self.set_end_date()
         super().save(*args, **kwargs)
 
     def tracking(self):
@@ -0,0 +1,275 @@
+"""
+okr_assignment.py
+
+This module assigns an objective and its default key results to employees.
+
+The employees are handled ``ASSIGNMENT_CHUNK_SIZE`` at a time. For each chunk
+the existing assignees, employee objectives and employee key results are read
+with one query each, the missing ones are found by set difference and
+inserted with ``bulk_create`` keeping the audit history, and the assignees
+are notified with one bulk notification. A chunk is written in one
+transaction holding a lock on the objective, so two assignments of the same
+objective can't create the same employee objective twice.
+
+Assignments of more than ``ASSIGNMENT_BACKGROUND_THRESHOLD`` employees run in
+a background thread, their progress is kept in Django's cache under the job id
+for the status view.
+"""
+
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Sum
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from horilla.horilla_jobs import CacheJob, JobThread
+from notifications.models import notify_bulk
+from pms.models import EmployeeKeyResult, EmployeeObjective, Objective
+
+# Employees assigned per transaction
+ASSIGNMENT_CHUNK_SIZE = getattr(settings, "OKR_ASSIGNMENT_CHUNK_SIZE", 500)
+
+# Assignments of more employees run in the background
+ASSIGNMENT_BACKGROUND_THRESHOLD = getattr(
+    settings, "OKR_ASSIGNMENT_BACKGROUND_THRESHOLD", 200
+)
+
+
+class AssignmentJob(CacheJob):
+    """
+    Progress of an assignment, stored in the cache under the job id
+    """
+
+    name = "okr_assignment"
+
+
+class ObjectiveAssignment:
+    """
+    Assignment of an objective and its default key results to employees,
+    ``sender`` is the employee the notifications come from
+    """
+
+    def __init__(self, objective, employees, start_date, sender, user_id=None):
+        self.objective = objective
+        self.employee_ids = sorted({employee.pk for employee in employees})
+        self.start_date = start_date or date.today()
+        self.sender = sender
+        self.user_id = user_id
+        self.job = AssignmentJob()
+        self.background = False
+        self.summary = {"employee_objectives": 0, "employee_key_results": 0}
+
+    @property
+    def history_user(self):
+        """
+        User the created and updated records and their history are saved by
+        """
+        return self.user_id and User(pk=self.user_id)
+
+    @property
+    def is_large(self):
+        return len(self.employee_ids) > ASSIGNMENT_BACKGROUND_THRESHOLD
+
+    def start(self):
+        """
+        Starts the assignment in the background, returns the job
+        """
+        self.background = True
+        self.job.update(
+            user_id=self.user_id,
+            objective_id=self.objective.pk,
+            status="queued",
+            total=len(self.employee_ids),
+            processed=0,
+            message=None,
+        )
+        JobThread(self, "Objective assignment").start()
+        return self.job
+
+    def run(self):
+        """
+        Assigns every employee, returns the numbers of employee objectives and
+        employee key results created
+        """
+        if self.background:
+            self.job.update(status="running")
+        for index in range(0, len(self.employee_ids), ASSIGNMENT_CHUNK_SIZE):
+            chunk = self.employee_ids[index : index + ASSIGNMENT_CHUNK_SIZE]
+            self.assign(chunk)
+            if self.background:
+                self.job.update(processed=index + len(chunk), **self.summary)
+        if self.background:
+            self.job.update(status="done", **self.summary)
+        return self.summary
+
+    def assign(self, employee_ids):
+        """
+        Assigns the objective to the employees of a chunk
+        """
+        with transaction.atomic():
+            objective = Objective._base_manager.select_for_update().get(
+                pk=self.objective.pk
+            )
+            self.add_assignees(objective, employee_ids)
+            employee_objectives = self.create_employee_objectives(
+                objective, employee_ids
+            )
+            self.create_employee_key_results(objective, employee_objectives)
+            notify_bulk(
+                self.sender,
+                User.objects.filter(employee_get__id__in=employee_ids),
+                "You got an OKR!.",
+                defer=not self.background,
+                verb_ar="لقد حققت هدفًا ونتيجة رئيسية!",
+                verb_de="Du hast ein Ziel-Key-Ergebnis erreicht!",
+                verb_es="¡Has logrado un Resultado Clave de Objetivo!",
+                verb_fr="Vous avez atteint un Résultat Clé d'Objectif !",
+                redirect=f"/pms/objective-detailed-view/{objective.id}",
+            )
+
+    def add_assignees(self, objective, employee_ids):
+        """
+        Adds the employees missing from the assignees of the objective
+        """
+        Assignee = Objective.assignees.through
+        existing = set(
+            Assignee.objects.filter(
+                objective_id=objective.pk, employee_id__in=employee_ids
+            ).values_list("employee_id", flat=True)
+        )
+        Assignee.objects.bulk_create(
+            [
+                Assignee(objective_id=objective.pk, employee_id=employee_id)
+                for employee_id in employee_ids
+                if employee_id not in existing
+            ],
+            ignore_conflicts=True,
+        )
+
+    def create_employee_objectives(self, objective, employee_ids):
+        """
+        Creates the missing employee objectives, returns the employee objective
+        ids of the employees
+        """
+        employee_objectives = {}
+        for employee_objective_id, employee_id in (
+            EmployeeObjective._base_manager.filter(
+                objective_id=objective, employee_id__in=employee_ids
+            )
+            .order_by("pk")
+            .values_list("pk", "employee_id")
+        ):
+            employee_objectives.setdefault(employee_id, employee_objective_id)
+
+        new_objectives = []
+        for employee_id in employee_ids:
+            if employee_id in employee_objectives:
+                continue
+            employee_objective = EmployeeObjective(
+                objective_id=objective,
+                employee_id_id=employee_id,
+                start_date=self.start_date,
+                created_by_id=self.user_id,
+                modified_by_id=self.user_id,
+            )
+            employee_objective.set_end_date()
+            new_objectives.append(employee_objective)
+        if new_objectives:
+            bulk_create_with_history(
+                new_objectives,
+                EmployeeObjective,
+                batch_size=ASSIGNMENT_CHUNK_SIZE,
+                default_user=self.history_user,
+            )
+            # the ids aren't returned by every database
+            for employee_objective_id, employee_id in (
+                EmployeeObjective._base_manager.filter(
+                    objective_id=objective,
+                    employee_id__in=[
+                        employee_objective.employee_id_id
+                        for employee_objective in new_objectives
+                    ],
+                )
+                .order_by("pk")
+                .values_list("pk", "employee_id")
+            ):
+                employee_objectives.setdefault(employee_id, employee_objective_id)
+            self.summary["employee_objectives"] += len(new_objectives)
+        return list(employee_objectives.values())
+
+    def create_employee_key_results(self, objective, employee_objective_ids):
+        """
+        Creates the missing default key results of the employee objectives and
+        updates the progress of the ones that got new key results
+        """
+        key_results = list(objective.key_result_id.all())
+        if not key_results or not employee_objective_ids:
+            return
+        existing = set(
+            EmployeeKeyResult._base_manager.filter(
+                employee_objective_id__in=employee_objective_ids,
+                key_result_id__in=key_results,
+            ).values_list("employee_objective_id", "key_result_id")
+        )
+        new_key_results = []
+        for employee_objective_id in employee_objective_ids:
+            for key_result in key_results:
+                if (employee_objective_id, key_result.pk) in existing:
+                    continue
+                employee_key_result = EmployeeKeyResult(
+                    employee_objective_id_id=employee_objective_id,
+                    key_result_id=key_result,
+                    key_result=key_result.title,
+                    progress_type=key_result.progress_type,
+                    target_value=key_result.target_value,
+                )
+                employee_key_result.current_value = employee_key_result.start_value
+                employee_key_result.update_kr_progress()
+                new_key_results.append(employee_key_result)
+        if not new_key_results:
+            return
+        bulk_create_with_history(
+            new_key_results,
+            EmployeeKeyResult,
+            batch_size=ASSIGNMENT_CHUNK_SIZE,
+            default_user=self.history_user,
+        )
+        self.summary["employee_key_results"] += len(new_key_results)
+        self.update_progress(
+            {
+                employee_key_result.employee_objective_id_id
+                for employee_key_result in new_key_results
+            }
+        )
+
+    def update_progress(self, employee_objective_ids):
+        """
+        Recomputes the progress of the employee objectives from their key
+        results, like EmployeeObjective.update_objective_progress
+        """
+        progress = {
+            row["employee_objective_id"]: int(row["total"] / row["count"])
+            for row in EmployeeKeyResult._base_manager.filter(
+                employee_objective_id__in=employee_objective_ids
+            )
+            .values("employee_objective_id")
+            .annotate(total=Sum("progress_percentage"), count=Count("id"))
+            .order_by()
+        }
+        employee_objectives = list(
+            EmployeeObjective._base_manager.filter(pk__in=progress)
+        )
+        for employee_objective in employee_objectives:
+            employee_objective.progress_percentage = progress[employee_objective.pk]
+            employee_objective.updated_at = date.today()
+            if self.user_id:
+                employee_objective.modified_by_id = self.user_id
+        bulk_update_with_history(
+            employee_objectives,
+            EmployeeObjective,
+            ["progress_percentage", "updated_at", "modified_by"],
+            batch_size=ASSIGNMENT_CHUNK_SIZE,
+            default_user=self.history_user,
+        )
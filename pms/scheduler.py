@@ -1,8 +1,8 @@
 from datetime import datetime, timedelta
 
-from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
+from horilla.horilla_scheduler import scheduler
 from notifications.signals import notify
 
 
@@ -37,11 +37,8 @@ def cyclic_feedback_creation():
     return
 
 
-scheduler = BackgroundScheduler()
 cron_trigger = CronTrigger(hour=8)
 grace_time_seconds = int(timedelta(days=1).total_seconds())
 scheduler.add_job(
     cyclic_feedback_creation, cron_trigger, misfire_grace_time=grace_time_seconds
 )
-
-scheduler.start()
@@ -12,6 +12,11 @@ urlpatterns = [
         "objective-update/<int:obj_id>", views.objective_update, name="objective-update"
     ),
     path("add-assignees/<int:obj_id>", views.add_assignees, name="add-assignees"),
+    path(
+        "objective-assignment-status/<str:job_id>/",
+        views.objective_assignment_status,
+        name="objective-assignment-status",
+    ),
     # key results
     path("view-key-result/", views.view_key_result, name="view-key-result"),
     path("filter-key-result/", views.filter_key_result, name="filter-key-result"),
@@ -18,6 +18,7 @@ from django.db.utils import IntegrityError
 from django.forms import modelformset_factory
 from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
 from attendance.methods.group_by import group_by_queryset
@@ -31,6 +32,7 @@ from horilla.decorators import (
     meeting_manager_can_enter,
     permission_required,
 )
+from notifications.models import notify_bulk
 from notifications.signals import notify
 from pms.filters import (
     ActualKeyResultFilter,
@@ -60,6 +62,7 @@ from pms.models import (
     QuestionOptions,
     QuestionTemplate,
 )
+from pms.okr_assignment import AssignmentJob, ObjectiveAssignment
 
 from .forms import (
     AddAssigneesForm,
@@ -126,35 +129,25 @@ def obj_form_save(request, objective_form):
     objective = objective_form.save()
     assignees = objective_form.cleaned_data["assignees"]
     start_date = objective_form.cleaned_data["start_date"]
-    default_krs = objective_form.cleaned_data["key_result_id"]
 
     messages.success(request, _("Objective created"))
     if assignees:
-        for emp in assignees:
-            emp_objective = EmployeeObjective(
-                objective_id=objective, employee_id=emp, start_date=start_date
-            )
-            emp_objective.save()
-            # assigning default key result
-            if default_krs:
-                for key in default_krs:
-                    emp_kr = EmployeeKeyResult(
-                        employee_objective_id=emp_objective,
-                        key_result_id=key,
-                        progress_type=key.progress_type,
-                        target_value=key.target_value,
-                    )
-                    emp_kr.save()
-            notify.send(
-                request.user.employee_get,
-                recipient=emp.employee_user_id,
-                verb="You got an OKR!.",
-                verb_ar="لقد حققت هدفًا ونتيجة رئيسية!",
-                verb_de="Du hast ein Ziel-Key-Ergebnis erreicht!",
-                verb_es="¡Has logrado un Resultado Clave de Objetivo!",
-                verb_fr="Vous avez atteint un Résultat Clé d'Objectif !",
-                redirect=f"/pms/objective-detailed-view/{objective.id}",
+        assignment = ObjectiveAssignment(
+            objective,
+            assignees,
+            start_date,
+            request.user.employee_get,
+            request.user.id,
+        )
+        if assignment.is_large:
+            assignment.start()
+            messages.info(
+                request,
+                _("Assigning %(objective)s to %(count)s employees")
+                % {"objective": objective, "count": len(assignment.employee_ids)},
             )
+        else:
+            assignment.run()
 
 
 @login_required
@@ -419,40 +412,36 @@ def add_assignees(request, obj_id):
             objective = form.save(commit=False)
             assignees = form.cleaned_data["assignees"]
             start_date = form.cleaned_data["start_date"]
-            for emp in assignees:
-                objective.assignees.add(emp)
-                if not EmployeeObjective.objects.filter(
-                    employee_id=emp, objective_id=objective
-                ).exists():
-                    emp_obj = EmployeeObjective(
-                        employee_id=emp, objective_id=objective, start_date=start_date
-                    )
-                emp_obj.save()
-                # assiging default key result
-                default_krs = objective.key_result_id.all()
-                if default_krs:
-                    for key_result in default_krs:
-                        if not EmployeeKeyResult.objects.filter(
-                            employee_objective_id=emp_obj, key_result_id=key_result
-                        ).exists():
-                            emp_kr = EmployeeKeyResult.objects.create(
-                                employee_objective_id=emp_obj,
-                                key_result_id=key_result,
-                                progress_type=key_result.progress_type,
-                                target_value=key_result.target_value,
-                            )
-                            emp_kr.save()
-                notify.send(
-                    request.user.employee_get,
-                    recipient=emp.employee_user_id,
-                    verb="You got an OKR!.",
-                    verb_ar="لقد حققت هدفًا ونتيجة رئيسية!",
-                    verb_de="Du hast ein Ziel-Key-Ergebnis erreicht!",
-                    verb_es="¡Has logrado un Resultado Clave de Objetivo!",
-                    verb_fr="Vous avez atteint un Résultat Clé d'Objectif !",
-                    redirect=f"/pms/objective-detailed-view/{objective.id}",
-                )
             objective.save()
+            assignment = ObjectiveAssignment(
+                objective,
+                assignees,
+                start_date,
+                request.user.employee_get,
+                request.user.id,
+            )
+            if assignment.is_large:
+                job = assignment.start()
+                messages.info(
+                    request,
+                    _("Assigning %(objective)s to %(count)s employees")
+                    % {"objective": objective, "count": len(assignment.employee_ids)},
+                )
+                status_url = reverse("objective-assignment-status", args=[job.job_id])
+                return HttpResponse(
+                    f"""<script>
+                    (function poll() {{
+                        $.get("{status_url}", function (state) {{
+                            if (state.status === "done" || state.status === "failed") {{
+                                window.location.reload();
+                            }} else {{
+                                setTimeout(poll, 2000);
+                            }}
+                        }}).fail(function () {{ window.location.reload(); }});
+                    }})();
+                    </script>"""
+                )
+            assignment.run()
             messages.info(
                 request,
                 _("Objective %(objective)s Updated") % {"objective": objective},
@@ -465,6 +454,17 @@ def add_assignees(request, obj_id):
     return render(request, "okr/add_assignees.html", context)
 
 
+@login_required
+def objective_assignment_status(request, job_id):
+    """
+    This view is used to return the progress of an objective assignment
+    """
+    state = AssignmentJob(job_id).state()
+    if state is None or state.get("user_id") != request.user.id:
+        return JsonResponse({"status": "unknown"}, status=404)
+    return JsonResponse(state)
+
+
 @login_required
 @manager_can_enter(perm="pms.delete_employeeobjective")
 def objective_delete(request, obj_id):
@@ -1386,35 +1386,33 @@ def send_feedback_notifications(request, form):
 
     # Send notification to subordinates
     if form.subordinate_id:
-        subordinates = form.subordinate_id.all()
-        for subordinate in subordinates:
-            notify.send(
-                request.user.employee_get,
-                recipient=subordinate.employee_user_id,
-                verb="You have been assigned as a subordinate in a feedback!",
-                verb_ar="لقد تم تعيينك كمرؤوس في ملاحظة!",
-                verb_de="Sie wurden als Untergebener in einem Feedback zugewiesen!",
-                verb_es="¡Has sido asignado como subordinado en un feedback!",
-                verb_fr="Vous avez été désigné comme subordonné dans un commentaire !",
-                redirect=f"/pms/feedback-detailed-view/{form.id}",
-                icon="chatbox-ellipses",
-            )
+        notify_bulk(
+            request.user.employee_get,
+            User.objects.filter(employee_get__in=form.subordinate_id.all()),
+            "You have been assigned as a subordinate in a feedback!",
+            defer=True,
+            verb_ar="لقد تم تعيينك كمرؤوس في ملاحظة!",
+            verb_de="Sie wurden als Untergebener in einem Feedback zugewiesen!",
+            verb_es="¡Has sido asignado como subordinado en un feedback!",
+            verb_fr="Vous avez été désigné comme subordonné dans un commentaire !",
+            redirect=f"/pms/feedback-detailed-view/{form.id}",
+            icon="chatbox-ellipses",
+        )
 
     # Send notification to colleagues
     if form.colleague_id:
-        colleagues = form.colleague_id.all()
-        for colleague in colleagues:
-            notify.send(
-                request.user.employee_get,
-                recipient=colleague.employee_user_id,
-                verb="You have been assigned as a colleague in a feedback!",
-                verb_ar="لقد تم تعيينك كزميل في ملاحظة!",
-                verb_de="Sie wurden als Kollege in einem Feedback zugewiesen!",
-                verb_es="¡Has sido asignado como colega en un feedback!",
-                verb_fr="Vous avez été désigné comme collègue dans un commentaire !",
-                redirect=f"/pms/feedback-detailed-view/{form.id}",
-                icon="chatbox-ellipses",
-            )
+        notify_bulk(
+            request.user.employee_get,
+            User.objects.filter(employee_get__in=form.colleague_id.all()),
+            "You have been assigned as a colleague in a feedback!",
+            defer=True,
+            verb_ar="لقد تم تعيينك كزميل في ملاحظة!",
+            verb_de="Sie wurden als Kollege in einem Feedback zugewiesen!",
+            verb_es="¡Has sido asignado como colega en un feedback!",
+            verb_fr="Vous avez été désigné comme collègue dans un commentaire !",
+            redirect=f"/pms/feedback-detailed-view/{form.id}",
+            icon="chatbox-ellipses",
+        )
 
 
 @login_required